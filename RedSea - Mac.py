@@ -1,11 +1,301 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import yt_dlp
 import os
 import threading
 import sys
-import requests
-import re
+import glob
+import queue
+import logging
+from logging.handlers import RotatingFileHandler
+from collections import OrderedDict
+from datetime import datetime
+from itertools import islice
+
+from redsea import DownloadEngine, QueueJournal, DEFAULT_WORKERS, MAX_WORKERS
+from redsea.fragments import FRAGMENT_CONCURRENCY_STEPS
+from redsea.scheduler import SCHEDULE_POLICIES, SCHEDULE_TEXT
+from redsea.util import (get_cache_dir, get_log_dir, format_bytes, format_duration, is_youtube_url,
+                         is_playlist_url, parse_bytes, preload_heavy_modules)
+
+# Startup timing: (stage, seconds since STARTUP_STARTED) marks, reported once
+# the window has been drawn
+startup_marks = []
+
+def mark_startup(stage):
+    """Record that a startup stage has finished"""
+    startup_marks.append((stage, time.perf_counter() - STARTUP_STARTED))
+
+def format_startup_report():
+    """Describe how long each startup stage took"""
+    parts = []
+    previous = 0
+    for stage, elapsed in startup_marks:
+        parts.append(f"{stage} {(elapsed - previous) * 1000:.0f} ms")
+        previous = elapsed
+    return f"⏱️ Startup: {', '.join(parts)} ({previous * 1000:.0f} ms to interactive)"
+
+mark_startup("imports")
+
+# Log pipeline: drain interval, lines handled per drain and visible line cap
+LOG_DRAIN_INTERVAL_MS = 100
+LOG_DRAIN_BATCH = 500
+MAX_LOG_LINES = 5000
+
+# Widget updates handed over by other threads: drain interval and calls run per drain
+UI_DRAIN_INTERVAL_MS = 50
+UI_DRAIN_BATCH = 200
+
+# Log color tags, first match wins
+LOG_TAG_RULES = [
+    ("green", ("✅", "Completed successfully", "Successful:")),
+    ("red", ("❌", "Failed:", "Error:")),
+    ("orange", ("⚠️", "Warning", "unknown title")),
+    ("blue", ("Starting:", "Downloading", "Fetching")),
+    ("purple", ("📊", "Batch Download Complete", "Duration:")),
+]
+
+# How often the GUI refreshes its transfer progress display
+TELEMETRY_REFRESH_MS = 500
+
+# Suggested total download rates; any rate such as 750K can be typed in
+BANDWIDTH_LIMIT_CHOICES = ["Unlimited", "512K", "1M", "2M", "5M", "10M"]
+
+# Header logo size in pixels
+LOGO_SIZE = 80
+
+def get_scaled_logo(source_path, size=LOGO_SIZE):
+    """Get the path of a size x size copy of the logo, rendering it if needed
+    
+    The copy lives in the cache directory and is named after the source's
+    mtime, so it is rendered once per logo version and later launches load a
+    tiny PNG with Tk alone instead of resizing the full-size logo.
+    """
+    cache_dir = get_cache_dir()
+    mtime = int(os.path.getmtime(source_path))
+    scaled_path = os.path.join(cache_dir, f"logo-{size}-{mtime}.png")
+    if os.path.exists(scaled_path):
+        return scaled_path
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = scaled_path + ".tmp"
+    try:
+        from PIL import Image
+        with Image.open(source_path) as logo_image:
+            logo_image = logo_image.resize((size, size), Image.Resampling.LANCZOS)
+            logo_image.save(temp_path, format="PNG")
+    except ImportError:
+        # Without PIL, Tk can still shrink the logo by a whole factor
+        logo_image = tk.PhotoImage(file=source_path)
+        factor = max(1, -(-max(logo_image.width(), logo_image.height()) // size))
+        logo_image.subsample(factor).write(temp_path, format="png")
+    os.replace(temp_path, scaled_path)
+    
+    # Drop copies rendered from older versions of the logo
+    for old_path in glob.glob(os.path.join(cache_dir, f"logo-{size}-*.png")):
+        if old_path != scaled_path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    
+    return scaled_path
+
+def get_log_tag(message):
+    """Pick the color tag for a log message"""
+    for tag, markers in LOG_TAG_RULES:
+        for marker in markers:
+            if marker in message:
+                return tag
+    return None
+
+class QueueView:
+    """Virtualized Listbox view of the download queue.
+    
+    The view keeps its own row order as an OrderedDict of display labels and
+    applies the queue's diffs (see DownloadQueue.add_listener) instead of
+    rebuilding from the whole queue, so adding, removing or moving an item
+    is constant time. Display strings are formatted once per item, and the
+    Listbox only ever holds the rows that are currently visible.
+    
+    apply() and update_item() only change the view's own state and may run
+    on any thread; render() draws it and must run on the Tk thread.
+    """
+    
+    def __init__(self, listbox, scrollbar):
+        self.listbox = listbox
+        self.scrollbar = scrollbar
+        self.labels = OrderedDict()
+        self.offset = 0
+        self.selected_key = None
+        self._dirty = True
+        self._lock = threading.RLock()
+        
+        self.scrollbar.configure(command=self.yview)
+        self.listbox.configure(yscrollcommand="")
+        self.listbox.bind('<<ListboxSelect>>', self._on_select)
+        self.listbox.bind('<MouseWheel>', self._on_mousewheel)
+        self.listbox.bind('<Button-4>', lambda e: self.scroll_rows(-1))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll_rows(1))
+    
+    @property
+    def visible_rows(self):
+        return int(self.listbox.cget('height'))
+    
+    @staticmethod
+    def format_label(item):
+        """Format the display text for an item, without its row number"""
+        title = item.title
+        url = item.url
+        
+        if len(title) > 50:
+            title = title[:47] + "..."
+        
+        if "youtube.com/watch?v=" in url:
+            video_id = url.split("watch?v=")[1].split("&")[0]
+            url_short = f"youtu.be/{video_id}"
+        elif "youtu.be/" in url:
+            video_id = url.split("youtu.be/")[1].split("?")[0]
+            url_short = f"youtu.be/{video_id}"
+        else:
+            url_short = url[:20] + "..." if len(url) > 20 else url
+        
+        return f"{title} - {url_short}"
+    
+    def apply(self, op, payload):
+        """Apply a DownloadQueue diff and mark the view for redrawing"""
+        with self._lock:
+            if op == 'add':
+                for item in payload:
+                    self.labels[item.key] = self.format_label(item)
+            elif op == 'remove':
+                self.labels.pop(payload.key, None)
+                if self.selected_key == payload.key:
+                    self.selected_key = None
+                self._clamp_offset()
+            elif op in ('move_front', 'move_end'):
+                if payload.key in self.labels:
+                    self.labels.move_to_end(payload.key, last=(op == 'move_end'))
+            elif op == 'clear':
+                self.labels = OrderedDict()
+                self.offset = 0
+                self.selected_key = None
+            else:
+                return
+            self._dirty = True
+    
+    def update_item(self, item):
+        """Refresh the cached label of an item whose title changed"""
+        with self._lock:
+            if item.key not in self.labels:
+                return
+            self.labels[item.key] = self.format_label(item)
+            self._dirty = True
+    
+    def _window(self, start, count):
+        """Get the keys of rows start to start + count, walking in from the nearer end"""
+        total = len(self.labels)
+        start = max(0, min(start, total))
+        stop = min(total, start + count)
+        if start <= total - stop:
+            return list(islice(self.labels, start, stop))
+        window = list(islice(reversed(self.labels), total - stop, total - start))
+        window.reverse()
+        return window
+    
+    def render(self):
+        """Redraw the visible rows and the scrollbar if anything changed (Tk thread only)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            
+            self.listbox.delete(0, tk.END)
+            window = self._window(self.offset, self.visible_rows)
+            for row, key in enumerate(window, self.offset + 1):
+                self.listbox.insert(tk.END, f"{row}. {self.labels[key]}")
+            
+            if self.selected_key in window:
+                self.listbox.selection_set(window.index(self.selected_key))
+            
+            self._update_scrollbar()
+    
+    def _update_scrollbar(self):
+        total = len(self.labels)
+        if total == 0:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+    
+    def _clamp_offset(self):
+        max_offset = max(0, len(self.labels) - self.visible_rows)
+        offset = max(0, min(self.offset, max_offset))
+        if offset != self.offset:
+            self.offset = offset
+            self._dirty = True
+    
+    def scroll_rows(self, rows):
+        with self._lock:
+            self.offset += rows
+            self._dirty = True
+            self._clamp_offset()
+            self.render()
+    
+    def yview(self, *args):
+        """Scrollbar command: 'moveto fraction' or 'scroll n units|pages'"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            with self._lock:
+                self.offset = int(float(args[1]) * len(self.labels))
+                self._dirty = True
+                self._clamp_offset()
+                self.render()
+        elif args[0] == 'scroll':
+            rows = int(args[1])
+            if len(args) > 2 and args[2] == 'pages':
+                rows *= self.visible_rows
+            self.scroll_rows(rows)
+    
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        self.scroll_rows(-1 if event.delta > 0 else 1)
+        return "break"
+    
+    def _on_select(self, event):
+        selection = self.listbox.curselection()
+        with self._lock:
+            if selection:
+                window = self._window(self.offset + selection[0], 1)
+                if window:
+                    self.selected_key = window[0]
+    
+    def get_selected_key(self):
+        return self.selected_key
+    
+    def show(self, key):
+        """Select a row and scroll it into view
+        
+        Finding the row walks the queue up to it; items usually start near
+        the front, and this runs once per started item, not per queue change.
+        """
+        with self._lock:
+            if key not in self.labels:
+                return
+            row = next(row for row, other in enumerate(self.labels) if other == key)
+            self.selected_key = key
+            if not self.offset <= row < self.offset + self.visible_rows:
+                self.offset = row
+                self._clamp_offset()
+            self._dirty = True
+            self.render()
+    
+    def clear_selection(self):
+        with self._lock:
+            self.selected_key = None
+            self.listbox.selection_clear(0, tk.END)
 
 class RedSeaGUI:
     def __init__(self, root):
@@ -16,14 +306,35 @@ class RedSeaGUI:
         # Center the window on screen
         self.center_window()
         
-        # Initialize download queue (list of dictionaries with url and title)
-        self.download_queue = []
+        # Closing the window mid-batch cancels the downloads first
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Log lines from any thread are queued and written by the Tk thread
+        self.log_queue = queue.SimpleQueue()
+        self.file_logger = None
         
-        # Download cancellation mechanism
-        self.cancel_event = threading.Event()
-        self.is_downloading = False
+        # Tk is not thread-safe: engine, queue and fetch callbacks hand their
+        # widget updates to the Tk thread through this queue
+        self.ui_queue = queue.SimpleQueue()
+        self._queue_display_requested = threading.Event()
+        
+        # The queue is journaled so a crash or quit mid-batch can be resumed
+        try:
+            journal = QueueJournal()
+        except Exception as e:
+            journal = None
+            self.log(f"⚠️ Warning: queue journal unavailable, the queue won't survive a restart: {e}")
+        
+        # Queue, caches and downloads live in the headless engine; settings
+        # are copied from the widgets when a batch starts
+        self.engine = DownloadEngine(log=self.log, journal=journal)
+        self.engine.on_item_start = lambda *args: self.run_on_ui(self.on_item_start, *args)
+        self.engine.on_progress = lambda *args: self.run_on_ui(self.on_batch_progress, *args)
+        self.download_queue = self.engine.queue
         self.current_download_thread = None
         
+        self._current_progress_spinning = False
+        
         # Create main frame with horizontal layout
         main_frame = ttk.Frame(root, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -43,15 +354,12 @@ class RedSeaGUI:
         header_frame = ttk.Frame(left_pane)
         header_frame.pack(pady=(0, 20))
         
-        # Load logo image
+        # Load logo image (a pre-scaled copy Tk can read without PIL)
         try:
-            from PIL import Image, ImageTk
             logo_path = self.get_logo_path()
             
             if os.path.exists(logo_path):
-                logo_image = Image.open(logo_path)
-                logo_image = logo_image.resize((80, 80), Image.Resampling.LANCZOS)
-                self.logo_photo = ImageTk.PhotoImage(logo_image)
+                self.logo_photo = tk.PhotoImage(file=get_scaled_logo(logo_path))
                 
                 logo_label = ttk.Label(header_frame, image=self.logo_photo)
                 logo_label.pack(pady=(0, 10))
@@ -108,12 +416,17 @@ class RedSeaGUI:
         
         # Create listbox with scrollbar - smaller height
         self.queue_listbox = tk.Listbox(queue_list_frame, height=8, font=("Arial", 9))
-        queue_scrollbar = ttk.Scrollbar(queue_list_frame, orient="vertical", command=self.queue_listbox.yview)
-        self.queue_listbox.configure(yscrollcommand=queue_scrollbar.set)
+        queue_scrollbar = ttk.Scrollbar(queue_list_frame, orient="vertical")
         
         self.queue_listbox.pack(side=tk.LEFT, fill=tk.X, expand=True)
         queue_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # The view only renders visible rows and follows queue changes as diffs
+        self.queue_view = QueueView(self.queue_listbox, queue_scrollbar)
+        self.download_queue.add_listener(self.on_queue_change)
+        if self.engine.restored_items:
+            self.queue_view.apply('add', self.download_queue.snapshot())
+        
         # Queue control buttons
         queue_controls = ttk.Frame(queue_frame)
         queue_controls.pack(fill=tk.X)
@@ -121,9 +434,16 @@ class RedSeaGUI:
         remove_btn = ttk.Button(queue_controls, text="Remove Selected", command=self.remove_from_queue)
         remove_btn.pack(side=tk.LEFT, padx=(0, 5))
         
+        top_btn = ttk.Button(queue_controls, text="Move to Top", command=self.move_to_top)
+        top_btn.pack(side=tk.LEFT, padx=5)
+        
         clear_btn = ttk.Button(queue_controls, text="Clear All", command=self.clear_queue)
         clear_btn.pack(side=tk.LEFT, padx=(5, 0))
         
+        self.stop_fetch_btn = ttk.Button(queue_controls, text="Stop Fetching",
+                                         command=self.stop_playlist_fetch, state="disabled")
+        self.stop_fetch_btn.pack(side=tk.LEFT, padx=(10, 0))
+        
         # Queue status
         self.queue_status = ttk.Label(queue_controls, text="Queue: 0 items")
         self.queue_status.pack(side=tk.RIGHT)
@@ -165,7 +485,27 @@ class RedSeaGUI:
         
         both_radio = ttk.Radiobutton(format_radio_frame, text="Both MP3 + MP4", 
                                     variable=self.format_var, value="both")
-        both_radio.pack(side=tk.LEFT)
+        both_radio.pack(side=tk.LEFT, padx=(0, 15))
+        
+        # Original audio is copied into an audio container without re-encoding
+        audio_radio = ttk.Radiobutton(format_radio_frame, text="Original Audio",
+                                     variable=self.format_var, value="audio")
+        audio_radio.pack(side=tk.LEFT)
+        
+        # Single-fetch option for "both": download the video once and
+        # extract the MP3 locally from its audio track
+        self.single_fetch_var = tk.BooleanVar(value=True)
+        single_fetch_check = ttk.Checkbutton(format_frame, 
+                                            text="Download once for MP3 + MP4 (extract MP3 from the video when its audio is as good)",
+                                            variable=self.single_fetch_var)
+        single_fetch_check.pack(anchor=tk.W, pady=(5, 0))
+        
+        # Skip items the download archive says are finished
+        self.skip_downloaded_var = tk.BooleanVar(value=True)
+        skip_downloaded_check = ttk.Checkbutton(format_frame,
+                                               text="Skip videos already downloaded in this format",
+                                               variable=self.skip_downloaded_var)
+        skip_downloaded_check.pack(anchor=tk.W, pady=(5, 0))
         
         # Quality selection
         quality_frame = ttk.Frame(settings_frame)
@@ -177,6 +517,53 @@ class RedSeaGUI:
         quality_combo.pack(side=tk.LEFT, padx=(10, 5))
         ttk.Label(quality_frame, text="kbps (for MP3)").pack(side=tk.LEFT)
         
+        # Parallel download workers
+        workers_frame = ttk.Frame(settings_frame)
+        workers_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(workers_frame, text="Parallel Downloads:").pack(side=tk.LEFT)
+        self.workers_var = tk.StringVar(value=str(DEFAULT_WORKERS))
+        workers_spin = ttk.Spinbox(workers_frame, textvariable=self.workers_var,
+                                   from_=1, to=MAX_WORKERS, width=5, state="readonly")
+        workers_spin.pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Label(workers_frame, text="items at once").pack(side=tk.LEFT)
+        
+        # Order items start in; a change applies to a running batch at once
+        order_frame = ttk.Frame(settings_frame)
+        order_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(order_frame, text="Download Order:").pack(side=tk.LEFT)
+        self.order_var = tk.StringVar(value=SCHEDULE_TEXT['fifo'])
+        order_combo = ttk.Combobox(order_frame, textvariable=self.order_var,
+                                   values=[SCHEDULE_TEXT[policy] for policy in SCHEDULE_POLICIES],
+                                   width=14, state="readonly")
+        order_combo.pack(side=tk.LEFT, padx=(10, 5))
+        order_combo.bind('<<ComboboxSelected>>', lambda e: self.apply_schedule())
+        
+        # Optional copy of the log in a rotating file
+        self.log_to_file_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(workers_frame, text="Save log to file", variable=self.log_to_file_var,
+                        command=self.toggle_log_file).pack(side=tk.RIGHT)
+        
+        # Fragments fetched at once for DASH/HLS formats
+        fragments_frame = ttk.Frame(settings_frame)
+        fragments_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(fragments_frame, text="Fragment Downloads:").pack(side=tk.LEFT)
+        self.fragments_var = tk.StringVar(value="auto")
+        fragments_combo = ttk.Combobox(fragments_frame, textvariable=self.fragments_var,
+                                       values=["auto"] + [str(step) for step in FRAGMENT_CONCURRENCY_STEPS],
+                                       width=6, state="readonly")
+        fragments_combo.pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Label(fragments_frame, text="at once (for streaming formats)").pack(side=tk.LEFT)
+        
+        # Total download rate shared by all parallel downloads
+        bandwidth_frame = ttk.Frame(settings_frame)
+        bandwidth_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(bandwidth_frame, text="Bandwidth Limit:").pack(side=tk.LEFT)
+        self.bandwidth_var = tk.StringVar(value=BANDWIDTH_LIMIT_CHOICES[0])
+        bandwidth_combo = ttk.Combobox(bandwidth_frame, textvariable=self.bandwidth_var,
+                                       values=BANDWIDTH_LIMIT_CHOICES, width=10)
+        bandwidth_combo.pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Label(bandwidth_frame, text="per second, e.g. 500K or 2M").pack(side=tk.LEFT)
+        
         # Download control buttons frame (left pane)
         download_frame = ttk.Frame(left_pane)
         download_frame.pack(pady=15)
@@ -189,6 +576,10 @@ class RedSeaGUI:
                                    command=self.cancel_download, state="disabled")
         self.cancel_btn.pack(side=tk.LEFT)
         
+        self.cancel_item_btn = ttk.Button(download_frame, text="Cancel Selected",
+                                        command=self.cancel_selected, state="disabled")
+        self.cancel_item_btn.pack(side=tk.LEFT, padx=(10, 0))
+        
         # Progress and Log section (right pane)
         progress_log_frame = ttk.LabelFrame(right_pane, text="Download Progress & Log", padding="10")
         progress_log_frame.pack(fill=tk.BOTH, expand=True)
@@ -208,7 +599,7 @@ class RedSeaGUI:
         current_label = ttk.Label(progress_frame, text="Current Item:")
         current_label.pack(anchor=tk.W)
         
-        self.current_progress = ttk.Progressbar(progress_frame, mode='indeterminate')
+        self.current_progress = ttk.Progressbar(progress_frame, mode='determinate')
         self.current_progress.pack(fill=tk.X, pady=(2, 5))
         
         # Status labels
@@ -221,10 +612,22 @@ class RedSeaGUI:
         self.progress_label = ttk.Label(status_frame, text="", foreground="gray")
         self.progress_label.pack(side=tk.RIGHT)
         
+        # Live throughput, bytes remaining and batch ETA
+        self.transfer_label = ttk.Label(progress_frame, text="", foreground="gray")
+        self.transfer_label.pack(anchor=tk.W)
+        
         # Log output (right pane)
         self.log_text = scrolledtext.ScrolledText(progress_log_frame, height=25, font=("Consolas", 9))
         self.log_text.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
         
+        for tag, color in (("green", "#008000"), ("red", "#CC0000"), ("orange", "#FF8C00"),
+                           ("blue", "#0066CC"), ("purple", "#800080")):
+            self.log_text.tag_configure(tag, foreground=color)
+        
+        # Start draining queued log lines and widget updates
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self.drain_log)
+        self.root.after(UI_DRAIN_INTERVAL_MS, self.drain_ui)
+        
         # Initial log message
         self.log("Red Sea Audio/Video Downloader initialized successfully!")
         self.log("Add YouTube URLs to the queue, select your format, and click Download to begin.")
@@ -247,6 +650,34 @@ class RedSeaGUI:
         
         self.root.geometry(f"{width}x{height}+{x}+{y}")
     
+    def on_first_paint(self):
+        """Report startup timing, then load the heavy modules in the background"""
+        mark_startup("first paint")
+        self.log(format_startup_report())
+        
+        def preload():
+            started = time.perf_counter()
+            try:
+                preload_heavy_modules()
+            except Exception as e:
+                self.log(f"⚠️ Warning: could not preload download modules: {e}")
+                return
+            self.log(f"⏱️ Download modules loaded in the background in "
+                     f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        
+        thread = threading.Thread(target=preload)
+        thread.daemon = True
+        thread.start()
+        
+        # Offer to pick up where an interrupted session stopped
+        restored = len(self.engine.restored_items)
+        if restored:
+            self.update_queue_display()
+            if messagebox.askyesno("Resume Downloads",
+                                   f"{restored} item{'s' if restored != 1 else ''} from your last session "
+                                   f"did not finish downloading.\n\nResume downloading now?"):
+                self.start_batch_download()
+    
     def get_logo_path(self):
         """Get the path to the logo file"""
         if getattr(sys, 'frozen', False):
@@ -255,212 +686,107 @@ class RedSeaGUI:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             return os.path.join(script_dir, 'logo.png')
     
-    def get_ffmpeg_path(self):
-        """Get the path to ffmpeg executable"""
-        if getattr(sys, 'frozen', False):
-            return os.path.join(sys._MEIPASS, 'ffmpeg')
-        else:
-            import shutil
-            if shutil.which('ffmpeg'):
-                return None  # Let yt-dlp use the one in PATH
-            
-            # Check common macOS locations for ffmpeg
-            mac_locations = [
-                '/usr/local/bin/ffmpeg',
-                '/opt/homebrew/bin/ffmpeg',
-                '/usr/bin/ffmpeg'
-            ]
-            
-            for location in mac_locations:
-                if os.path.exists(location):
-                    return location
-            
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            local_ffmpeg = os.path.join(script_dir, 'ffmpeg')
-            
-            if os.path.exists(local_ffmpeg):
-                return local_ffmpeg
-            
-            return None
-    
-    def get_title_fast(self, url):
-        """Fast title extraction using HTML parsing"""
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=5)
-            
-            title_match = re.search(r'<title>(.+?)</title>', response.text, re.IGNORECASE)
-            if title_match:
-                title = title_match.group(1)
-                title = title.replace(' - YouTube', '').replace(' - YouTube Music', '')
-                title = title.strip()
-                return title
-            
-            og_title_match = re.search(r'<meta property="og:title" content="(.+?)"', response.text, re.IGNORECASE)
-            if og_title_match:
-                return og_title_match.group(1).strip()
-                
-        except Exception:
-            pass
-        
-        return "Unknown Title"
-    
     def add_to_queue(self):
-        """Add URL to download queue"""
-        url = self.url_entry.get().strip()
-        if not url:
+        """Add one or more URLs (separated by spaces or new lines) to download queue"""
+        urls = self.url_entry.get().split()
+        if not urls:
             messagebox.showerror("Error", "Please enter a YouTube URL")
             return
         
-        if "youtube.com" not in url and "youtu.be" not in url:
-            messagebox.showerror("Error", "Please enter a valid YouTube URL")
-            return
+        for url in urls:
+            if not is_youtube_url(url):
+                messagebox.showerror("Error", "Please enter a valid YouTube URL")
+                return
         
-        # Check if it's a playlist URL
-        if "playlist" in url or "list=" in url:
-            self.add_playlist_to_queue(url)
+        # Playlists are expanded separately
+        video_urls = []
+        for url in urls:
+            if is_playlist_url(url):
+                self.add_playlist_to_queue(url)
+            else:
+                video_urls.append(url)
+        
+        if not video_urls:
             return
         
-        # Check for duplicates
-        for item in self.download_queue:
-            if item['url'] == url:
-                messagebox.showwarning("Duplicate", "This URL is already in the queue")
-                return
+        if not self.engine.new_video_urls(video_urls):
+            messagebox.showwarning("Duplicate", "This URL is already in the queue")
+            return
         
-        # Fetch video title in separate thread
+        # Fetch video titles in separate thread; the queue listener redraws the queue
         def fetch_and_add():
-            try:
-                self.log(f"Fetching title for: {url}")
-                title = self.get_title_fast(url)
-                
-                queue_item = {
-                    'url': url,
-                    'title': title,
-                    'duration': 0
-                }
-                
-                self.download_queue.append(queue_item)
-                self.update_queue_display()
-                self.url_entry.delete(0, tk.END)
-                
-                self.log(f"✅ Added to queue: {title}")
-                
-            except Exception as e:
-                queue_item = {
-                    'url': url,
-                    'title': 'Failed to fetch title',
-                    'duration': 0
-                }
-                self.download_queue.append(queue_item)
-                self.update_queue_display()
-                self.url_entry.delete(0, tk.END)
-                self.log(f"⚠️ Added to queue with unknown title: {url}")
+            self.engine.add_videos(video_urls)
+            self.run_on_ui(self.url_entry.delete, 0, tk.END)
         
         thread = threading.Thread(target=fetch_and_add)
         thread.daemon = True
         thread.start()
     
     def add_playlist_to_queue(self, playlist_url):
-        """Add all videos from a YouTube playlist to the queue"""
+        """Add all videos from a YouTube playlist to the queue as pages arrive"""
+        # Entries are shown by the queue listener as they arrive
         def fetch_playlist():
             try:
-                self.log(f"🎵 Fetching playlist: {playlist_url}")
-                self.log("This may take a moment...")
-                
-                # Configure yt-dlp to extract playlist info only
-                ydl_opts = {
-                    'extract_flat': True,  # Don't download, just get info
-                    'quiet': True,
-                    'no_warnings': True,
-                    'http_headers': {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                    }
-                }
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    playlist_info = ydl.extract_info(playlist_url, download=False)
-                    
-                    if 'entries' not in playlist_info:
-                        self.log("❌ No videos found in playlist")
-                        messagebox.showerror("Error", "No videos found in the playlist")
-                        return
-                    
-                    playlist_title = playlist_info.get('title', 'Unknown Playlist')
-                    entries = playlist_info['entries']
-                    
-                    # Filter out None entries (private/deleted videos)
-                    valid_entries = [entry for entry in entries if entry is not None]
-                    
-                    if not valid_entries:
-                        self.log("❌ No accessible videos found in playlist")
-                        messagebox.showerror("Error", "No accessible videos found in the playlist")
-                        return
-                    
-                    self.log(f"📋 Found playlist: {playlist_title}")
-                    self.log(f"📹 Processing {len(valid_entries)} videos...")
-                    
-                    added_count = 0
-                    skipped_count = 0
-                    
-                    for entry in valid_entries:
-                        video_url = f"https://www.youtube.com/watch?v={entry['id']}"
-                        video_title = entry.get('title', 'Unknown Title')
-                        
-                        # Check for duplicates
-                        duplicate_found = False
-                        for existing_item in self.download_queue:
-                            if existing_item['url'] == video_url:
-                                duplicate_found = True
-                                break
-                        
-                        if duplicate_found:
-                            skipped_count += 1
-                            continue
-                        
-                        # Add to queue
-                        queue_item = {
-                            'url': video_url,
-                            'title': video_title,
-                            'duration': entry.get('duration', 0)
-                        }
-                        
-                        self.download_queue.append(queue_item)
-                        added_count += 1
-                    
-                    self.update_queue_display()
-                    self.url_entry.delete(0, tk.END)
-                    
-                    self.log(f"✅ Added {added_count} videos from playlist")
-                    if skipped_count > 0:
-                        self.log(f"⚠️ Skipped {skipped_count} duplicate videos")
-                    
-                    messagebox.showinfo("Playlist Added", 
-                                       f"Successfully added {added_count} videos from playlist:\n\n"
-                                       f"{playlist_title}\n\n"
-                                       f"{'Skipped ' + str(skipped_count) + ' duplicates' if skipped_count > 0 else ''}")
-                    
+                summary = self.engine.fetch_playlist(playlist_url)
+                self.run_on_ui(self.on_playlist_added, summary)
+            
             except Exception as e:
                 error_msg = str(e)
                 self.log(f"❌ Failed to fetch playlist: {error_msg}")
-                messagebox.showerror("Playlist Error", f"Failed to fetch playlist:\n\n{error_msg}")
+                self.run_on_ui(messagebox.showerror, "Playlist Error", f"Failed to fetch playlist:\n\n{error_msg}")
+            
+            finally:
+                self.run_on_ui(self.update_fetch_button)
         
+        self.stop_fetch_btn.config(state="normal")
         thread = threading.Thread(target=fetch_playlist)
         thread.daemon = True
         thread.start()
     
+    def on_playlist_added(self, summary):
+        """Report a finished playlist fetch (runs on the Tk thread)"""
+        self.url_entry.delete(0, tk.END)
+        
+        skipped_count = summary['skipped']
+        messagebox.showinfo("Playlist Added", 
+                           f"Successfully added {summary['added']} videos from playlist:\n\n"
+                           f"{summary['title']}\n\n"
+                           f"{'Skipped ' + str(skipped_count) + ' duplicates' if skipped_count > 0 else ''}")
+    
+    def update_fetch_button(self):
+        """Disable Stop Fetching once no playlist fetch is running (runs on the Tk thread)"""
+        if not self.engine.is_fetching():
+            self.stop_fetch_btn.config(state="disabled")
+    
+    def stop_playlist_fetch(self):
+        """Stop all running playlist fetches, keeping the entries added so far"""
+        self.engine.stop_playlist_fetch()
+    
     def remove_from_queue(self):
         """Remove selected URL from queue"""
-        selection = self.queue_listbox.curselection()
-        if not selection:
+        key = self.queue_view.get_selected_key()
+        if key is None:
             messagebox.showwarning("No Selection", "Please select a URL to remove")
             return
         
-        index = selection[0]
-        removed_item = self.download_queue.pop(index)
+        # An item the batch is working on stops right away
+        self.engine.cancel_item(key, in_flight_only=True)
+        removed_item = self.download_queue.remove(key)
+        if removed_item is None:
+            return
+        self.update_queue_display()
+        self.log(f"Removed from queue: {removed_item.title}")
+    
+    def move_to_top(self):
+        """Start the selected item next (in queue order or by priority)"""
+        key = self.queue_view.get_selected_key()
+        if key is None:
+            messagebox.showwarning("No Selection", "Please select an item to move")
+            return
+        
+        self.download_queue.set_priority(key, self.download_queue.max_priority() + 1)
+        self.download_queue.move_to_front(key)
         self.update_queue_display()
-        self.log(f"Removed from queue: {removed_item['title']}")
     
     def clear_queue(self):
         """Clear all URLs from queue"""
@@ -472,28 +798,24 @@ class RedSeaGUI:
             self.update_queue_display()
             self.log("Queue cleared")
     
+    def on_queue_change(self, op, payload):
+        """Follow a queue diff (queue listener; runs on whichever thread changed the queue)"""
+        self.queue_view.apply(op, payload)
+        self.request_queue_display()
+    
+    def request_queue_display(self):
+        """Have the Tk thread update the queue display; safe to call from any thread
+        
+        Requests made before the Tk thread gets to it are merged into one update.
+        """
+        if not self._queue_display_requested.is_set():
+            self._queue_display_requested.set()
+            self.run_on_ui(self.update_queue_display)
+    
     def update_queue_display(self):
-        """Update the queue listbox and status"""
-        self.queue_listbox.delete(0, tk.END)
-        
-        for i, item in enumerate(self.download_queue, 1):
-            title = item['title']
-            url = item['url']
-            
-            if len(title) > 50:
-                title = title[:47] + "..."
-            
-            if "youtube.com/watch?v=" in url:
-                video_id = url.split("watch?v=")[1].split("&")[0]
-                url_short = f"youtu.be/{video_id}"
-            elif "youtu.be/" in url:
-                video_id = url.split("youtu.be/")[1].split("?")[0]
-                url_short = f"youtu.be/{video_id}"
-            else:
-                url_short = url[:20] + "..." if len(url) > 20 else url
-            
-            display_text = f"{i}. {title} - {url_short}"
-            self.queue_listbox.insert(tk.END, display_text)
+        """Update the queue listbox and status (Tk thread only)"""
+        self._queue_display_requested.clear()
+        self.queue_view.render()
         
         count = len(self.download_queue)
         self.queue_status.config(text=f"Queue: {count} item{'s' if count != 1 else ''}")
@@ -502,7 +824,7 @@ class RedSeaGUI:
             self.download_btn.config(text="🎵 Add URLs to Queue 🎵", state="disabled")
         else:
             # Don't enable download button if currently downloading
-            if not self.is_downloading:
+            if not self.engine.is_downloading:
                 self.download_btn.config(text=f"🎵 Download {count} Item{'s' if count != 1 else ''} 🎵", state="normal")
             else:
                 self.download_btn.config(text=f"🎵 Download {count} Item{'s' if count != 1 else ''} 🎵", state="disabled")
@@ -520,7 +842,8 @@ class RedSeaGUI:
             clipboard_content = self.root.clipboard_get()
             if "youtube.com" in clipboard_content or "youtu.be" in clipboard_content:
                 self.url_entry.delete(0, tk.END)
-                self.url_entry.insert(0, clipboard_content)
+                # Keep multi-line clipboard contents as space separated URLs
+                self.url_entry.insert(0, " ".join(clipboard_content.split()))
                 self.log("URL pasted from clipboard")
             else:
                 messagebox.showwarning("Warning", "Clipboard doesn't contain a YouTube URL")
@@ -535,40 +858,84 @@ class RedSeaGUI:
             self.log(f"Output directory changed to: {folder}")
     
     def log(self, message):
-        """Add message to log with color coding"""
-        from datetime import datetime
+        """Queue a message for the log; safe to call from any thread and never blocks"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        
-        # Insert message
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        
-        # Color coding based on message content
-        line_start = f"{self.log_text.index(tk.END)}-2l"  # -2l because we just added a line
-        line_end = f"{self.log_text.index(tk.END)}-2l lineend"
-        
-        # Configure color tags if not already done
-        if not hasattr(self, '_tags_configured'):
-            self.log_text.tag_configure("green", foreground="#008000")
-            self.log_text.tag_configure("red", foreground="#CC0000")
-            self.log_text.tag_configure("orange", foreground="#FF8C00")
-            self.log_text.tag_configure("blue", foreground="#0066CC")
-            self.log_text.tag_configure("purple", foreground="#800080")
-            self._tags_configured = True
-        
-        # Apply colors based on message content
-        if "✅" in message or "Completed successfully" in message or "Successful:" in message:
-            self.log_text.tag_add("green", line_start, line_end)
-        elif "❌" in message or "Failed:" in message or "Error:" in message:
-            self.log_text.tag_add("red", line_start, line_end)
-        elif "⚠️" in message or "Warning" in message or "unknown title" in message:
-            self.log_text.tag_add("orange", line_start, line_end)
-        elif "Starting:" in message or "Downloading" in message or "Fetching" in message:
-            self.log_text.tag_add("blue", line_start, line_end)
-        elif "📊" in message or "Batch Download Complete" in message or "Duration:" in message:
-            self.log_text.tag_add("purple", line_start, line_end)
-        
-        self.log_text.see(tk.END)
-        self.root.update()
+        self.log_queue.put((f"[{timestamp}] {message}\n", get_log_tag(message)))
+    
+    def run_on_ui(self, function, *args):
+        """Queue function(*args) to run on the Tk thread; safe to call from any thread and never blocks"""
+        self.ui_queue.put((function, args))
+    
+    def drain_ui(self):
+        """Run widget updates queued by other threads (runs on the Tk thread)"""
+        try:
+            for _ in range(UI_DRAIN_BATCH):
+                try:
+                    function, args = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                function(*args)
+        finally:
+            self.root.after(UI_DRAIN_INTERVAL_MS, self.drain_ui)
+    
+    def drain_log(self):
+        """Write queued log lines into the log widget (runs on the Tk thread)"""
+        try:
+            runs = []
+            for _ in range(LOG_DRAIN_BATCH):
+                try:
+                    line, tag = self.log_queue.get_nowait()
+                except queue.Empty:
+                    break
+                
+                if self.file_logger:
+                    self.file_logger.info(line.rstrip("\n"))
+                
+                # Coalesce consecutive lines with the same color into one insert
+                if runs and runs[-1][1] == tag:
+                    runs[-1][0].append(line)
+                else:
+                    runs.append(([line], tag))
+            
+            if runs:
+                for lines, tag in runs:
+                    self.log_text.insert(tk.END, "".join(lines), tag or ())
+                
+                # Keep only the newest lines in the widget
+                line_count = int(self.log_text.index("end-1c").split(".")[0])
+                if line_count > MAX_LOG_LINES:
+                    self.log_text.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
+                
+                self.log_text.see(tk.END)
+        finally:
+            # Come back sooner if there is still a backlog
+            delay = 10 if not self.log_queue.empty() else LOG_DRAIN_INTERVAL_MS
+            self.root.after(delay, self.drain_log)
+    
+    def toggle_log_file(self):
+        """Start or stop copying the log to a rotating file"""
+        if self.log_to_file_var.get():
+            log_dir = get_log_dir()
+            try:
+                os.makedirs(log_dir, exist_ok=True)
+                handler = RotatingFileHandler(os.path.join(log_dir, "redsea.log"),
+                                              maxBytes=2 * 1024 * 1024, backupCount=3, encoding="utf-8")
+            except OSError as e:
+                self.log_to_file_var.set(False)
+                self.log(f"⚠️ Could not open log file: {e}")
+                return
+            
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.file_logger = logging.getLogger("redsea")
+            self.file_logger.setLevel(logging.INFO)
+            self.file_logger.propagate = False
+            self.file_logger.addHandler(handler)
+            self.log(f"Saving log to: {os.path.join(log_dir, 'redsea.log')}")
+        elif self.file_logger:
+            for handler in list(self.file_logger.handlers):
+                self.file_logger.removeHandler(handler)
+                handler.close()
+            self.file_logger = None
     
     def start_batch_download(self):
         """Start batch download of all URLs in queue"""
@@ -576,144 +943,159 @@ class RedSeaGUI:
             messagebox.showerror("Empty Queue", "Please add some URLs to the queue first")
             return
         
-        if self.is_downloading:
+        if self.engine.is_downloading:
             messagebox.showwarning("Download In Progress", "A download is already in progress")
             return
         
         # Clear any previous cancellation
-        self.cancel_event.clear()
-        self.is_downloading = True
+        self.engine.cancel_event.clear()
+        self.engine.is_downloading = True
+        self.apply_settings()
         
         # Update UI states
         self.download_btn.config(state="disabled")
         self.cancel_btn.config(state="normal")
+        self.cancel_item_btn.config(state="normal")
+        self.progress.config(mode='determinate', value=0)
+        self.progress_label.config(text=f"0/{len(self.download_queue)} items")
         
         self.current_download_thread = threading.Thread(target=self.batch_download)
         self.current_download_thread.daemon = True
         self.current_download_thread.start()
+        
+        self.root.after(TELEMETRY_REFRESH_MS, self.refresh_telemetry)
+    
+    def apply_settings(self):
+        """Copy the download options from the widgets to the engine"""
+        self.engine.output_path = self.output_var.get()
+        self.engine.format_choice = self.format_var.get()
+        self.engine.quality = self.quality_var.get()
+        self.engine.single_fetch = self.single_fetch_var.get()
+        self.engine.use_archive = self.skip_downloaded_var.get()
+        self.engine.fragment_concurrency = self.fragments_var.get()
+        self.apply_schedule()
+        try:
+            limit = self.bandwidth_var.get()
+            self.engine.bandwidth.limit = None if limit == "Unlimited" else parse_bytes(limit) or None
+        except ValueError:
+            self.log(f"⚠️ Invalid bandwidth limit '{self.bandwidth_var.get()}', downloading without a limit")
+            self.engine.bandwidth.limit = None
+        try:
+            self.engine.workers = int(self.workers_var.get())
+        except (ValueError, tk.TclError):
+            self.engine.workers = DEFAULT_WORKERS
+    
+    def apply_schedule(self):
+        """Set the download order; items not started yet follow it, even in a running batch"""
+        for policy, text in SCHEDULE_TEXT.items():
+            if text == self.order_var.get():
+                self.engine.schedule = policy
+    
+    def refresh_telemetry(self):
+        """Show live transfer statistics (runs on the Tk thread while downloading)"""
+        if not self.engine.is_downloading:
+            self._set_current_progress(None)
+            self.transfer_label.config(text="")
+            return
+        
+        batch = self.engine.telemetry.snapshot()['batch']
+        self._set_current_progress(batch['active_percent'])
+        
+        parts = [f"{format_bytes(batch['speed'])}/s",
+                 f"{format_bytes(batch['transferred'])} downloaded"]
+        if batch['remaining']:
+            parts.append(f"{format_bytes(batch['remaining'])} left")
+        if batch['eta'] is not None:
+            parts.append(f"ETA {format_duration(batch['eta'])}")
+        usage_text = self.engine.get_bandwidth_usage_text()
+        if usage_text:
+            parts.append(f"limited: {usage_text}")
+        self.transfer_label.config(text=" • ".join(parts))
+        
+        self.root.after(TELEMETRY_REFRESH_MS, self.refresh_telemetry)
+    
+    def _set_current_progress(self, percent):
+        """Show a determinate percentage, or spin while sizes are unknown"""
+        if percent is None and self.engine.is_downloading:
+            if not self._current_progress_spinning:
+                self.current_progress.config(mode='indeterminate')
+                self.current_progress.start()
+                self._current_progress_spinning = True
+            return
+        
+        if self._current_progress_spinning:
+            self.current_progress.stop()
+            self._current_progress_spinning = False
+        self.current_progress.config(mode='determinate', value=percent or 0)
     
     def cancel_download(self):
         """Cancel the entire download operation"""
-        if not self.is_downloading:
+        if not self.engine.is_downloading:
             return
         
         if messagebox.askyesno("Cancel Downloads", "Are you sure you want to cancel the download operation?"):
-            self.cancel_event.set()
-            self.log("❌ Download cancellation requested...")
+            self.engine.cancel()
             self.status_label.config(text="Cancelling download...")
     
+    def on_close(self):
+        """Quit, cancelling any running batch; main() waits for it in engine.close()"""
+        if self.engine.is_downloading:
+            if not messagebox.askyesno("Quit", "A download is in progress. Cancel it and quit?"):
+                return
+            self.engine.cancel()
+        self.engine.stop_playlist_fetch()
+        self.root.destroy()
+    
+    def cancel_selected(self):
+        """Cancel the selected item, leaving the rest of the batch running"""
+        key = self.queue_view.get_selected_key()
+        if key is None:
+            messagebox.showwarning("No Selection", "Please select an item to cancel")
+            return
+        
+        self.engine.cancel_item(key)
+    
+    def on_item_start(self, i, total, item):
+        """Show the item a worker just started on (engine callback, run on the Tk thread)"""
+        self.status_label.config(text=f"Downloading {i}/{total}: {item.title} ({self.engine.get_format_text()})")
+        self.queue_view.show(item.key)
+    
+    def on_batch_progress(self, finished, total):
+        """Update overall progress as soon as any worker finishes (engine callback, run on the Tk thread)"""
+        progress_percent = (finished / total) * 100
+        self.progress.config(value=progress_percent)
+        self.progress_label.config(text=f"{finished}/{total} items")
+    
     def batch_download(self):
-        """Download all URLs in the queue"""
+        """Run the engine's batch download (on the download thread) and hand the outcome to the Tk thread"""
         try:
-            # Don't disable download_btn here - it's already done in start_batch_download
-            # Don't start progress here - we'll set specific values
-            
-            total_urls = len(self.download_queue)
-            output_path = self.output_var.get()
-            os.makedirs(output_path, exist_ok=True)
-            
-            self.log(f"Starting batch download of {total_urls} items...")
-            
-            # Initialize progress to 0
-            self.progress.config(mode='determinate', value=0)
-            self.progress_label.config(text=f"0/{total_urls} items")
-            
-            successful_downloads = 0
-            failed_downloads = 0
+            summary = self.engine.batch_download()
+        except Exception as e:
+            self.run_on_ui(self.on_batch_finished, None, e)
+        else:
+            self.run_on_ui(self.on_batch_finished, summary, None)
+    
+    def on_batch_finished(self, summary, error):
+        """Report the outcome of a batch and reset the controls (runs on the Tk thread)"""
+        try:
+            # A failed batch is reported by the except clause below
+            if error is not None:
+                raise error
             
-            for i, item in enumerate(self.download_queue, 1):
-                # Check for cancellation before each download
-                if self.cancel_event.is_set():
-                    self.log("❌ Download cancelled by user")
-                    self.status_label.config(text="Download cancelled")
-                    break
-                
-                url = item['url']
-                title = item['title']
-                try:
-                    # Update overall progress
-                    progress_percent = ((i-1) / total_urls) * 100
-                    self.progress.config(value=progress_percent)
-                    self.progress_label.config(text=f"{i-1}/{total_urls} items")
-                    
-                    # Start current item progress (spinning)
-                    self.current_progress.start()
-                    
-                    format_choice = self.format_var.get()
-                    format_text = {
-                        'mp3': 'MP3 audio',
-                        'mp4': 'MP4 video', 
-                        'both': 'MP3 + MP4'
-                    }.get(format_choice, 'files')
-                    
-                    self.status_label.config(text=f"Downloading {i}/{total_urls}: {title} ({format_text})")
-                    self.log(f"[{i}/{total_urls}] Starting: {title} ({format_text})")
-                    
-                    self.queue_listbox.selection_clear(0, tk.END)
-                    self.queue_listbox.selection_set(i-1)
-                    self.queue_listbox.see(i-1)
-                    
-                    # Check cancellation again before starting download
-                    if self.cancel_event.is_set():
-                        self.current_progress.stop()
-                        self.log("❌ Download cancelled by user")
-                        break
-                    
-                    self.download_single_url(url, output_path)
-                    
-                    # Stop current item progress
-                    self.current_progress.stop()
-                    
-                    # Check if cancelled during download
-                    if self.cancel_event.is_set():
-                        self.log(f"[{i}/{total_urls}] ❌ {title} - Download cancelled")
-                        break
-                    
-                    successful_downloads += 1
-                    format_choice = self.format_var.get()
-                    format_text = {
-                        'mp3': 'MP3 audio',
-                        'mp4': 'MP4 video', 
-                        'both': 'MP3 + MP4'
-                    }.get(format_choice, 'files')
-                    self.log(f"[{i}/{total_urls}] ✅ {title} ({format_text}) - Completed successfully")
-                    
-                    # Update progress after completion
-                    progress_percent = (i / total_urls) * 100
-                    self.progress.config(value=progress_percent)
-                    self.progress_label.config(text=f"{i}/{total_urls} items")
-                    
-                except Exception as e:
-                    # Stop current item progress on error too
-                    self.current_progress.stop()
-                    
-                    # Check if the error was due to cancellation
-                    if self.cancel_event.is_set():
-                        self.log(f"[{i}/{total_urls}] ❌ {title} - Download cancelled")
-                        break
-                    
-                    failed_downloads += 1
-                    self.log(f"[{i}/{total_urls}] ❌ {title} - Failed: {str(e)}")
-                    
-                    # Still update progress even on failure
-                    progress_percent = (i / total_urls) * 100
-                    self.progress.config(value=progress_percent)
-                    self.progress_label.config(text=f"{i}/{total_urls} items")
-                    continue
+            total_urls = summary['total']
+            output_path = summary['output_path']
             
             # Check if cancelled before showing completion
-            if not self.cancel_event.is_set():
+            if not summary['cancelled']:
                 # Final progress - 100%
                 self.progress.config(value=100)
                 self.progress_label.config(text=f"{total_urls}/{total_urls} items - Complete!")
                 
-                self.log(f"\n📊 Batch Download Complete!")
-                self.log(f"✅ Successful: {successful_downloads}")
-                self.log(f"❌ Failed: {failed_downloads}")
-                self.log(f"📁 Files saved to: {output_path}")
-                
+                skipped_text = (f"Skipped {summary['skipped']} already downloaded.\n\n"
+                                if summary['skipped'] else "")
                 messagebox.showinfo("Batch Download Complete", 
-                                   f"Downloaded {successful_downloads} out of {total_urls} videos.\n\n"
+                                   f"Downloaded {summary['successful']} out of {total_urls} videos.\n\n"
+                                   f"{skipped_text}"
                                    f"Files saved to: {output_path}")
                 
                 if messagebox.askyesno("Clear Queue", "Would you like to clear the completed queue?"):
@@ -727,15 +1109,9 @@ class RedSeaGUI:
                         self.log(f"Could not open folder: {e}")
             else:
                 # Download was cancelled
+                self.status_label.config(text="Download cancelled")
                 self.progress.config(value=0)
                 self.progress_label.config(text="Download cancelled")
-                if successful_downloads > 0:
-                    self.log(f"\n📊 Download Cancelled - Partial Results:")
-                    self.log(f"✅ Completed before cancellation: {successful_downloads}")
-                    self.log(f"❌ Failed: {failed_downloads}")
-                    self.log(f"📁 Files saved to: {output_path}")
-                else:
-                    self.log(f"\n❌ Download cancelled - no files completed")
         
         except Exception as e:
             self.log(f"❌ Batch download error: {str(e)}")
@@ -743,11 +1119,11 @@ class RedSeaGUI:
         
         finally:
             # Reset download state
-            self.is_downloading = False
+            self.engine.is_downloading = False
             self.current_download_thread = None
             
             # Reset progress if not cancelled (to avoid overriding cancellation message)
-            if not self.cancel_event.is_set():
+            if not self.engine.cancel_event.is_set():
                 self.progress.config(value=0)
                 self.progress_label.config(text="")
                 self.status_label.config(text="Ready to download")
@@ -755,110 +1131,8 @@ class RedSeaGUI:
             # Reset button states
             self.download_btn.config(state="normal")
             self.cancel_btn.config(state="disabled")
-            self.queue_listbox.selection_clear(0, tk.END)
-    
-    def download_single_url(self, url, output_path):
-        """Download a single URL in the selected format(s) with cancellation support"""
-        # Check for cancellation before starting
-        if self.cancel_event.is_set():
-            raise Exception("Download cancelled by user")
-        
-        ffmpeg_path = self.get_ffmpeg_path()
-        if ffmpeg_path and not os.path.exists(ffmpeg_path):
-            raise Exception(f"FFmpeg not found at: {ffmpeg_path}")
-        
-        # Custom progress hook to check for cancellation
-        def progress_hook(d):
-            if self.cancel_event.is_set():
-                raise Exception("Download cancelled by user")
-        
-        # Get format selection
-        format_choice = self.format_var.get()
-        
-        # First, extract video info
-        info_opts = {
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-        }
-        
-        with yt_dlp.YoutubeDL(info_opts) as ydl:
-            if self.cancel_event.is_set():
-                raise Exception("Download cancelled by user")
-            
-            info = ydl.extract_info(url, download=False)
-            title = info.get('title', 'Unknown')
-            duration = info.get('duration', 0)
-            
-            self.log(f"Video title: {title}")
-            if duration:
-                minutes = duration // 60
-                seconds = duration % 60
-                self.log(f"Duration: {minutes}:{seconds:02d}")
-        
-        # Download based on format choice
-        if format_choice == "mp3":
-            self._download_mp3(url, output_path, progress_hook, ffmpeg_path)
-        elif format_choice == "mp4":
-            self._download_mp4(url, output_path, progress_hook, ffmpeg_path)
-        elif format_choice == "both":
-            self.log("Downloading MP3 audio...")
-            self._download_mp3(url, output_path, progress_hook, ffmpeg_path)
-            
-            if self.cancel_event.is_set():
-                raise Exception("Download cancelled by user")
-            
-            self.log("Downloading MP4 video...")
-            self._download_mp4(url, output_path, progress_hook, ffmpeg_path)
-    
-    def _download_mp3(self, url, output_path, progress_hook, ffmpeg_path):
-        """Download MP3 audio only"""
-        if self.cancel_event.is_set():
-            raise Exception("Download cancelled by user")
-        
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': self.quality_var.get(),
-            }],
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            },
-            'progress_hooks': [progress_hook],
-            'extractor_retries': 3,
-            'fragment_retries': 3,
-        }
-        
-        if ffmpeg_path:
-            ydl_opts['ffmpeg_location'] = ffmpeg_path
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-    
-    def _download_mp4(self, url, output_path, progress_hook, ffmpeg_path):
-        """Download MP4 video"""
-        if self.cancel_event.is_set():
-            raise Exception("Download cancelled by user")
-        
-        ydl_opts = {
-            'format': 'best[ext=mp4]/best',
-            'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            },
-            'progress_hooks': [progress_hook],
-            'extractor_retries': 3,
-            'fragment_retries': 3,
-        }
-        
-        if ffmpeg_path:
-            ydl_opts['ffmpeg_location'] = ffmpeg_path
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+            self.cancel_item_btn.config(state="disabled")
+            self.queue_view.clear_selection()
 
 def main():
     """Main function to run the GUI"""
@@ -874,7 +1148,12 @@ def main():
         pass
     
     app = RedSeaGUI(root)
-    root.mainloop()
+    mark_startup("window")
+    root.after_idle(app.on_first_paint)
+    try:
+        root.mainloop()
+    finally:
+        app.engine.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -37,6 +37,7 @@ a = Analysis(
         'PIL._tkinter_finder',
         'requests',
         'yt_dlp',
+        'redsea',
     ],
     hookspath=[],
     hooksconfig={},
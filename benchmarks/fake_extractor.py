@@ -0,0 +1,110 @@
+"""Stand-in yt-dlp extractor that answers YouTube URLs from a local MediaServer
+
+Registered on a DownloadEngine with extractors=[BenchmarkIE], it takes
+watch and playlist URLs before yt-dlp's own YouTube extractor does, so the
+engine's YouTube handling (video IDs, metadata cache, archive, playlist
+streaming) runs unchanged without the internet:
+
+    BenchmarkIE.configure(server, videos={'bench000001': 'progressive'},
+                          playlists={'PLbench': ['bench000001']})
+"""
+
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import ExtractorError
+
+def benchmark_video_id(index):
+    """Get the 11 character video ID of the index-th benchmark video"""
+    return f"bench{index:06d}"
+
+class BenchmarkIE(InfoExtractor):
+    IE_NAME = 'redsea:benchmark'
+    _VALID_URL = (r'https?://(?:www\.)?youtube\.com/(?:watch\?v=(?P<id>[\w-]{11})'
+                  r'|playlist\?list=(?P<list>[\w-]+))')
+    
+    # Set by configure(): the MediaServer, video ID -> 'progressive' or 'hls'
+    # and playlist ID -> list of video IDs
+    server = None
+    videos = {}
+    playlists = {}
+    
+    @classmethod
+    def configure(cls, server, videos, playlists=None):
+        cls.server = server
+        cls.videos = dict(videos)
+        cls.playlists = dict(playlists or {})
+    
+    def _real_extract(self, url):
+        video_id, playlist_id = self._match_valid_url(url).group('id', 'list')
+        if playlist_id:
+            return self._extract_playlist(playlist_id)
+        
+        kind = self.videos.get(video_id)
+        if kind is None:
+            raise ExtractorError('Video unavailable', expected=True)
+        
+        return {
+            'id': video_id,
+            'title': f"Benchmark {kind} {video_id}",
+            'duration': self._duration(kind),
+            'formats': self._formats(video_id, kind),
+        }
+    
+    def _extract_playlist(self, playlist_id):
+        if playlist_id not in self.playlists:
+            raise ExtractorError('This playlist does not exist', expected=True)
+        
+        # Entries are generated lazily, like the pages of a real playlist
+        def entries():
+            for video_id in self.playlists[playlist_id]:
+                kind = self.videos[video_id]
+                yield self.url_result(f"https://www.youtube.com/watch?v={video_id}", self.ie_key(), video_id,
+                                      f"Benchmark {kind} {video_id}", duration=self._duration(kind))
+        
+        return self.playlist_result(entries(), playlist_id, f"Benchmark playlist {playlist_id}")
+    
+    def _duration(self, kind):
+        server = self.server
+        if kind == 'hls':
+            return int(server.segments * server.segment_duration)
+        return int(server.media_duration)
+    
+    def _formats(self, video_id, kind):
+        server = self.server
+        if kind == 'hls':
+            return [{
+                'format_id': 'hls-audio',
+                'url': server.hls_url(f"{video_id}-audio"),
+                'protocol': 'm3u8_native',
+                'ext': 'mp4',
+                'vcodec': 'none',
+                'acodec': 'mp4a.40.2',
+                'abr': 128,
+                'filesize_approx': server.hls_size,
+            }, {
+                'format_id': 'hls-video',
+                'url': server.hls_url(video_id),
+                'protocol': 'm3u8_native',
+                'ext': 'mp4',
+                'vcodec': 'avc1.4d401f',
+                'acodec': 'mp4a.40.2',
+                'height': 360,
+                'filesize_approx': server.hls_size,
+            }]
+        
+        return [{
+            'format_id': 'audio',
+            'url': server.media_url(f"{video_id}-audio", 'wav'),
+            'ext': 'wav',
+            'vcodec': 'none',
+            'acodec': 'pcm_s16le',
+            'abr': 128,
+            'filesize': server.media_size,
+        }, {
+            'format_id': 'video',
+            'url': server.media_url(video_id, 'mp4'),
+            'ext': 'mp4',
+            'vcodec': 'avc1.4d401f',
+            'acodec': 'mp4a.40.2',
+            'height': 360,
+            'filesize': server.media_size,
+        }]
@@ -0,0 +1,69 @@
+"""Benchmark concurrent fragment downloads against a local HLS server
+
+Downloads the same synthetic HLS items with each fixed fragment
+concurrency and in auto mode, and prints time and throughput per setting:
+
+    python3 benchmarks/fragment_concurrency.py --latency 0.05 --bandwidth 2000000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_server import MediaServer
+from redsea import DownloadEngine, QueueItem
+from redsea.fragments import FRAGMENT_CONCURRENCY_STEPS
+from redsea.util import format_bytes
+
+def run_batch(server, concurrency, items, workers):
+    """Download that many HLS items at one fragment concurrency; returns (seconds, fragment tuner stats)"""
+    # Caches, archive and journal live in the work directory, not the user's own
+    workdir = tempfile.mkdtemp(prefix="redsea-bench-")
+    engine = DownloadEngine(output_path=os.path.join(workdir, "output"), format_choice="mp4", workers=workers,
+                            use_archive=False, fragment_concurrency=concurrency, quiet=True,
+                            log=lambda message: None, state_dir=os.path.join(workdir, "state"))
+    try:
+        engine.queue.extend(QueueItem(server.hls_url(f"{concurrency}-{i}"), f"item {i}")
+                            for i in range(items))
+        started = time.perf_counter()
+        summary = engine.batch_download()
+        elapsed = time.perf_counter() - started
+        if summary['failed']:
+            raise SystemExit(f"{summary['failed']} downloads failed at concurrency {concurrency}")
+        return elapsed, engine.fragment_tuner.stats()
+    finally:
+        engine.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=4, help='items per setting (default: 4)')
+    parser.add_argument('--auto-items', type=int, default=12, help='items for the auto run (default: 12)')
+    parser.add_argument('--workers', type=int, default=1, help='parallel item downloads (default: 1)')
+    parser.add_argument('--segments', type=int, default=40, help='segments per item (default: 40)')
+    parser.add_argument('--segment-size', type=int, default=256 * 1024, help='bytes per segment')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every request')
+    parser.add_argument('--bandwidth', type=float, default=2e6, help='bytes/s per connection (0: unlimited)')
+    parser.add_argument('--link-bandwidth', type=float, default=0, help='bytes/s for all connections (0: unlimited)')
+    args = parser.parse_args(argv)
+    
+    item_bytes = args.segments * (args.segment_size // 188) * 188
+    settings = list(FRAGMENT_CONCURRENCY_STEPS) + ['auto']
+    
+    with MediaServer(segments=args.segments, segment_size=args.segment_size, latency=args.latency,
+                     bandwidth=args.bandwidth or None, link_bandwidth=args.link_bandwidth or None) as server:
+        print(f"{'fragments':>10} {'items':>6} {'seconds':>8} {'throughput':>12}")
+        for concurrency in settings:
+            items = args.auto_items if concurrency == 'auto' else args.items
+            elapsed, tuner_stats = run_batch(server, concurrency, items, args.workers)
+            throughput = items * item_bytes / elapsed
+            label = f"auto->{tuner_stats['current']}" if concurrency == 'auto' else str(concurrency)
+            print(f"{label:>10} {items:>6} {elapsed:>8.2f} {format_bytes(throughput) + '/s':>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Local HTTP server serving synthetic progressive and segmented (HLS) test media
+
+Used by the benchmarks to exercise the download engine without the internet.
+Every response can be delayed by a fixed per-request latency, and each
+connection can be capped to a bandwidth, which is what makes concurrent
+fragment downloads pay off on real CDNs. A shared link cap models a
+saturated uplink, and a fraction of requests can be answered with an
+error status to exercise retries.
+
+    /media/<name>.wav             progressive audio (valid PCM WAV, so ffmpeg can encode it)
+    /media/<name>.mp4             progressive video (random payload)
+    /hls/<name>.m3u8              media playlist for item <name>
+    /hls/<name>/seg<index>.ts     one segment of it
+"""
+
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHUNK_SIZE = 16 * 1024
+
+# Synthetic WAV audio: 8 kHz, mono, 16 bit
+WAV_RATE = 8000
+WAV_BYTES_PER_SECOND = WAV_RATE * 2
+
+def make_wav(size):
+    """Build a PCM WAV file of size bytes filled with noise"""
+    data_size = max(0, size - 44) & ~1
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, 1,
+                         WAV_RATE, WAV_BYTES_PER_SECOND, 2, 16, b'data', data_size)
+    noise = os.urandom(64 * 1024)
+    return header + (noise * (data_size // len(noise) + 1))[:data_size]
+
+def make_mp4(size):
+    """Build size bytes that start like an MP4 file"""
+    header = b'\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2'
+    noise = os.urandom(64 * 1024)
+    return header + (noise * (size // len(noise) + 1))[:max(0, size - len(header))]
+
+class _Link:
+    """Token bucket shared by all connections to model a link of limited bandwidth"""
+    
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def take(self, amount):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response are expected, e.g. on cancellation
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class MediaServer:
+    """Synthetic media server running on a background thread.
+    
+    latency is added before every response (seconds), bandwidth caps each
+    connection and link_bandwidth all of them together (bytes per second,
+    None for unlimited). error_rate is the fraction of requests answered
+    with error_status instead; the choice is seeded, so runs are repeatable.
+    Progressive media files are media_size bytes.
+    """
+    
+    def __init__(self, segments=40, segment_size=256 * 1024, segment_duration=2.0,
+                 media_size=2 * 1024 * 1024, latency=0.0, bandwidth=None, link_bandwidth=None,
+                 error_rate=0.0, error_status=503, seed=0, host="127.0.0.1", port=0):
+        self.segments = segments
+        self.segment_size = segment_size
+        self.segment_duration = segment_duration
+        self.media_size = media_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.link = _Link(link_bandwidth)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self._stats_lock = threading.Lock()
+        
+        self._media = {'wav': make_wav(media_size), 'mp4': make_mp4(media_size)}
+        
+        # MPEG-TS packets are 188 bytes and start with a 0x47 sync byte
+        packet = b'\x47' + os.urandom(187)
+        self._segment = packet * (segment_size // 188)
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_GET(self):
+                server._handle(self)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.httpd = _QuietHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+    
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def hls_url(self, name):
+        return f"{self.base_url}/hls/{name}.m3u8"
+    
+    def media_url(self, name, ext):
+        return f"{self.base_url}/media/{name}.{ext}"
+    
+    @property
+    def media_duration(self):
+        """Duration of the progressive WAV audio in seconds"""
+        return self.media_size / WAV_BYTES_PER_SECOND
+    
+    @property
+    def hls_size(self):
+        """Bytes in all segments of one HLS item"""
+        return self.segments * len(self._segment)
+    
+    def playlist(self, name):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3",
+                 f"#EXT-X-TARGETDURATION:{int(self.segment_duration + 0.999)}",
+                 "#EXT-X-MEDIA-SEQUENCE:0"]
+        for index in range(self.segments):
+            lines.append(f"#EXTINF:{self.segment_duration:.3f},")
+            lines.append(f"{name}/seg{index}.ts")
+        lines.append("#EXT-X-ENDLIST")
+        return ("\n".join(lines) + "\n").encode()
+    
+    def _handle(self, request):
+        with self._stats_lock:
+            self.requests += 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return request.send_error(self.error_status)
+        
+        path = request.path.split("?", 1)[0]
+        match = re.fullmatch(r"/media/([\w-]+)\.(wav|mp4)", path)
+        if match:
+            content_type = "audio/wav" if match.group(2) == "wav" else "video/mp4"
+            return self._send_range(request, self._media[match.group(2)], content_type)
+        match = re.fullmatch(r"/hls/([\w-]+)\.m3u8", path)
+        if match:
+            return self._send(request, self.playlist(match.group(1)), "application/vnd.apple.mpegurl")
+        match = re.fullmatch(r"/hls/([\w-]+)/seg(\d+)\.ts", path)
+        if match and int(match.group(2)) < self.segments:
+            return self._send(request, self._segment, "video/mp2t")
+        request.send_error(404)
+    
+    def _send_range(self, request, body, content_type):
+        """Send body, or the part of it asked for by a 'Range: bytes=start-end' header"""
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("Range", ""))
+        if not match:
+            return self._send(request, body, content_type, extra_headers={"Accept-Ranges": "bytes"})
+        
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+        if start > end:
+            request.send_response(416)
+            request.send_header("Content-Range", f"bytes */{len(body)}")
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+        self._send(request, body[start:end + 1], content_type, status=206,
+                   extra_headers={"Content-Range": f"bytes {start}-{end}/{len(body)}", "Accept-Ranges": "bytes"})
+    
+    def _send(self, request, body, content_type, status=200, extra_headers=None):
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        
+        started = time.monotonic()
+        sent = 0
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start:start + CHUNK_SIZE]
+            self.link.take(len(chunk))
+            request.wfile.write(chunk)
+            sent += len(chunk)
+            if self.bandwidth:
+                ahead = sent / self.bandwidth - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        
+        with self._stats_lock:
+            self.bytes_sent += sent
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,235 @@
+"""Offline benchmark suite for the download engine
+
+Runs each scenario against a local MediaServer through the stand-in
+BenchmarkIE, so add_videos/fetch_playlist, batch_download and
+download_single_url run exactly as they do for YouTube, without the
+internet. Every scenario runs in a fresh Python process so its peak RSS is
+its own.
+
+    python3 benchmarks/run_benchmarks.py -o results.json
+    python3 benchmarks/run_benchmarks.py --baseline baseline.json
+
+Results are written as JSON; with --baseline, each metric is compared to
+the stored run and the exit code is 1 if any got worse than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redsea.util import format_bytes, get_ffmpeg_path
+
+# Scenario name -> media kind, output format, default item count and options
+SCENARIOS = {
+    'progressive': {'kind': 'progressive', 'format': 'mp4', 'items': 8,
+                    'description': 'progressive MP4 downloads'},
+    'hls': {'kind': 'hls', 'format': 'mp4', 'items': 8,
+            'description': 'segmented (HLS) MP4 downloads'},
+    'playlist': {'kind': 'progressive', 'format': 'mp4', 'items': 12, 'playlist': True,
+                 'description': 'playlist streamed into a running batch'},
+    'flaky': {'kind': 'hls', 'format': 'mp4', 'items': 8, 'error_rate': 0.05,
+              'description': 'HLS downloads with 5% of requests failing with 503'},
+    'mp3': {'kind': 'progressive', 'format': 'mp3', 'items': 6, 'needs_ffmpeg': True,
+            'description': 'progressive audio transcoded to MP3'},
+    'audio': {'kind': 'hls', 'format': 'audio', 'items': 6, 'needs_ffmpeg': True,
+              'description': 'HLS AAC audio copied into .m4a without re-encoding'},
+}
+
+# Compared metrics, whether a higher value is better and the smallest
+# absolute change that can count as a regression (below it is noise)
+METRICS = (
+    ('items_per_sec', True, 0),
+    ('ttfb_median', False, 0.05),
+    ('wire_bytes', False, 0),
+    ('transcode_seconds', False, 0.05),
+    ('peak_rss', False, 1024 * 1024),
+)
+
+def peak_rss():
+    """Get the peak resident set size of this process and of its finished children (bytes)"""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+def run_scenario(name, args):
+    """Run one scenario in this process and return its metrics"""
+    from media_server import MediaServer
+    from fake_extractor import BenchmarkIE, benchmark_video_id
+    from redsea import DownloadEngine
+    
+    scenario = SCENARIOS[name]
+    items = args.items or scenario['items']
+    error_rate = args.error_rate if args.error_rate is not None else scenario.get('error_rate', 0.0)
+    
+    workdir = tempfile.mkdtemp(prefix=f"redsea-bench-{name}-")
+    server = MediaServer(segments=args.segments, media_size=args.media_size, latency=args.latency,
+                         bandwidth=args.bandwidth or None, link_bandwidth=args.link_bandwidth or None,
+                         error_rate=error_rate).start()
+    try:
+        ids = [benchmark_video_id(i) for i in range(items)]
+        BenchmarkIE.configure(server, {video_id: scenario['kind'] for video_id in ids}, {'PLbenchmark': ids})
+        
+        engine = DownloadEngine(output_path=os.path.join(workdir, "output"), format_choice=scenario['format'],
+                                workers=args.workers, use_archive=False, quiet=True, log=lambda message: None,
+                                state_dir=os.path.join(workdir, "state"), extractors=[BenchmarkIE])
+        try:
+            started = time.perf_counter()
+            if scenario.get('playlist'):
+                # As in the front ends: the batch starts while the listing streams in
+                engine.start_playlist_fetch("https://www.youtube.com/playlist?list=PLbenchmark")
+            else:
+                engine.add_videos([f"https://www.youtube.com/watch?v={video_id}" for video_id in ids],
+                                  resolve_titles=False)
+            
+            summary = engine.batch_download()
+            elapsed = time.perf_counter() - started
+            batch = engine.telemetry.snapshot()['batch']
+        finally:
+            engine.close()
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    rss, children_rss = peak_rss()
+    return {
+        'description': scenario['description'],
+        'items': items,
+        'successful': summary['successful'],
+        'failed': summary['failed'],
+        'seconds': elapsed,
+        'items_per_sec': summary['successful'] / elapsed,
+        'ttfb_average': batch['first_byte_average'],
+        'ttfb_median': batch['first_byte_median'],
+        'wire_bytes': server.bytes_sent,
+        'requests': server.requests,
+        'injected_errors': server.errors,
+        'transcode_seconds': batch['phase_seconds']['postprocessing'],
+        'peak_rss': rss,
+        'ffmpeg_peak_rss': children_rss,
+    }
+
+def run_child(name, args):
+    """Run a scenario in a fresh interpreter and return its metrics"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', name,
+               '--workers', str(args.workers), '--segments', str(args.segments),
+               '--media-size', str(args.media_size), '--latency', str(args.latency),
+               '--bandwidth', str(args.bandwidth), '--link-bandwidth', str(args.link_bandwidth)]
+    if args.items:
+        command += ['--items', str(args.items)]
+    if args.error_rate is not None:
+        command += ['--error-rate', str(args.error_rate)]
+    
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise SystemExit(f"scenario {name} failed:\n{process.stderr}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+def compare(results, baseline, tolerance):
+    """Print each metric against the baseline; returns the list of regressions"""
+    regressions = []
+    print(f"\n{'scenario':<12} {'metric':<18} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metrics in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            print(f"{name:<12} (not in baseline)")
+            continue
+        for metric, higher_is_better, noise in METRICS:
+            old, new = previous.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance and abs(new - old) > noise:
+                flag = "  REGRESSION"
+                regressions.append((name, metric, change))
+            print(f"{name:<12} {metric:<18} {format_metric(metric, old):>12} {format_metric(metric, new):>12} "
+                  f"{change:>+8.1%}{flag}")
+    return regressions
+
+def format_metric(metric, value):
+    if value is None:
+        return "-"
+    if metric in ('wire_bytes', 'peak_rss', 'ffmpeg_peak_rss'):
+        return format_bytes(value)
+    if metric == 'items_per_sec':
+        return f"{value:.2f}/s"
+    return f"{value:.3f}s"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run (repeatable; default: all)')
+    parser.add_argument('--items', type=int, help="items per scenario (default: the scenario's own)")
+    parser.add_argument('-j', '--workers', type=int, default=3, help='parallel downloads (default: 3)')
+    parser.add_argument('--segments', type=int, default=20, help='segments per HLS item (default: 20)')
+    parser.add_argument('--media-size', type=int, default=2 * 1024 * 1024,
+                        help='bytes per progressive file (default: 2 MiB)')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every request')
+    parser.add_argument('--bandwidth', type=float, default=0, help='bytes/s per connection (0: unlimited)')
+    parser.add_argument('--link-bandwidth', type=float, default=0, help='bytes/s for all connections (0: unlimited)')
+    parser.add_argument('--error-rate', type=float, help="fraction of failing requests (default: the scenario's)")
+    parser.add_argument('-o', '--output', metavar='FILE', help='write the results to FILE as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='compare the results with a stored run')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative change that counts as a regression (default: 0.1)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args)))
+        return 0
+    
+    has_ffmpeg = bool(get_ffmpeg_path() or shutil.which('ffmpeg'))
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {key: getattr(args, key) for key in ('items', 'workers', 'segments', 'media_size',
+                                                         'latency', 'bandwidth', 'link_bandwidth', 'error_rate')},
+        'scenarios': {},
+    }
+    
+    print(f"{'scenario':<12} {'items':>5} {'seconds':>8} {'items/s':>8} {'TTFB':>7} {'on the wire':>12} "
+          f"{'transcode':>9} {'peak RSS':>10}")
+    for name in args.scenario or list(SCENARIOS):
+        if SCENARIOS[name].get('needs_ffmpeg') and not has_ffmpeg:
+            print(f"{name:<12} skipped: ffmpeg not found")
+            continue
+        metrics = run_child(name, args)
+        results['scenarios'][name] = metrics
+        failed = f" ({metrics['failed']} failed)" if metrics['failed'] else ""
+        print(f"{name:<12} {metrics['items']:>5} {metrics['seconds']:>8.2f} {metrics['items_per_sec']:>8.2f} "
+              f"{format_metric('ttfb', metrics['ttfb_median']):>7} {format_bytes(metrics['wire_bytes']):>12} "
+              f"{metrics['transcode_seconds']:>8.2f}s {format_metric('peak_rss', metrics['peak_rss']):>10}{failed}")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric{'s' if len(regressions) != 1 else ''} regressed "
+                  f"by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
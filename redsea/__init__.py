@@ -0,0 +1,17 @@
+"""RedSea download engine, usable without the GUI
+
+The GUI in "RedSea - Mac.py" and the command line front end (python -m redsea)
+both drive a DownloadEngine. Nothing in this package imports tkinter or PIL.
+"""
+
+from .archive import DownloadArchive
+from .bandwidth import BandwidthScheduler
+from .download_queue import DownloadQueue, QueueItem, queue_key
+from .engine import DownloadEngine, DEFAULT_WORKERS, MAX_WORKERS, FORMAT_TEXT
+from .journal import QueueJournal
+from .metadata import MetadataCache, TitleResolver
+from .scheduler import QueueScheduler, SCHEDULE_POLICIES
+from .sessions import YoutubeDLPool
+from .storage import DiskSpaceError, OutputStage
+from .telemetry import TransferTelemetry
+from .tracing import Tracer
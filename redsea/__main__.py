@@ -0,0 +1,8 @@
+"""Allow running the command line front end with python -m redsea"""
+
+import sys
+
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
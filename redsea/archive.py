@@ -0,0 +1,79 @@
+"""Persistent record of completed downloads"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .util import get_data_dir
+
+class DownloadArchive:
+    """SQLite index of finished downloads, keyed by video ID, format and quality.
+    
+    Entries remember the files a download produced, so a lookup can also
+    check that they are still on disk. Lookups need nothing but the video ID,
+    which lets a batch skip finished items before any network request.
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_data_dir(), "archive.sqlite3")
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS archive ("
+                " video_id TEXT NOT NULL,"
+                " format TEXT NOT NULL,"
+                " quality TEXT NOT NULL,"
+                " files TEXT NOT NULL,"
+                " completed_at REAL NOT NULL,"
+                " PRIMARY KEY (video_id, format, quality))"
+            )
+    
+    def get(self, video_id, format_name, quality=''):
+        """Get the list of files recorded for a download, or None if it isn't archived"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT files FROM archive WHERE video_id = ? AND format = ? AND quality = ?",
+                (video_id, format_name, quality),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def contains(self, video_id, format_name, quality='', check_files=False):
+        """Check whether a download is archived, optionally requiring its files to still exist"""
+        files = self.get(video_id, format_name, quality)
+        if files is None:
+            return False
+        if check_files and not all(os.path.exists(path) for path in files):
+            return False
+        return True
+    
+    def add(self, video_id, format_name, quality, files):
+        """Record a finished download and the files it produced"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO archive (video_id, format, quality, files, completed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (video_id, format_name, quality, json.dumps(list(files)), time.time()),
+            )
+    
+    def remove(self, video_id, format_name=None):
+        """Forget a video's downloads, in one format or in all of them"""
+        with self._lock, self._db:
+            if format_name is None:
+                self._db.execute("DELETE FROM archive WHERE video_id = ?", (video_id,))
+            else:
+                self._db.execute("DELETE FROM archive WHERE video_id = ? AND format = ?",
+                                 (video_id, format_name))
+    
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
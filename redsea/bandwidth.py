@@ -0,0 +1,275 @@
+"""Process-wide bandwidth scheduling for downloads"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+from .util import parse_bytes
+
+# Bytes a transfer may run ahead of its allocation, in seconds of allocation
+BANDWIDTH_BURST_SECONDS = 0.5
+
+# Seconds between re-divisions of the bandwidth while nothing joins or leaves
+BANDWIDTH_REALLOCATE_INTERVAL = 0.5
+
+# A transfer gets this much more than it was measured to use, so it can speed up
+BANDWIDTH_DEMAND_HEADROOM = 1.25
+
+# Seconds over which the live rate of a transfer is measured
+BANDWIDTH_RATE_WINDOW = 1.0
+
+def parse_rate_profile(text):
+    """Parse 'HH:MM-HH:MM=RATE[/HOST_RATE]' into (start, end, limit, host_limit).
+    
+    start and end are minutes after midnight; the window may wrap past
+    midnight (22:00-06:00). A rate of 0 lifts that limit inside the window.
+    """
+    try:
+        window, rates = text.split('=', 1)
+        start_text, end_text = window.split('-', 1)
+        start, end = (_parse_clock(part) for part in (start_text, end_text))
+        limit_text, _, host_text = rates.partition('/')
+        limit = parse_bytes(limit_text) or None
+        host_limit = (parse_bytes(host_text) or None) if host_text else None
+    except ValueError:
+        raise ValueError(f"invalid rate profile {text!r}, expected HH:MM-HH:MM=RATE[/HOST_RATE]")
+    return (start, end, limit, host_limit)
+
+def _parse_clock(text):
+    hours, minutes = text.strip().split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60):
+        raise ValueError(text)
+    return hours * 60 + minutes
+
+def _water_fill(capacity, demands):
+    """Split capacity max-min fairly: nobody gets more than they use, the rest is shared equally"""
+    allocation = {}
+    remaining = capacity
+    pending = sorted(demands.items(), key=lambda entry: entry[1])
+    for i, (transfer, demand) in enumerate(pending):
+        share = remaining / (len(pending) - i)
+        allocation[transfer] = min(demand, share)
+        remaining -= allocation[transfer]
+    return allocation
+
+class _Transfer:
+    """One download drawing from a BandwidthScheduler"""
+    
+    def __init__(self, scheduler, name, cancel_event):
+        self.scheduler = scheduler
+        self.name = name
+        self.cancel_event = cancel_event
+        self.host = None
+        # Paused while the item isn't reading from the network (postprocessing)
+        self.paused = False
+        # filename -> downloaded_bytes at the last progress hook
+        self.files = {}
+        # Rate the network delivers at, not counting time spent throttled
+        self.demand = None
+        self.allocation = None
+        self.rate = 0.0
+        # Theoretical arrival time of the next byte at the allocated rate
+        self.tat = 0.0
+        self.last_return = None
+        self.window_bytes = 0
+        self.window_started = time.monotonic()
+    
+    def progress_hook(self, d):
+        """yt-dlp progress hook: account the bytes received and sleep off any excess"""
+        if d.get('status') != 'downloading':
+            return
+        
+        url = (d.get('info_dict') or {}).get('url')
+        host = urlparse(url).hostname if url else None
+        
+        delay = self.scheduler._consume(self, d.get('filename'), d.get('downloaded_bytes') or 0, host)
+        if delay > 0:
+            if self.cancel_event is not None:
+                self.cancel_event.wait(delay)
+            else:
+                time.sleep(delay)
+        self.last_return = time.monotonic()
+    
+    def pause(self):
+        """Give this transfer's share to the others until it reports download progress again"""
+        self.scheduler._pause(self)
+    
+    def close(self):
+        """Stop drawing bandwidth and give this transfer's share to the others"""
+        self.scheduler._close(self)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BandwidthScheduler:
+    """Token-bucket scheduler shared by every transfer in the process.
+    
+    limit caps the sum of all transfers and host_limit the sum of the
+    transfers from each host (bytes per second; None is unlimited).
+    Profiles, as returned by parse_rate_profile, replace both limits during
+    their time of day.
+    
+    Bandwidth is divided max-min fairly: each transfer is measured for the
+    rate the network gives it when it isn't being held back, transfers
+    slower than an equal share keep what they use, and the rest is split
+    equally between the others, so one large video can't starve the rest
+    of the batch and no capacity sits unused. Each transfer is then paced
+    to its allocation from yt-dlp's progress hooks, which block the
+    downloading thread (and with it the socket reads) while it is ahead.
+    """
+    
+    def __init__(self, limit=None, host_limit=None, profiles=None):
+        self.limit = limit
+        self.host_limit = host_limit
+        self.profiles = list(profiles or [])
+        self._transfers = []
+        self._lock = threading.Lock()
+        self._allocated_at = 0.0
+        self._dirty = True
+    
+    def current_limits(self, now=None):
+        """Get (limit, host_limit, profile) in effect at now (a time.time() value)"""
+        profile = self.active_profile(now)
+        if profile is None:
+            return self.limit, self.host_limit, None
+        return profile[2], profile[3], profile
+    
+    def active_profile(self, now=None):
+        """Get the first profile whose time window contains now, or None"""
+        clock = time.localtime(now)
+        minute = clock.tm_hour * 60 + clock.tm_min
+        for profile in self.profiles:
+            start, end = profile[0], profile[1]
+            if start <= end:
+                if start <= minute < end:
+                    return profile
+            elif minute >= start or minute < end:
+                return profile
+        return None
+    
+    def open_transfer(self, name, cancel_event=None):
+        """Register a download; pass its progress_hook to yt-dlp and close it when done.
+        
+        While throttled, the hook waits on cancel_event so cancelling
+        interrupts the wait. pause() it while the item postprocesses; its
+        next progress report takes its share back.
+        """
+        transfer = _Transfer(self, name, cancel_event)
+        with self._lock:
+            self._transfers.append(transfer)
+            self._dirty = True
+        return transfer
+    
+    def _pause(self, transfer):
+        with self._lock:
+            if transfer in self._transfers:
+                self._transfers.remove(transfer)
+                transfer.paused = True
+                # The pause isn't network time
+                transfer.last_return = None
+                self._dirty = True
+    
+    def _close(self, transfer):
+        with self._lock:
+            transfer.paused = False
+            if transfer in self._transfers:
+                self._transfers.remove(transfer)
+                self._dirty = True
+    
+    def _consume(self, transfer, filename, downloaded, host):
+        """Account a progress report and return how long the transfer has to wait"""
+        now = time.monotonic()
+        with self._lock:
+            if transfer.paused:
+                transfer.paused = False
+                self._transfers.append(transfer)
+                self._dirty = True
+            
+            # Fragment threads report out of order now and then; never count bytes twice
+            previous = transfer.files.get(filename, 0)
+            received = max(0, downloaded - previous)
+            transfer.files[filename] = max(downloaded, previous)
+            
+            if host and host != transfer.host:
+                transfer.host = host
+                self._dirty = True
+            
+            # Time between hooks minus the time spent throttled is network time
+            if transfer.last_return is not None and received:
+                network_time = now - transfer.last_return
+                if network_time > 0:
+                    rate = received / network_time
+                    transfer.demand = rate if transfer.demand is None else transfer.demand * 0.7 + rate * 0.3
+            
+            transfer.window_bytes += received
+            window = now - transfer.window_started
+            if window >= BANDWIDTH_RATE_WINDOW:
+                transfer.rate = (transfer.rate + transfer.window_bytes / window) / 2
+                transfer.window_bytes = 0
+                transfer.window_started = now
+            
+            if self._dirty or now - self._allocated_at >= BANDWIDTH_REALLOCATE_INTERVAL:
+                self._allocate(now)
+            
+            allocation = transfer.allocation
+            if not allocation or not received:
+                return 0
+            
+            # Pace the transfer to its allocation, allowing a short burst
+            transfer.tat = max(transfer.tat, now) + received / allocation
+            return transfer.tat - now - BANDWIDTH_BURST_SECONDS
+    
+    def _allocate(self, now):
+        """Divide the current limits between the open transfers (lock held)"""
+        self._allocated_at = now
+        self._dirty = False
+        
+        limit, host_limit, _ = self.current_limits()
+        if not limit and not host_limit:
+            for transfer in self._transfers:
+                transfer.allocation = None
+            return
+        
+        # Unmeasured transfers want everything they can get
+        demands = {}
+        for transfer in self._transfers:
+            demand = transfer.demand * BANDWIDTH_DEMAND_HEADROOM if transfer.demand else float('inf')
+            demands[transfer] = demand
+        
+        if host_limit:
+            hosts = {}
+            for transfer in self._transfers:
+                hosts.setdefault(transfer.host, {})[transfer] = demands[transfer]
+            for host_demands in hosts.values():
+                demands.update(_water_fill(host_limit, host_demands))
+        
+        if limit:
+            demands = _water_fill(limit, demands)
+        
+        for transfer, allocation in demands.items():
+            transfer.allocation = None if allocation == float('inf') else allocation
+    
+    def stats(self):
+        """Get the limits in effect and each open transfer's rate and allocation"""
+        limit, host_limit, profile = self.current_limits()
+        now = time.monotonic()
+        with self._lock:
+            transfers = [{
+                'name': transfer.name,
+                'host': transfer.host,
+                # Transfers that stopped reporting (extracting, stalled) aren't moving
+                'rate': transfer.rate if now - transfer.window_started < 2 * BANDWIDTH_RATE_WINDOW else 0.0,
+                'allocation': transfer.allocation,
+            } for transfer in self._transfers]
+        
+        return {
+            'limit': limit,
+            'host_limit': host_limit,
+            'profile': profile,
+            'rate': sum(transfer['rate'] for transfer in transfers),
+            'transfers': transfers,
+        }
@@ -0,0 +1,178 @@
+"""Command line front end: download YouTube URLs without opening the GUI"""
+
+import argparse
+import sys
+import threading
+import time
+
+from .bandwidth import parse_rate_profile
+from .engine import DownloadEngine, DEFAULT_WORKERS, MAX_WORKERS
+from .journal import QueueJournal
+from .scheduler import SCHEDULE_POLICIES
+from .storage import MIN_FREE_SPACE
+from .util import format_bytes, is_youtube_url, is_playlist_url, parse_bytes
+
+# Seconds between bandwidth allocation reports while a limit is in effect
+BANDWIDTH_REPORT_INTERVAL = 10
+
+def read_batch_file(path):
+    """Read URLs from a file, one or more per line; '#' starts a comment"""
+    urls = []
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.split('#', 1)[0]
+            urls.extend(line.split())
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return urls
+
+def rate_argument(text):
+    """argparse type for byte rates such as 500K or 2M"""
+    try:
+        return parse_bytes(text) or None
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def size_argument(text):
+    """argparse type for sizes such as 500M or 2G"""
+    try:
+        return parse_bytes(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def rate_profile_argument(text):
+    """argparse type for HH:MM-HH:MM=RATE[/HOST_RATE] profiles"""
+    try:
+        return parse_rate_profile(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def build_parser():
+    """Build the argument parser for the redsea command"""
+    parser = argparse.ArgumentParser(
+        prog='redsea',
+        description='Download YouTube videos and playlists as MP3 and/or MP4 files.'
+    )
+    parser.add_argument('urls', nargs='*', metavar='URL',
+                        help='video or playlist URLs to download')
+    parser.add_argument('-a', '--batch-file', metavar='FILE',
+                        help="read URLs from FILE, one per line ('-' for stdin)")
+    parser.add_argument('-f', '--format', choices=('mp3', 'mp4', 'both', 'audio'), default='mp3',
+                        help="output format; 'audio' keeps the original audio (e.g. AAC as .m4a) "
+                             "without re-encoding (default: mp3)")
+    parser.add_argument('-q', '--quality', choices=('128', '192', '256', '320'), default='192',
+                        help='MP3 bitrate in kbps (default: 192)')
+    parser.add_argument('-o', '--output', metavar='DIR',
+                        help='output directory (default: ~/Downloads)')
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'parallel downloads, 1-{MAX_WORKERS} (default: {DEFAULT_WORKERS})')
+    parser.add_argument('-N', '--concurrent-fragments', default='auto', metavar='N',
+                        help="fragments of a DASH/HLS format to download at once, or 'auto' (default: auto)")
+    parser.add_argument('-r', '--limit-rate', type=rate_argument, metavar='RATE',
+                        help='maximum total download rate in bytes per second, e.g. 500K or 2M')
+    parser.add_argument('--host-limit-rate', type=rate_argument, metavar='RATE',
+                        help='maximum download rate from any one host')
+    parser.add_argument('--rate-profile', type=rate_profile_argument, action='append', metavar='PROFILE',
+                        help='limits for a time of day as HH:MM-HH:MM=RATE[/HOST_RATE], '
+                             'e.g. 09:00-18:00=1M (repeatable; 0 is unlimited)')
+    parser.add_argument('--order', choices=SCHEDULE_POLICIES, default='fifo',
+                        help="order to download in: 'fifo' (as given), 'shortest' or 'largest' first by "
+                             "estimated size after journaled priorities, or 'priority' (journaled priorities) (default: fifo)")
+    parser.add_argument('--min-free-space', type=size_argument, default=MIN_FREE_SPACE, metavar='SIZE',
+                        help=f'disk space to leave free; downloads wait for room beyond it, e.g. 1G '
+                             f'(default: {format_bytes(MIN_FREE_SPACE)})')
+    parser.add_argument('--preallocate', action='store_true',
+                        help="reserve each download's estimated size on disk before it starts")
+    parser.add_argument('--transcode-workers', type=int, metavar='N',
+                        help='parallel MP3 encodes (default: one per CPU core)')
+    parser.add_argument('--separate-fetch', action='store_true',
+                        help='with --format both, always download the MP3 and MP4 separately (by default the MP3 '
+                             'is taken from the MP4 when its audio is as good as the best audio stream)')
+    parser.add_argument('--no-titles', action='store_true',
+                        help="don't look up video titles before downloading")
+    parser.add_argument('--no-archive', action='store_true',
+                        help='download again even if the download archive lists a video as done')
+    parser.add_argument('--trust-archive', action='store_true',
+                        help="skip archived videos without checking that their files still exist")
+    parser.add_argument('--journal', metavar='FILE',
+                        help='journal the queue to FILE and first resume the unfinished items recorded in it')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='append a timing span for every stage of every download to FILE (JSON lines)')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='write per-stage timing metrics to FILE in the Prometheus text format')
+    return parser
+
+def main(argv=None):
+    """Run a batch download from the command line and return the exit code"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    urls = list(args.urls)
+    if args.batch_file:
+        try:
+            urls.extend(read_batch_file(args.batch_file))
+        except OSError as e:
+            parser.error(f"cannot read batch file: {e}")
+    
+    if args.concurrent_fragments != 'auto' and not args.concurrent_fragments.isdigit():
+        parser.error("--concurrent-fragments must be a number or 'auto'")
+    
+    if not urls and not args.journal:
+        parser.error("no URLs given")
+    
+    invalid = [url for url in urls if not is_youtube_url(url)]
+    if invalid:
+        parser.error(f"not a YouTube URL: {invalid[0]}")
+    
+    try:
+        journal = QueueJournal(args.journal) if args.journal else None
+    except OSError as e:
+        parser.error(f"cannot open journal: {e}")
+    
+    engine = DownloadEngine(output_path=args.output, format_choice=args.format, quality=args.quality,
+                            workers=args.workers, single_fetch=not args.separate_fetch,
+                            use_archive=not args.no_archive, check_archive_files=not args.trust_archive,
+                            journal=journal, transcode_workers=args.transcode_workers,
+                            fragment_concurrency=args.concurrent_fragments, rate_limit=args.limit_rate,
+                            host_rate_limit=args.host_limit_rate, rate_profiles=args.rate_profile,
+                            trace_path=args.trace, metrics_path=args.metrics, schedule=args.order,
+                            min_free_space=args.min_free_space, preallocate=args.preallocate)
+    
+    try:
+        video_urls = [url for url in urls if not is_playlist_url(url)]
+        playlist_urls = [url for url in urls if is_playlist_url(url)]
+        
+        engine.add_videos(video_urls, resolve_titles=not args.no_titles)
+        
+        # Playlists stream into the queue while the batch is already running
+        for url in playlist_urls:
+            engine.start_playlist_fetch(url)
+        
+        # The batch runs on its own thread so Ctrl+C can cancel it cleanly
+        result = {}
+        batch_thread = threading.Thread(target=lambda: result.update(engine.batch_download()))
+        batch_thread.start()
+        try:
+            last_report = time.monotonic()
+            while batch_thread.is_alive():
+                batch_thread.join(0.5)
+                
+                # Show how the bandwidth is shared while a limit is in effect
+                if time.monotonic() - last_report >= BANDWIDTH_REPORT_INTERVAL:
+                    last_report = time.monotonic()
+                    usage_text = engine.get_bandwidth_usage_text()
+                    if usage_text:
+                        engine.log(f"🚦 {usage_text}")
+        except KeyboardInterrupt:
+            engine.stop_playlist_fetch()
+            engine.cancel()
+            batch_thread.join()
+        
+        if not result or result['cancelled']:
+            return 130
+        return 1 if result['failed'] or not result['total'] else 0
+    
+    finally:
+        engine.close()
@@ -0,0 +1,135 @@
+"""Indexed, thread-safe download queue"""
+
+import threading
+from collections import OrderedDict
+
+from .util import extract_video_id
+
+def queue_key(url):
+    """Get the dedup key for a URL: its video ID, or the URL itself"""
+    return extract_video_id(url) or url.strip()
+
+class QueueItem:
+    """A single entry in the download queue; higher priorities start first under the priority schedule"""
+    
+    __slots__ = ('key', 'url', 'title', 'duration', 'priority')
+    
+    def __init__(self, url, title, duration=0, key=None, priority=0):
+        self.key = key or queue_key(url)
+        self.url = url
+        self.title = title
+        self.duration = duration
+        self.priority = priority
+    
+    def __repr__(self):
+        return f"QueueItem({self.key!r}, {self.title!r})"
+
+class DownloadQueue:
+    """Ordered, thread-safe download queue keyed by normalized video ID.
+    
+    watch?v=, youtu.be and playlist-derived URLs of the same video share a
+    key, so membership checks, dedup on add, removal by key and moving an
+    item to either end are all constant time. Iterating returns a snapshot,
+    so the fetcher and downloader threads can keep mutating the queue.
+    """
+    
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.RLock()
+        # Bumped on every mutation so readers can cheaply detect changes
+        self.version = 0
+        self._listeners = []
+    
+    def add_listener(self, callback):
+        """Register callback(op, payload) to receive every change as a diff.
+        
+        op is 'add' (list of new items), 'remove' (the removed item),
+        'move_front' / 'move_end' (the moved item), 'priority' (the item
+        whose priority changed) or 'clear' (None).
+        Callbacks run while the queue lock is held, in mutation order.
+        """
+        self._listeners.append(callback)
+    
+    def _notify(self, op, payload):
+        self.version += 1
+        for callback in self._listeners:
+            callback(op, payload)
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def __bool__(self):
+        return bool(self._items)
+    
+    def __contains__(self, url_or_key):
+        return url_or_key in self._items or queue_key(url_or_key) in self._items
+    
+    def __iter__(self):
+        return iter(self.snapshot())
+    
+    def snapshot(self):
+        """Get a list copy of the queued items in order"""
+        with self._lock:
+            return list(self._items.values())
+    
+    def get(self, key):
+        return self._items.get(key)
+    
+    def add(self, item):
+        """Append an item; returns False if its video is already queued"""
+        with self._lock:
+            if item.key in self._items:
+                return False
+            self._items[item.key] = item
+            self._notify('add', [item])
+            return True
+    
+    def extend(self, items):
+        """Append many items; returns the list of items that were actually added"""
+        added = []
+        with self._lock:
+            for item in items:
+                if item.key not in self._items:
+                    self._items[item.key] = item
+                    added.append(item)
+            if added:
+                self._notify('add', added)
+        return added
+    
+    def remove(self, key):
+        """Remove and return the item with this key, or None"""
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self._notify('remove', item)
+            return item
+    
+    def move_to_front(self, key):
+        with self._lock:
+            self._items.move_to_end(key, last=False)
+            self._notify('move_front', self._items[key])
+    
+    def move_to_end(self, key):
+        with self._lock:
+            self._items.move_to_end(key)
+            self._notify('move_end', self._items[key])
+    
+    def set_priority(self, key, priority):
+        """Change an item's priority; returns False if it isn't queued"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return False
+            item.priority = priority
+            self._notify('priority', item)
+            return True
+    
+    def max_priority(self):
+        """Get the highest priority of any queued item (0 for an empty queue)"""
+        with self._lock:
+            return max((item.priority for item in self._items.values()), default=0)
+    
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._notify('clear', None)
@@ -0,0 +1,1434 @@
+"""Headless download engine: queue, metadata and yt-dlp downloads without a GUI"""
+
+import copy
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .archive import DownloadArchive
+from .bandwidth import BandwidthScheduler
+from .download_queue import DownloadQueue, QueueItem, queue_key
+from .errors import (DownloadFailure, ThrottleBreaker, BACKOFF_SECONDS, ERROR_TEXT, ITEM_RETRIES,
+                     backoff_delay, retry_sleep_functions)
+from .fragments import FragmentTuner, FRAGMENT_CONCURRENCY_STEPS
+from .metadata import MetadataCache, TitleResolver
+from .scheduler import QueueScheduler, estimate_download_size, single_fetch_keeps_audio
+from .sessions import YoutubeDLPool
+from .storage import OutputStage, MIN_FREE_SPACE, space_needed
+from .telemetry import TransferTelemetry
+from .tracing import Tracer
+from .transcode import (TranscodePool, AUDIO_COPY_EXTENSIONS, audio_codec_name, audio_copy_extension,
+                        probe_audio_codec)
+from .util import (HTTP_HEADERS, extract_playlist_id, extract_video_id, format_bytes,
+                   format_duration, get_ffmpeg_path)
+
+# Parallel download worker limits
+DEFAULT_WORKERS = 3
+MAX_WORKERS = 8
+
+# Playlist entries are pushed into the queue in batches as pages arrive
+PLAYLIST_BATCH_SIZE = 100
+PLAYLIST_FLUSH_INTERVAL = 0.5
+
+# A cancelled item's download gets this many seconds to stop at its next
+# progress hook before its worker stops waiting and takes the next item
+CANCEL_GRACE_SECONDS = 2.0
+CANCEL_POLL_INTERVAL = 0.1
+
+FORMAT_TEXT = {
+    'mp3': 'MP3 audio',
+    'mp4': 'MP4 video',
+    'both': 'MP3 + MP4',
+    'audio': 'Original audio',
+}
+
+# Formats each format choice produces; these are the download archive's formats
+FORMAT_OUTPUTS = {
+    'mp3': ('mp3',),
+    'mp4': ('mp4',),
+    'both': ('mp3', 'mp4'),
+    'audio': ('audio',),
+}
+
+class DownloadEngine:
+    """The download queue plus everything needed to fetch and convert its items.
+    
+    The engine has no GUI dependencies: messages go to the log callable, and
+    front ends follow a batch through the optional on_item_start(i, total,
+    item) and on_progress(finished, total) callbacks. Settings are plain
+    attributes read when a batch or item starts.
+    
+    Finished downloads are recorded in a DownloadArchive. With use_archive on,
+    a batch skips items whose files are already archived (and, with
+    check_archive_files, still exist) without any network request.
+    
+    fragment_concurrency is the number of fragments DASH/HLS formats fetch
+    at once, or 'auto' to let a FragmentTuner choose from observed
+    per-fragment latency and throughput.
+    
+    Every transfer draws from one BandwidthScheduler (self.bandwidth), which
+    enforces rate_limit overall and host_rate_limit per host (bytes per
+    second) or the rate_profiles for the time of day, and shares the
+    bandwidth fairly between parallel downloads.
+    
+    Failures are classified (see redsea.errors). Throttled and network
+    errors are retried with jittered exponential backoff, sustained
+    throttling pauses new starts through a ThrottleBreaker, and items that
+    still fail for any reason but an unavailable video get one more try at
+    the end of the batch.
+    
+    With pipeline on, MP3 conversion runs on a separate TranscodePool: a
+    download worker hands its raw file over and starts its next item while
+    ffmpeg encodes, so downloads and encodes overlap.
+    
+    The 'audio' format choice keeps the original audio: the best audio
+    stream is copied into its own container (AAC to .m4a, Opus to .opus)
+    without re-encoding, and only codecs no audio container takes are
+    converted to MP3.
+    
+    cancel() stops the whole batch and cancel_item(key) a single item,
+    whether it is waiting, extracting, downloading or converting. Extraction
+    and downloads run on a helper thread the worker stops waiting for once
+    the item is cancelled, running ffmpeg processes are killed, and the
+    item's partial files are deleted.
+    
+    schedule picks the order items start in: 'fifo' (queue order),
+    'shortest' or 'largest' first by their estimated download size, or
+    'priority' (QueueItem.priority). Sizes come from the cached video info,
+    or from the duration a playlist listed. Items are only handed to a
+    worker when one is free, so changing schedule or reordering the queue
+    during a batch applies to every item not started yet.
+    
+    Files are written to a staging directory inside output_path and
+    renamed into place once finished (see OutputStage). Each item first
+    reserves its estimated peak disk use, from the format sizes in its info
+    dict, and waits while the disk can't take it without going below
+    min_free_space; with preallocate the reservation is also taken on disk.
+    
+    Given a QueueJournal, the engine restores the unfinished items of the
+    last session into the queue (see restored_items) and journals every
+    queue and item state change from then on.
+    
+    state_dir keeps the archive, metadata cache and yt-dlp cache in a
+    directory of their own instead of the per-user ones, and extractors are
+    extra yt-dlp InfoExtractor classes tried before the built-in ones; the
+    benchmarks use both to run the engine offline.
+    
+    With trace_path or metrics_path set, a Tracer times every stage of
+    every item (validation, title lookup, extraction, format selection,
+    transfer, postprocessing and finalizing) into a JSON-lines trace and a
+    Prometheus metrics file.
+    """
+    
+    def __init__(self, output_path=None, format_choice="mp3", quality="192",
+                 workers=DEFAULT_WORKERS, single_fetch=True, log=None,
+                 use_archive=True, check_archive_files=True, journal=None,
+                 pipeline=True, transcode_workers=None, fragment_concurrency='auto',
+                 quiet=False, rate_limit=None, host_rate_limit=None, rate_profiles=None,
+                 state_dir=None, extractors=(), trace_path=None, metrics_path=None, schedule='fifo',
+                 min_free_space=MIN_FREE_SPACE, preallocate=False):
+        self.output_path = output_path or os.path.join(os.path.expanduser("~"), "Downloads")
+        self.format_choice = format_choice
+        self.quality = quality
+        self.workers = workers
+        self.single_fetch = single_fetch
+        self.use_archive = use_archive
+        self.check_archive_files = check_archive_files
+        self.pipeline = pipeline
+        self.fragment_concurrency = fragment_concurrency
+        self.schedule = schedule
+        # Keep yt-dlp's own console output quiet
+        self.quiet = quiet
+        self.log = log or print
+        
+        # Front end callbacks
+        self.on_item_start = None
+        self.on_progress = None
+        
+        self.queue = DownloadQueue()
+        
+        # Download cancellation mechanism
+        self.cancel_event = threading.Event()
+        self.is_downloading = False
+        self.batch_total = 0
+        # Clear while batch_download() runs, so close() can wait for it
+        self.batch_idle = threading.Event()
+        self.batch_idle.set()
+        
+        # Per-item cancellation within the running batch: key -> Event, and
+        # the keys of the items handed to a worker that haven't finished yet
+        self.item_cancel_events = {}
+        self.active_keys = set()
+        self.item_cancel_lock = threading.Lock()
+        
+        # Playlist fetches stream entries into the queue and can be stopped
+        self.fetch_cancel_event = threading.Event()
+        self.active_fetches = 0
+        self.fetch_lock = threading.Lock()
+        
+        # Long-lived yt-dlp sessions shared by playlist fetching and downloads
+        self.ydl_pool = YoutubeDLPool(os.path.join(state_dir, "yt-dlp") if state_dir else None, extractors)
+        
+        # Persistent metadata cache shared by title lookups, playlists and downloads
+        self.metadata_cache = MetadataCache(os.path.join(state_dir, "metadata.sqlite3") if state_dir else None)
+        
+        # Completed downloads by video ID, format and quality
+        self.archive = DownloadArchive(os.path.join(state_dir, "archive.sqlite3") if state_dir else None)
+        
+        # Picks the fragment concurrency of DASH/HLS downloads in auto mode
+        self.fragment_tuner = FragmentTuner()
+        
+        # Rate caps and fair sharing across all transfers of this process
+        self.bandwidth = BandwidthScheduler(rate_limit, host_rate_limit, rate_profiles)
+        
+        # Picks the next item to start from known durations and sizes
+        self.scheduler = QueueScheduler(self.estimate_item_sizes)
+        
+        # Disk space admission, staging and atomic moves into the output folder
+        self.storage = OutputStage(min_free_space, preallocate)
+        
+        # Pauses new downloads while the server keeps throttling us
+        self.breaker = ThrottleBreaker()
+        
+        # ffmpeg encodes run here, separate from the download workers
+        self.transcoder = TranscodePool(transcode_workers)
+        
+        # Crash-safe record of the queue and each item's download state
+        self.journal = journal
+        self.restored_items = journal.restore(self.queue) if journal else []
+        if self.restored_items:
+            self.log(f"♻️ Restored {len(self.restored_items)} unfinished items from the last session")
+        
+        # Byte/speed/ETA statistics collected from yt-dlp's hooks
+        self.telemetry = TransferTelemetry()
+        
+        # Per-stage timing spans; off (and free) unless a trace or metrics file is given
+        self.tracer = Tracer(trace_path, metrics_path)
+        
+        # Pooled HTTP session for quick title lookups
+        self.title_resolver = TitleResolver(cache=self.metadata_cache)
+    
+    def close(self):
+        """Release pooled sessions and the metadata cache
+        
+        A running batch is cancelled first and its workers are waited for,
+        so nothing downloads into the closed caches, archive or journal.
+        """
+        self.stop_playlist_fetch()
+        if not self.batch_idle.is_set():
+            self.cancel()
+            self.batch_idle.wait()
+        self.transcoder.close()
+        self.ydl_pool.close()
+        self.metadata_cache.close()
+        self.archive.close()
+        if self.journal:
+            self.journal.close()
+        self.tracer.close()
+    
+    def get_format_text(self):
+        """Get a human readable description of the selected format"""
+        return FORMAT_TEXT.get(self.format_choice, 'files')
+    
+    def set_item_state(self, key, state):
+        """Record a queue item's download state in the journal, if there is one"""
+        if self.journal:
+            self.journal.set_state(key, state)
+    
+    def archive_quality(self, format_name):
+        """Get the quality an archived download of format_name is keyed by"""
+        return self.quality if format_name == 'mp3' else ''
+    
+    def missing_formats(self, video_id, format_choice=None):
+        """Get the formats of format_choice that the archive has no finished download of"""
+        return [format_name for format_name in FORMAT_OUTPUTS.get(format_choice or self.format_choice, ())
+                if not self.archive.contains(video_id, format_name, self.archive_quality(format_name),
+                                             check_files=self.check_archive_files)]
+    
+    def estimate_item_sizes(self, items, format_choice=None):
+        """Estimate the bytes downloading each of items will fetch, as a list of bytes or None
+        
+        The metadata cache is read in one query per field, without touching
+        its LRU order or hit statistics, so scheduling costs no writes.
+        """
+        format_choice = format_choice or self.format_choice
+        video_ids = [extract_video_id(item.url) for item in items]
+        infos = self.metadata_cache.get_many(video_ids, 'info', touch=False)
+        durations = self.metadata_cache.get_many(
+            [video_id for item, video_id in zip(items, video_ids) if video_id not in infos and not item.duration],
+            'duration', touch=False)
+        
+        sizes = []
+        for item, video_id in zip(items, video_ids):
+            info = infos.get(video_id) or {'duration': item.duration or durations.get(video_id)}
+            sizes.append(estimate_download_size(info, format_choice, self.single_fetch))
+        return sizes
+    
+    def get_fragment_concurrency(self):
+        """Get the number of fragments a DASH/HLS download should fetch at once"""
+        if self.fragment_concurrency == 'auto':
+            return self.fragment_tuner.current
+        try:
+            concurrency = int(self.fragment_concurrency)
+        except (TypeError, ValueError):
+            return self.fragment_tuner.current
+        return max(1, min(concurrency, FRAGMENT_CONCURRENCY_STEPS[-1]))
+    
+    def get_bandwidth_text(self):
+        """Describe the bandwidth limits in effect, or return None when unlimited"""
+        stats = self.bandwidth.stats()
+        parts = []
+        if stats['limit']:
+            parts.append(f"{format_bytes(stats['limit'])}/s overall")
+        if stats['host_limit']:
+            parts.append(f"{format_bytes(stats['host_limit'])}/s per host")
+        if not parts:
+            return None
+        text = ", ".join(parts)
+        if stats['profile']:
+            start, end = stats['profile'][:2]
+            text += f" ({start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d} profile)"
+        return text
+    
+    def get_bandwidth_usage_text(self):
+        """Describe the current rate and each transfer's allocation, or return None when unlimited"""
+        stats = self.bandwidth.stats()
+        if not stats['limit'] and not stats['host_limit']:
+            return None
+        text = f"{format_bytes(stats['rate'])}/s"
+        if stats['limit']:
+            text += f" of {format_bytes(stats['limit'])}/s"
+        shares = []
+        for transfer in stats['transfers']:
+            name = transfer['name'] if len(transfer['name']) <= 24 else transfer['name'][:23] + "…"
+            allocation = f"{format_bytes(transfer['allocation'])}/s" if transfer['allocation'] else "unlimited"
+            shares.append(f"{name} {allocation}")
+        if shares:
+            text += " • " + ", ".join(shares)
+        return text
+    
+    def get_worker_count(self):
+        """Get the configured number of parallel download workers"""
+        try:
+            workers = int(self.workers)
+        except (TypeError, ValueError):
+            workers = DEFAULT_WORKERS
+        return max(1, min(workers, MAX_WORKERS))
+    
+    def get_title_fast(self, url):
+        """Fast title extraction using oEmbed or a partial page read"""
+        with self.tracer.span('title', urls=1):
+            return self.title_resolver.resolve(url)
+    
+    def new_video_urls(self, urls):
+        """Filter urls down to videos not yet queued, treating different URL forms of a video as one"""
+        new_urls = []
+        new_keys = set()
+        for url in urls:
+            key = queue_key(url)
+            if key not in self.queue and key not in new_keys:
+                new_keys.add(key)
+                new_urls.append(url)
+        return new_urls
+    
+    def add_videos(self, urls, resolve_titles=True):
+        """Add video URLs to the queue and return the list of added items
+        
+        With resolve_titles off, items are queued under their URL and no HTTP
+        request is made until they are downloaded.
+        """
+        with self.tracer.span('validate', urls=len(urls)):
+            new_urls = self.new_video_urls(urls)
+        skipped_count = len(urls) - len(new_urls)
+        added_items = []
+        
+        try:
+            if resolve_titles:
+                if len(new_urls) == 1:
+                    self.log(f"Fetching title for: {new_urls[0]}")
+                elif new_urls:
+                    self.log(f"Fetching titles for {len(new_urls)} videos...")
+                with self.tracer.span('title', urls=len(new_urls)):
+                    titles = self.title_resolver.resolve_many(new_urls)
+            else:
+                titles = new_urls
+            
+            for url, title in zip(new_urls, titles):
+                item = QueueItem(url, title)
+                if self.queue.add(item):
+                    added_items.append(item)
+                    self.log(f"✅ Added to queue: {title}")
+        
+        except Exception:
+            added_urls = {item.url for item in added_items}
+            for url in new_urls:
+                if url in added_urls:
+                    continue
+                item = QueueItem(url, 'Failed to fetch title')
+                if self.queue.add(item):
+                    added_items.append(item)
+                    self.log(f"⚠️ Added to queue with unknown title: {url}")
+        
+        if skipped_count > 0:
+            self.log(f"⚠️ Skipped {skipped_count} duplicate videos")
+        
+        return added_items
+    
+    def fetch_playlist(self, playlist_url, on_batch=None):
+        """Add all videos from a YouTube playlist to the queue as pages arrive
+        
+        on_batch() is called after each batch of entries lands in the queue.
+        Returns a summary dict with the playlist title and the numbers of
+        fetched, added and skipped videos; raises if the playlist is empty.
+        """
+        self._begin_fetch()
+        try:
+            self.log(f"🎵 Fetching playlist: {playlist_url}")
+            
+            playlist_id = extract_playlist_id(playlist_url)
+            cached_playlist = self.metadata_cache.get(playlist_id, 'playlist') if playlist_id else None
+            
+            added_count = 0
+            skipped_count = 0
+            fetched_entries = []
+            pending_entries = []
+            last_flush = time.monotonic()
+            
+            def flush_entries():
+                """Push buffered entries into the queue in one batch"""
+                nonlocal added_count, skipped_count, last_flush
+                if not pending_entries:
+                    return
+                
+                # Duplicates (by video ID) are skipped by the queue itself
+                added = self.queue.extend(
+                    QueueItem(f"https://www.youtube.com/watch?v={entry['id']}",
+                              entry['title'], entry['duration'], key=entry['id'])
+                    for entry in pending_entries
+                )
+                added_count += len(added)
+                skipped_count += len(pending_entries) - len(added)
+                fetched_entries.extend(pending_entries)
+                pending_entries.clear()
+                last_flush = time.monotonic()
+                
+                if on_batch:
+                    on_batch()
+                self.log(f"📥 {len(fetched_entries)} videos fetched so far...")
+            
+            if cached_playlist:
+                playlist_title = cached_playlist['title']
+                self.log("🗂️ Using cached playlist listing")
+                self.log(f"📋 Found playlist: {playlist_title}")
+                pending_entries.extend(cached_playlist['entries'])
+                flush_entries()
+            else:
+                # Configure yt-dlp to list playlist entries only
+                ydl_opts = {
+                    'extract_flat': True,  # Don't download, just get info
+                    'quiet': True,
+                    'no_warnings': True,
+                    'http_headers': HTTP_HEADERS,
+                }
+                
+                with self.ydl_pool.session(ydl_opts) as ydl:
+                    # Unprocessed results keep 'entries' as a lazy generator,
+                    # so each page is fetched only when we iterate to it
+                    playlist_info = ydl.extract_info(playlist_url, download=False, process=False)
+                    
+                    # Watch URLs with a list= parameter redirect to the playlist
+                    while playlist_info.get('_type') in ('url', 'url_transparent'):
+                        playlist_info = ydl.extract_info(playlist_info['url'], download=False, process=False,
+                                                         ie_key=playlist_info.get('ie_key'))
+                    
+                    if 'entries' not in playlist_info:
+                        self.log("❌ No videos found in playlist")
+                        raise Exception("No videos found in the playlist")
+                    
+                    playlist_title = playlist_info.get('title', 'Unknown Playlist')
+                    self.log(f"📋 Found playlist: {playlist_title}")
+                    
+                    for entry in playlist_info['entries']:
+                        if self.fetch_cancel_event.is_set():
+                            break
+                        
+                        # Skip private/deleted videos and nested playlists
+                        if not entry or not entry.get('id') or entry.get('ie_key') == 'YoutubeTab':
+                            continue
+                        
+                        pending_entries.append({
+                            'id': entry['id'],
+                            'title': entry.get('title') or 'Unknown Title',
+                            'duration': entry.get('duration') or 0,
+                        })
+                        
+                        if len(pending_entries) >= PLAYLIST_BATCH_SIZE or \
+                                time.monotonic() - last_flush >= PLAYLIST_FLUSH_INTERVAL:
+                            flush_entries()
+                    
+                    flush_entries()
+                
+                # Only a complete listing is worth caching
+                if playlist_id and fetched_entries and not self.fetch_cancel_event.is_set():
+                    self.metadata_cache.set(playlist_id, 'playlist',
+                                            {'title': playlist_title, 'entries': fetched_entries})
+                self.metadata_cache.set_many('title', {
+                    entry['id']: entry['title'] for entry in fetched_entries
+                    if entry['title'] != 'Unknown Title'
+                })
+                self.metadata_cache.set_many('duration', {
+                    entry['id']: entry['duration'] for entry in fetched_entries
+                    if entry['duration']
+                })
+            
+            if not fetched_entries:
+                self.log("❌ No accessible videos found in playlist")
+                raise Exception("No accessible videos found in the playlist")
+            
+            stopped = self.fetch_cancel_event.is_set()
+            if stopped:
+                self.log(f"⚠️ Playlist fetch stopped after {len(fetched_entries)} videos")
+            
+            self.log(f"✅ Added {added_count} videos from playlist")
+            if skipped_count > 0:
+                self.log(f"⚠️ Skipped {skipped_count} duplicate videos")
+            
+            return {
+                'title': playlist_title,
+                'fetched': len(fetched_entries),
+                'added': added_count,
+                'skipped': skipped_count,
+                'stopped': stopped,
+            }
+        
+        finally:
+            self._end_fetch()
+    
+    def start_playlist_fetch(self, playlist_url):
+        """Fetch a playlist into the queue on a background thread; returns the thread
+        
+        The fetch counts as running from this call on, so a batch_download()
+        started right after waits for its entries instead of finishing early.
+        """
+        self._begin_fetch()
+        
+        def fetch():
+            try:
+                self.fetch_playlist(playlist_url)
+            except Exception as e:
+                self.log(f"❌ Error fetching playlist: {e}")
+            finally:
+                self._end_fetch()
+        
+        thread = threading.Thread(target=fetch, daemon=True)
+        thread.start()
+        return thread
+    
+    def _begin_fetch(self):
+        """Track a running playlist fetch"""
+        with self.fetch_lock:
+            if self.active_fetches == 0:
+                self.fetch_cancel_event.clear()
+            self.active_fetches += 1
+    
+    def _end_fetch(self):
+        """Track a finished playlist fetch"""
+        with self.fetch_lock:
+            self.active_fetches -= 1
+    
+    def is_fetching(self):
+        """Check whether any playlist is still streaming into the queue"""
+        with self.fetch_lock:
+            return self.active_fetches > 0
+    
+    def stop_playlist_fetch(self):
+        """Stop all running playlist fetches, keeping the entries added so far"""
+        if self.is_fetching():
+            self.fetch_cancel_event.set()
+            self.log("⚠️ Stopping playlist fetch...")
+    
+    def cancel(self):
+        """Cancel the running batch"""
+        self.cancel_event.set()
+        with self.item_cancel_lock:
+            for event in self.item_cancel_events.values():
+                event.set()
+        self.transcoder.kill()
+        self.log("❌ Download cancellation requested...")
+    
+    def cancel_item(self, key, in_flight_only=False):
+        """Cancel one item of the running batch; returns False if there was nothing to cancel
+        
+        Items still waiting for a worker are dropped when their turn comes,
+        unless in_flight_only is set, which leaves them alone.
+        """
+        if not self.is_downloading:
+            return False
+        if in_flight_only:
+            with self.item_cancel_lock:
+                if key not in self.active_keys:
+                    return False
+        item = self.queue.get(key)
+        self.get_item_cancel_event(key).set()
+        self.log(f"❌ Cancelling: {item.title if item else key}")
+        return True
+    
+    def get_item_cancel_event(self, key):
+        """Get the event that cancels the item with this key; cancelling the batch sets it too"""
+        with self.item_cancel_lock:
+            event = self.item_cancel_events.get(key)
+            if event is None:
+                event = self.item_cancel_events[key] = threading.Event()
+                if self.cancel_event.is_set():
+                    event.set()
+            return event
+    
+    def _set_item_active(self, key, active):
+        """Mark an item of the batch as handed to a worker or finished"""
+        with self.item_cancel_lock:
+            if active:
+                self.active_keys.add(key)
+            else:
+                self.active_keys.discard(key)
+    
+    def batch_download(self):
+        """Download all URLs in the queue using a pool of parallel workers
+        
+        Blocks until the batch is finished or cancelled and returns a summary
+        dict with the total, successful and failed counts.
+        """
+        self.is_downloading = True
+        self.batch_idle.clear()
+        self.telemetry.reset()
+        self.breaker.reset()
+        self.tracer.begin_batch()
+        self.scheduler.reset()
+        with self.item_cancel_lock:
+            self.item_cancel_events = {}
+            self.active_keys = set()
+        
+        output_path = self.output_path
+        successful_downloads = 0
+        failed_downloads = 0
+        skipped_downloads = 0
+        cancelled_downloads = 0
+        total_urls = 0
+        
+        try:
+            os.makedirs(output_path, exist_ok=True)
+            
+            worker_count = self.get_worker_count()
+            
+            self.log(f"Starting batch download of {len(self.queue)} items "
+                     f"({worker_count} parallel download{'s' if worker_count != 1 else ''})...")
+            
+            # Items are numbered in the order they are handed to the workers,
+            # which the schedule picks whenever a worker is free. Items added
+            # while the batch runs (e.g. a playlist still being fetched) join
+            # the batch as they arrive.
+            batch_items = []
+            self.batch_total = 0
+            
+            finished_count = 0
+            
+            # Results are reported in queue order, even if workers finish out of order
+            results = {}
+            next_to_report = 1
+            
+            # Items that failed on throttling or network errors get one more
+            # try once the rest of the batch is done; other failures are final
+            requeued = {}
+            retried = set()
+            
+            with ThreadPoolExecutor(max_workers=worker_count,
+                                    thread_name_prefix="redsea-download") as executor:
+                futures = {}
+                # Transcode futures of items handed to the transcode pool
+                transcodes = {}
+                seen_version = None
+                
+                while True:
+                    # Follow items that joined, left or moved in the queue since the last pass
+                    if seen_version != self.queue.version and not self.cancel_event.is_set():
+                        seen_version = self.queue.version
+                        # Queued items of this batch not handed to a worker yet
+                        started_keys = {item.key for item in batch_items}
+                        self.scheduler.load([item for item in self.queue if item.key not in started_keys])
+                        self.batch_total = len(batch_items) + len(self.scheduler)
+                        self.telemetry.total_items = self.batch_total
+                    
+                    # Hand the next items of the schedule to the free workers
+                    while (self.scheduler and len(futures) - len(transcodes) < worker_count
+                           and not self.cancel_event.is_set()):
+                        item = self.scheduler.pop(self.schedule)
+                        batch_items.append(item)
+                        self._set_item_active(item.key, True)
+                        futures[executor.submit(self._download_queue_item, len(batch_items),
+                                                item, output_path)] = len(batch_items)
+                    
+                    if not futures:
+                        if self.cancel_event.is_set():
+                            break
+                        # Keep waiting while a playlist may still add items
+                        if not self.is_fetching() and seen_version == self.queue.version:
+                            if not requeued:
+                                break
+                            
+                            # Retry failed items at the end of the queue
+                            self.log(f"🔁 Retrying {len(requeued)} failed item{'s' if len(requeued) != 1 else ''}...")
+                            for i, failure in requeued.items():
+                                item = batch_items[i - 1]
+                                retried.add(i)
+                                # Items removed from the queue meanwhile stay failed
+                                if self.queue.get(item.key) is None:
+                                    results[i] = ('failed', failure)
+                                    finished_count += 1
+                                    continue
+                                self.queue.move_to_end(item.key)
+                                self.set_item_state(item.key, 'pending')
+                                self._set_item_active(item.key, True)
+                                futures[executor.submit(self._download_queue_item, i, item, output_path)] = i
+                            requeued = {}
+                            continue
+                        time.sleep(0.2)
+                        continue
+                    
+                    done, _ = wait(futures, timeout=0.2, return_when=FIRST_COMPLETED)
+                    total_urls = self.batch_total
+                    
+                    for future in done:
+                        i = futures.pop(future)
+                        if future in transcodes:
+                            results[i] = self._finish_transcode(transcodes.pop(future), future)
+                        else:
+                            results[i] = future.result()
+                            if results[i][0] == 'transcoding':
+                                # The item finishes when its encode does
+                                transcode = results.pop(i)[1]
+                                transcodes[transcode] = batch_items[i - 1]
+                                futures[transcode] = i
+                                continue
+                        self._set_item_active(batch_items[i - 1].key, False)
+                        
+                        if results[i][0] == 'failed' and i not in retried and results[i][1].retryable:
+                            requeued[i] = results[i][1]
+                            results[i] = ('requeued', results[i][1])
+                        elif results[i][0] != 'cancelled' or not self.cancel_event.is_set():
+                            # Items cancelled on their own are done; the batch goes on
+                            finished_count += 1
+                    
+                    # Update overall progress as soon as any worker finishes
+                    if done and self.on_progress:
+                        self.on_progress(finished_count, total_urls)
+                    
+                    # Retried items already had their turn in the order and are reported as they finish
+                    ready = [i for i in results if i in retried]
+                    while next_to_report in results:
+                        ready.append(next_to_report)
+                        next_to_report += 1
+                    
+                    for i in ready:
+                        status, error = results.pop(i)
+                        item = batch_items[i - 1]
+                        prefix = f"[{i}/{total_urls}]"
+                        
+                        if status == 'ok':
+                            successful_downloads += 1
+                            self.log(f"{prefix} ✅ {item.title} ({self.get_format_text()}) - Completed successfully")
+                        elif status == 'failed':
+                            failed_downloads += 1
+                            self.log(f"{prefix} ❌ {item.title} - {error}")
+                        elif status == 'requeued':
+                            self.log(f"{prefix} ⚠️ {item.title} - {error}; will retry at the end of the batch")
+                        elif status == 'skipped':
+                            skipped_downloads += 1
+                            self.log(f"{prefix} ⏭️ {item.title} - Already downloaded, skipped")
+                        elif status == 'cancelled' and not self.cancel_event.is_set():
+                            cancelled_downloads += 1
+                            self.log(f"{prefix} ❌ {item.title} - Download cancelled")
+                        elif status == 'cancelled' and error:
+                            # Only items that were in flight report their cancellation
+                            self.log(f"{prefix} ❌ {item.title} - Download cancelled")
+            
+            total_urls = self.batch_total
+            
+            # Items cancelled before their retry stay failed
+            failed_downloads += len(requeued)
+            
+            # Where did the time go?
+            stats = self.telemetry.snapshot()['batch']
+            phase_text = ", ".join(f"{phase} {format_duration(seconds)}"
+                                   for phase, seconds in stats['phase_seconds'].items())
+            self.log(f"⏱️ Time by stage (summed over workers): {phase_text}")
+            self.log(f"⏱️ Transferred {format_bytes(stats['transferred'])} in {format_duration(stats['elapsed'])} "
+                     f"({format_bytes(stats['average_speed'])}/s average)")
+            
+            if not self.cancel_event.is_set():
+                self.log(f"\n📊 Batch Download Complete!")
+                self.log(f"✅ Successful: {successful_downloads}")
+                self.log(f"❌ Failed: {failed_downloads}")
+                if skipped_downloads > 0:
+                    self.log(f"⏭️ Skipped (already downloaded): {skipped_downloads}")
+                if cancelled_downloads > 0:
+                    self.log(f"⏹️ Cancelled: {cancelled_downloads}")
+                if retried:
+                    self.log(f"🔁 Retried at the end of the batch: {len(retried)}")
+                self.log(f"📁 Files saved to: {output_path}")
+                
+                cache_stats = self.metadata_cache.stats()
+                self.log(f"🗂️ Metadata cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                         f"{cache_stats['entries']} entries")
+                
+                fragment_stats = self.fragment_tuner.stats()
+                measured = fragment_stats['levels'].get(fragment_stats['current'])
+                if self.fragment_concurrency == 'auto' and measured:
+                    self.log(f"🧩 Fragment downloads: {fragment_stats['current']} at once (auto; "
+                             f"{format_bytes(measured[0])}/s, {measured[1] * 1000:.0f} ms per fragment)")
+                
+                bandwidth_text = self.get_bandwidth_text()
+                if bandwidth_text:
+                    self.log(f"🚦 Bandwidth limit: {bandwidth_text}")
+            else:
+                self.log("❌ Download cancelled by user")
+                if successful_downloads > 0:
+                    self.log(f"\n📊 Download Cancelled - Partial Results:")
+                    self.log(f"✅ Completed before cancellation: {successful_downloads}")
+                    self.log(f"❌ Failed: {failed_downloads}")
+                    self.log(f"📁 Files saved to: {output_path}")
+                else:
+                    self.log(f"\n❌ Download cancelled - no files completed")
+        
+        finally:
+            self.is_downloading = False
+            with self.item_cancel_lock:
+                self.active_keys = set()
+            self.tracer.write_metrics()
+            self.storage.cleanup(output_path)
+            self.batch_idle.set()
+        
+        return {
+            'total': total_urls,
+            'successful': successful_downloads,
+            'failed': failed_downloads,
+            'skipped': skipped_downloads,
+            'cancelled_items': cancelled_downloads,
+            'cancelled': self.cancel_event.is_set(),
+            'output_path': output_path,
+        }
+    
+    def _download_queue_item(self, i, item, output_path):
+        """Download one queue item on a worker thread.
+        
+        Returns a (status, error) tuple where status is 'ok', 'failed',
+        'skipped' or 'cancelled'. For cancelled items, error is True when the
+        item was already in flight. Items whose MP3 encode was handed to the
+        transcode pool return ('transcoding', future) instead.
+        """
+        # Items still waiting for a worker are dropped once cancelled
+        cancel_event = self.get_item_cancel_event(item.key)
+        if cancel_event.is_set():
+            return ('cancelled', False)
+        
+        # Finished items are skipped before any network request; if only one
+        # format of an MP3 + MP4 item is missing, only that one is fetched
+        format_choice = self.format_choice
+        with self.tracer.span('validate', item.key) as span:
+            video_id = extract_video_id(item.url)
+            missing = None
+            if self.use_archive and video_id:
+                missing = self.missing_formats(video_id, format_choice)
+            span.set(archived=missing == [])
+        if missing is not None:
+            if not missing:
+                self.set_item_state(item.key, 'done')
+                return ('skipped', None)
+            if len(missing) == 1:
+                format_choice = missing[0]
+        
+        # New downloads wait while the server is throttling us
+        if not self.breaker.wait(cancel_event):
+            return ('cancelled', False)
+        
+        title = item.title
+        total_urls = self.batch_total
+        handed_off = False
+        attempt = 0
+        try:
+            self.log(f"[{i}/{total_urls}] Starting: {title} ({self.get_format_text()})")
+            if self.on_item_start:
+                self.on_item_start(i, total_urls, item)
+            
+            self.set_item_state(item.key, 'downloading')
+            self.telemetry.start_item(item.key, title)
+            
+            while True:
+                try:
+                    transcode = self.download_single_url(item.url, output_path, key=item.key,
+                                                         format_choice=format_choice,
+                                                         defer_transcode=self.pipeline,
+                                                         trace=self.tracer.item(item.key, title),
+                                                         cancel_event=cancel_event)
+                    break
+                except Exception as e:
+                    # Check if the error was due to cancellation
+                    if cancel_event.is_set():
+                        raise
+                    
+                    failure = DownloadFailure.from_exception(e)
+                    kind = failure.kind
+                    pause = self.breaker.record_failure(kind)
+                    if pause:
+                        self.log(f"⏸️ The server keeps throttling downloads; pausing new downloads "
+                                 f"for {format_duration(pause)}")
+                    
+                    if kind not in BACKOFF_SECONDS or attempt >= ITEM_RETRIES:
+                        self.set_item_state(item.key, 'failed')
+                        return ('failed', failure)
+                    
+                    # Throttled and network errors are retried after a jittered backoff
+                    delay = backoff_delay(attempt, *BACKOFF_SECONDS[kind])
+                    attempt += 1
+                    self.log(f"[{i}/{total_urls}] ⚠️ {title} - {ERROR_TEXT[kind]}, retrying in "
+                             f"{delay:.0f}s (attempt {attempt + 1} of {ITEM_RETRIES + 1})")
+                    if cancel_event.wait(delay) or not self.breaker.wait(cancel_event):
+                        raise
+            
+            self.breaker.record_success()
+            if transcode is not None:
+                handed_off = True
+                return ('transcoding', transcode)
+            
+            # Check if cancelled during download
+            if cancel_event.is_set():
+                self.set_item_state(item.key, 'pending')
+                return ('cancelled', True)
+            
+            self.set_item_state(item.key, 'done')
+            return ('ok', None)
+        
+        except Exception as e:
+            # Check if the error was due to cancellation
+            if cancel_event.is_set():
+                self.set_item_state(item.key, 'pending')
+                return ('cancelled', True)
+            self.set_item_state(item.key, 'failed')
+            return ('failed', DownloadFailure.from_exception(e))
+        
+        finally:
+            if not handed_off:
+                self.telemetry.finish_item(item.key)
+    
+    def _finish_transcode(self, item, transcode):
+        """Get the (status, error) result of an item whose encode has finished"""
+        try:
+            transcode.result()
+            self.set_item_state(item.key, 'done')
+            return ('ok', None)
+        except Exception as e:
+            if self.get_item_cancel_event(item.key).is_set():
+                self.set_item_state(item.key, 'pending')
+                return ('cancelled', True)
+            self.set_item_state(item.key, 'failed')
+            return ('failed', DownloadFailure.from_exception(e))
+        finally:
+            self.telemetry.finish_item(item.key)
+    
+    def download_single_url(self, url, output_path, key=None, format_choice=None, defer_transcode=False,
+                            trace=None, cancel_event=None):
+        """Download a single URL in the selected format(s) with cancellation support
+        
+        key identifies the item in self.telemetry; progress is only recorded
+        when it is given. format_choice overrides the engine's format setting.
+        Finished downloads are recorded in the archive.
+        
+        With the pipeline on, MP3 encoding runs on the transcode pool. By
+        default this waits for it; with defer_transcode the encode's Future
+        is returned instead (None when there is nothing to encode).
+        
+        trace is the Tracer item trace the stages are timed in; by default
+        a new one is started for key.
+        
+        cancel_event cancels this download (by default the batch's): the
+        extraction or transfer is abandoned, any ffmpeg process is killed
+        and the partial files are deleted.
+        
+        The download waits until the disk has room for it; it fails with a
+        DiskSpaceError if it can't fit at all.
+        """
+        if trace is None:
+            trace = self.tracer.item(key)
+        if cancel_event is None:
+            cancel_event = self.cancel_event
+        space = self.storage.reservation()
+        try:
+            return self._download_single_url(url, output_path, key, format_choice, defer_transcode, trace,
+                                             cancel_event, space)
+        except BaseException as e:
+            trace.end(e, cancelled=cancel_event.is_set())
+            space.release()
+            raise
+    
+    def _download_single_url(self, url, output_path, key, format_choice, defer_transcode, trace, cancel_event,
+                             space):
+        # Check for cancellation before starting
+        if cancel_event.is_set():
+            raise Exception("Download cancelled by user")
+        
+        ffmpeg_path = get_ffmpeg_path()
+        if ffmpeg_path and not os.path.exists(ffmpeg_path):
+            raise Exception(f"FFmpeg not found at: {ffmpeg_path}")
+        
+        telemetry_hook = self.telemetry.progress_hook(key) if key else None
+        telemetry_postprocessor_hook = self.telemetry.postprocessor_hook(key) if key else None
+        trace_progress_hook = trace.progress_hook if trace else None
+        trace_postprocessor_hook = trace.postprocessor_hook if trace else None
+        
+        # Journal the switch to ffmpeg postprocessing and record its progress;
+        # the item reads nothing from the network meanwhile, so its bandwidth
+        # share goes to the others until its next download starts
+        def postprocessor_hook(d):
+            if d.get('status') == 'started':
+                transfer.pause()
+                if key:
+                    self.set_item_state(key, 'postprocessing')
+            if telemetry_postprocessor_hook:
+                telemetry_postprocessor_hook(d)
+            if trace_postprocessor_hook:
+                trace_postprocessor_hook(d)
+        
+        # Files yt-dlp is writing, deleted if the download is cancelled
+        partial_files = set()
+        
+        def remove_partial_files():
+            self._remove_partial_files(partial_files)
+        
+        # Custom progress hook to check for cancellation, record progress and
+        # hold the transfer to its share of the bandwidth
+        def progress_hook(d):
+            if d.get('tmpfilename'):
+                partial_files.add(d['tmpfilename'])
+            if cancel_event.is_set():
+                raise Exception("Download cancelled by user")
+            if telemetry_hook:
+                telemetry_hook(d)
+            if trace_progress_hook:
+                trace_progress_hook(d)
+            space.progress_hook(d)
+            transfer.progress_hook(d)
+            if cancel_event.is_set():
+                raise Exception("Download cancelled by user")
+        
+        # Get format selection
+        format_choice = format_choice or self.format_choice
+        
+        # Extract video info once; every format below is downloaded from this
+        # same info dict instead of re-extracting the URL. Recently extracted
+        # info dicts come straight from the metadata cache.
+        trace.switch('extract')
+        video_id = extract_video_id(url)
+        info = self.metadata_cache.get(video_id, 'info') if video_id else None
+        from_cache = info is not None
+        if info is None:
+            info = self._run_cancellable(cancel_event, self._extract_video_info, url, video_id, cancel_event)
+        trace.set(cached=from_cache)
+        
+        title = info.get('title', 'Unknown')
+        duration = info.get('duration', 0)
+        
+        self.log(f"Video title: {title}")
+        if duration:
+            duration = int(duration)
+            minutes = duration // 60
+            seconds = duration % 60
+            self.log(f"Duration: {minutes}:{seconds:02d}")
+        
+        # Wait until the disk has room for everything this item will write
+        size = estimate_download_size(info, format_choice, self.single_fetch)
+        if size:
+            def on_wait(needed, available):
+                self.log(f"💾 Waiting for disk space: {title} needs {format_bytes(needed)}, "
+                         f"{format_bytes(available)} available")
+            
+            if not self.storage.admit(space, output_path, space_needed(size, format_choice), cancel_event,
+                                      on_wait):
+                raise Exception("Download cancelled by user")
+        
+        # Raw files waiting for an MP3 encode or a stream copy, as (source, target, keep_source, copy);
+        # audio is always remuxed on the transcode pool, as it needs no yt-dlp postprocessor
+        handoff = [] if self.pipeline or format_choice == 'audio' else None
+        
+        with self.bandwidth.open_transfer(title, cancel_event=cancel_event) as transfer:
+            try:
+                # The first progress event ends format selection and starts the transfer
+                trace.switch('format_selection', format=format_choice)
+                output_files = self._run_cancellable(cancel_event, self._download_formats, info, format_choice,
+                                                     output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                                                     cancel_event, handoff, cleanup=remove_partial_files)
+            except Exception:
+                if not from_cache or cancel_event.is_set():
+                    raise
+                
+                # Cached stream URLs can expire early; retry once with fresh metadata
+                self.log("⚠️ Cached video info is stale, extracting again...")
+                self.metadata_cache.delete(video_id, 'info')
+                trace.switch('extract', cached=False, stale_cache=True)
+                info = self._run_cancellable(cancel_event, self._extract_video_info, url, video_id, cancel_event)
+                if handoff:
+                    handoff.clear()
+                trace.switch('format_selection', format=format_choice)
+                output_files = self._run_cancellable(cancel_event, self._download_formats, info, format_choice,
+                                                     output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                                                     cancel_event, handoff, cleanup=remove_partial_files)
+        
+        def record_in_archive():
+            if video_id:
+                for format_name, files in output_files.items():
+                    self.archive.add(video_id, format_name, self.archive_quality(format_name), files)
+        
+        if not handoff:
+            # yt-dlp's final move into place may have started finalizing already
+            if trace.stage != 'finalize':
+                trace.switch('finalize')
+            record_in_archive()
+            if trace:
+                trace.add_bytes(self._files_size(output_files))
+            trace.end()
+            space.release()
+            return None
+        
+        # Each item needs at most one MP3 encode or stream copy
+        source_path, target_path, keep_source, copy = handoff[0]
+        
+        # Nothing is traced while the encode waits for a transcode worker
+        trace.pause()
+        handed_off = time.perf_counter()
+        
+        def on_transcode_start():
+            trace.switch('postprocess', postprocessors=['TranscodePool'], copy=copy,
+                         queued=round(time.perf_counter() - handed_off, 6))
+            if key:
+                self.telemetry.set_phase(key, 'postprocessing')
+                self.set_item_state(key, 'postprocessing')
+        
+        if key:
+            self.telemetry.set_phase(key, 'waiting')
+        def on_transcode_done():
+            trace.switch('finalize')
+            record_in_archive()
+            if trace:
+                trace.add_bytes(self._files_size({'mp3': [target_path]}))
+            trace.end()
+        
+        transcode = self.transcoder.submit(source_path, target_path, self.quality, ffmpeg_path,
+                                           keep_source=keep_source, on_start=on_transcode_start,
+                                           on_done=on_transcode_done, cancel_event=cancel_event, copy=copy,
+                                           temp_path=self.storage.staging_path(target_path))
+        if transcode is None:
+            raise Exception("Download cancelled by user")
+        transcode.add_done_callback(lambda future: space.release())
+        if trace:
+            # A failed or cancelled encode ends the trace with its error
+            transcode.add_done_callback(lambda future: trace.end(
+                None if future.cancelled() else future.exception(), cancelled=cancel_event.is_set()))
+        
+        if defer_transcode:
+            return transcode
+        transcode.result()
+        return None
+    
+    def _run_cancellable(self, cancel_event, function, *args, cleanup=None):
+        """Call function on a helper thread and return its result, giving up on it once cancelled
+        
+        yt-dlp only notices a cancellation at its next progress hook, and an
+        extraction or a stalled connection may not reach one for a long
+        time. Once cancel_event is set the call gets CANCEL_GRACE_SECONDS to
+        stop, then the worker moves on without it. cleanup runs on the
+        helper thread after a cancelled call has really stopped.
+        """
+        outcome = {}
+        finished = threading.Event()
+        
+        def run():
+            try:
+                outcome['result'] = function(*args)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                if cleanup is not None and cancel_event.is_set():
+                    cleanup()
+                finished.set()
+        
+        threading.Thread(target=run, daemon=True).start()
+        while not finished.wait(CANCEL_POLL_INTERVAL):
+            if cancel_event.is_set() and not finished.wait(CANCEL_GRACE_SECONDS):
+                raise Exception("Download cancelled by user")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+    
+    @staticmethod
+    def _remove_partial_files(paths):
+        """Delete the .part files of a cancelled download, with yt-dlp's resume state and fragments"""
+        for path in list(paths):
+            leftovers = [path] + glob.glob(glob.escape(path) + '-Frag*')
+            if path.endswith('.part'):
+                leftovers.append(path[:-len('.part')] + '.ytdl')
+            for leftover in leftovers:
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+    
+    def _extract_video_info(self, url, video_id, cancel_event):
+        """Extract the info dict for a video and store it in the metadata cache"""
+        info_opts = {
+            'http_headers': HTTP_HEADERS,
+            'retry_sleep_functions': retry_sleep_functions(),
+            'quiet': self.quiet,
+            'no_warnings': self.quiet,
+        }
+        
+        with self.ydl_pool.session(info_opts) as ydl:
+            if cancel_event.is_set():
+                raise Exception("Download cancelled by user")
+            
+            info = ydl.extract_info(url, download=False, process=False)
+        
+        # Keep the cached copy JSON safe and drop large fields we never use
+        import yt_dlp
+        info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+        for key in ('automatic_captions', 'subtitles', 'heatmap'):
+            info.pop(key, None)
+        
+        if video_id:
+            self.metadata_cache.set(video_id, 'info', info)
+            if info.get('title'):
+                self.metadata_cache.set(video_id, 'title', info['title'])
+            if info.get('duration'):
+                self.metadata_cache.set(video_id, 'duration', info['duration'])
+        
+        return info
+    
+    def _download_formats(self, info, format_choice, output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                          cancel_event, handoff=None):
+        """Download an extracted video in the selected format(s)
+        
+        Returns a {format: [output file paths]} dict. If handoff is a list,
+        MP3s are not encoded here; the raw files to encode are appended to it.
+        cancel_event is the item's own, checked before each format starts.
+        """
+        output_files = {}
+        if format_choice == "mp3":
+            output_files.update(self._download_mp3(info, output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                                                   cancel_event, handoff))
+        elif format_choice == "mp4":
+            output_files.update(self._download_mp4(info, output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                                                   cancel_event))
+        elif format_choice == "audio":
+            output_files.update(self._download_audio(info, output_path, progress_hook, postprocessor_hook,
+                                                     ffmpeg_path, cancel_event, handoff))
+        elif format_choice == "both" and self.single_fetch and single_fetch_keeps_audio(info):
+            self.log("Downloading MP4 video and extracting MP3 audio...")
+            output_files.update(self._download_both(info, output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                                                    cancel_event, handoff))
+        elif format_choice == "both":
+            if self.single_fetch:
+                self.log("The MP4's audio is below the best audio stream; downloading the MP3 separately")
+            self.log("Downloading MP3 audio...")
+            output_files.update(self._download_mp3(info, output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                                                   cancel_event, handoff))
+            
+            if cancel_event.is_set():
+                raise Exception("Download cancelled by user")
+            
+            self.log("Downloading MP4 video...")
+            output_files.update(self._download_mp4(info, output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                                                   cancel_event))
+        return output_files
+    
+    def _base_ydl_opts(self, output_path, progress_hook, postprocessor_hook, ffmpeg_path, staged=False):
+        """Get the yt-dlp options shared by every download
+        
+        yt-dlp writes in the staging directory and renames the finished
+        files into output_path; with staged, they stay in staging for the
+        transcode pool to convert into output_path.
+        """
+        fragment_concurrency = self.get_fragment_concurrency()
+        progress_hooks = [progress_hook]
+        if self.fragment_concurrency == 'auto':
+            progress_hooks.append(self.fragment_tuner.progress_hook(fragment_concurrency))
+        
+        staging_dir = self.storage.staging_dir(output_path)
+        ydl_opts = {
+            'outtmpl': '%(title)s.%(ext)s',
+            'paths': {'home': staging_dir if staged else output_path, 'temp': staging_dir},
+            'http_headers': HTTP_HEADERS,
+            'progress_hooks': progress_hooks,
+            'postprocessor_hooks': [postprocessor_hook],
+            'extractor_retries': 3,
+            'fragment_retries': 3,
+            # yt-dlp's API default is no retries of failed HTTP requests at all
+            'retries': 5,
+            # A fragment that still fails fails the download (and the item is
+            # retried) instead of leaving a gap in the file
+            'skip_unavailable_fragments': False,
+            # Back off between yt-dlp's own retries instead of retrying at once
+            'retry_sleep_functions': retry_sleep_functions(),
+            # DASH/HLS formats fetch this many fragments at once
+            'concurrent_fragment_downloads': fragment_concurrency,
+            # Pick up .part files left by an interrupted run at their current size
+            'continuedl': True,
+            'quiet': self.quiet,
+            'noprogress': self.quiet,
+            'no_warnings': self.quiet,
+        }
+        
+        if ffmpeg_path:
+            ydl_opts['ffmpeg_location'] = ffmpeg_path
+        
+        return ydl_opts
+    
+    def _download_mp3(self, info, output_path, progress_hook, postprocessor_hook, ffmpeg_path, cancel_event,
+                      handoff=None):
+        """Download MP3 audio only (or just the raw audio, when handing off to the transcode pool)"""
+        if cancel_event.is_set():
+            raise Exception("Download cancelled by user")
+        
+        ydl_opts = self._base_ydl_opts(output_path, progress_hook, postprocessor_hook, ffmpeg_path,
+                                       staged=handoff is not None)
+        ydl_opts.update({
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': self.quality,
+            }],
+        })
+        
+        if handoff is not None:
+            del ydl_opts['postprocessors']
+            result = self._download_from_info(ydl_opts, info)
+            return {'mp3': self._hand_off(self._output_files(result), handoff, False, output_path)}
+        
+        result = self._download_from_info(ydl_opts, info)
+        return {'mp3': self._output_files(result)}
+    
+    def _download_mp4(self, info, output_path, progress_hook, postprocessor_hook, ffmpeg_path, cancel_event):
+        """Download MP4 video"""
+        if cancel_event.is_set():
+            raise Exception("Download cancelled by user")
+        
+        ydl_opts = self._base_ydl_opts(output_path, progress_hook, postprocessor_hook, ffmpeg_path)
+        ydl_opts['format'] = 'best[ext=mp4]/best'
+        
+        result = self._download_from_info(ydl_opts, info)
+        return {'mp4': self._output_files(result)}
+    
+    def _download_audio(self, info, output_path, progress_hook, postprocessor_hook, ffmpeg_path, cancel_event,
+                        handoff):
+        """Download the best audio and keep its codec, queueing a stream copy into its own container if needed"""
+        if cancel_event.is_set():
+            raise Exception("Download cancelled by user")
+        
+        ydl_opts = self._base_ydl_opts(output_path, progress_hook, postprocessor_hook, ffmpeg_path, staged=True)
+        ydl_opts['format'] = 'bestaudio/best'
+        
+        result = self._download_from_info(ydl_opts, info)
+        audio_paths = []
+        for download in (result or {}).get('requested_downloads', []):
+            source_path = download.get('filepath')
+            if not source_path:
+                continue
+            
+            # yt-dlp knows the codec of what it fetched; ffmpeg is only asked when it doesn't
+            codec = audio_codec_name(download.get('acodec')) or probe_audio_codec(source_path, ffmpeg_path)
+            name, source_extension = os.path.splitext(os.path.basename(source_path))
+            has_video = download.get('vcodec') not in (None, 'none')
+            if not has_video and AUDIO_COPY_EXTENSIONS.get(codec) == source_extension[1:]:
+                # Already an audio-only file in the right container; kept without ffmpeg
+                audio_paths.append(self.storage.finalize(source_path, os.path.join(output_path,
+                                                                                   os.path.basename(source_path))))
+                continue
+            
+            extension = audio_copy_extension(codec, ffmpeg_path)
+            if extension is None:
+                if codec in AUDIO_COPY_EXTENSIONS:
+                    self.log(f"FFmpeg can't write .{AUDIO_COPY_EXTENSIONS[codec]} files; converting {codec} audio "
+                             f"to MP3")
+                else:
+                    self.log(f"No audio container takes {codec or 'this'} audio as is; converting to MP3")
+                audio_paths.extend(self._hand_off([source_path], handoff, False, output_path))
+                continue
+            
+            target_path = os.path.join(output_path, name + '.' + extension)
+            self.log(f"Keeping the original {codec} audio as .{extension} (no re-encoding)")
+            handoff.append((source_path, target_path, False, True))
+            audio_paths.append(target_path)
+        return {'audio': audio_paths}
+    
+    def _download_both(self, info, output_path, progress_hook, postprocessor_hook, ffmpeg_path, cancel_event,
+                       handoff=None):
+        """Download MP4 video once and convert its audio track to MP3 locally"""
+        if cancel_event.is_set():
+            raise Exception("Download cancelled by user")
+        
+        ydl_opts = self._base_ydl_opts(output_path, progress_hook, postprocessor_hook, ffmpeg_path)
+        ydl_opts.update({
+            'format': 'best[ext=mp4]/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': self.quality,
+            }],
+            # Keep the fetched video next to the extracted MP3
+            'keepvideo': True,
+        })
+        
+        if handoff is not None:
+            del ydl_opts['postprocessors']
+            result = self._download_from_info(ydl_opts, info)
+            videos = self._output_files(result)
+            return {'mp3': self._hand_off(videos, handoff, True, output_path), 'mp4': videos}
+        
+        result = self._download_from_info(ydl_opts, info)
+        # 'filepath' is the extracted MP3, '_filename' the video it came from
+        return {'mp3': self._output_files(result), 'mp4': self._output_files(result, '_filename')}
+    
+    def _download_from_info(self, ydl_opts, info):
+        """Select formats and download from an already extracted info dict, returning the processed result"""
+        with self.ydl_pool.session(ydl_opts) as ydl:
+            # Processing mutates the info dict, so each format gets its own copy
+            return ydl.process_ie_result(copy.deepcopy(info), download=True)
+    
+    def _hand_off(self, source_paths, handoff, keep_source, output_path):
+        """Queue raw files for an MP3 encode into output_path and return the MP3 paths they will produce"""
+        mp3_paths = []
+        for source_path in source_paths:
+            name, extension = os.path.splitext(os.path.basename(source_path))
+            mp3_path = os.path.join(output_path, name + '.mp3')
+            if extension == '.mp3':
+                # Audio that already is an MP3 needs no encode, only moving into place
+                self.storage.finalize(source_path, mp3_path)
+            else:
+                handoff.append((source_path, mp3_path, keep_source, False))
+            mp3_paths.append(mp3_path)
+        return mp3_paths
+    
+    @staticmethod
+    def _files_size(output_files):
+        """Get the total size in bytes of the files in a {format: [paths]} dict"""
+        size = 0
+        for path in {path for paths in output_files.values() for path in paths}:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+    
+    @staticmethod
+    def _output_files(result, key='filepath'):
+        """Get the final paths of the files a processed info dict was downloaded to"""
+        return [download[key] for download in (result or {}).get('requested_downloads', [])
+                if download.get(key)]
@@ -0,0 +1,224 @@
+"""Download error classification, retry backoff and the throttling circuit breaker"""
+
+import errno
+import random
+import re
+import threading
+import time
+
+from .storage import DiskSpaceError
+from .transcode import TranscodeError
+
+# Error kinds
+ERROR_THROTTLED = 'throttled'
+ERROR_TRANSIENT = 'transient'
+ERROR_UNAVAILABLE = 'unavailable'
+ERROR_POSTPROCESS = 'postprocess'
+ERROR_DISK_FULL = 'disk_full'
+ERROR_OTHER = 'error'
+
+ERROR_TEXT = {
+    ERROR_THROTTLED: 'Throttled by the server',
+    ERROR_TRANSIENT: 'Network error',
+    ERROR_UNAVAILABLE: 'Video unavailable',
+    ERROR_POSTPROCESS: 'Conversion failed',
+    ERROR_DISK_FULL: 'Not enough disk space',
+    ERROR_OTHER: 'Failed',
+}
+
+# Retries of one item within its attempt, with (base, cap) backoff in seconds
+ITEM_RETRIES = 3
+BACKOFF_SECONDS = {
+    ERROR_THROTTLED: (15, 300),
+    ERROR_TRANSIENT: (2, 60),
+}
+
+# yt-dlp's own HTTP/fragment/extractor retries back off from this (base, cap)
+YTDLP_RETRY_BACKOFF = (1, 30)
+
+# Throttled failures within the window that pause new downloads, and for how long
+BREAKER_THRESHOLD = 3
+BREAKER_WINDOW = 120
+BREAKER_COOLDOWN = 60
+BREAKER_MAX_COOLDOWN = 900
+
+_HTTP_STATUS = re.compile(r'HTTP Error (\d{3})')
+
+_THROTTLED_PATTERNS = ('too many requests', 'rate limit', 'rate-limit', 'ratelimit',
+                       "confirm you're not a bot", 'confirm you’re not a bot', 'throttl')
+
+_UNAVAILABLE_PATTERNS = ('video unavailable', 'private video', 'video is private', 'has been removed',
+                         'is not available', 'no longer available', 'members-only', 'members only',
+                         'confirm your age', 'age-restricted', 'copyright', 'premieres in',
+                         'does not exist', 'account associated with this video has been terminated',
+                         'unsupported url', 'requested format is not available')
+
+_TRANSIENT_PATTERNS = ('timed out', 'timeout', 'connection reset', 'connection refused',
+                       'connection aborted', 'remote end closed', 'temporary failure',
+                       'temporarily unavailable', 'network is unreachable', 'name resolution',
+                       'incompleteread', 'incomplete read', 'broken pipe', 'eof occurred',
+                       'unable to download', 'giving up after', 'did not get any data')
+
+_TRANSIENT_TYPES = ('TimeoutError', 'ConnectionError', 'ConnectionResetError', 'ConnectionAbortedError',
+                    'ConnectionRefusedError', 'BrokenPipeError', 'IncompleteRead', 'TransportError',
+                    'SSLError', 'RemoteDisconnected', 'ContentTooShortError')
+
+def _error_chain(error):
+    """Yield the error, the exceptions yt-dlp wrapped in it and their causes"""
+    seen = set()
+    pending = [error]
+    while pending:
+        error = pending.pop()
+        if error is None or id(error) in seen:
+            continue
+        seen.add(id(error))
+        yield error
+        exc_info = getattr(error, 'exc_info', None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1:
+            pending.append(exc_info[1])
+        pending.extend((error.__cause__, error.__context__))
+
+def _http_status(error):
+    for value in (getattr(error, 'status', None), getattr(error, 'code', None),
+                  getattr(getattr(error, 'response', None), 'status', None)):
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    match = _HTTP_STATUS.search(str(error))
+    return int(match.group(1)) if match else None
+
+def classify_error(error):
+    """Get the kind of a download error: throttled, transient, unavailable, postprocess, disk full or other"""
+    chain = list(_error_chain(error))
+    names = {type(e).__name__ for e in chain}
+    text = " ".join(str(e) for e in chain).lower()
+    statuses = {status for status in map(_http_status, chain) if status}
+    
+    if (any(isinstance(e, DiskSpaceError) or getattr(e, 'errno', None) == errno.ENOSPC for e in chain)
+            or 'no space left on device' in text):
+        return ERROR_DISK_FULL
+    if names & {'TranscodeError', 'PostProcessingError'} or any(isinstance(e, TranscodeError) for e in chain):
+        return ERROR_POSTPROCESS
+    if statuses & {429, 403} or any(pattern in text for pattern in _THROTTLED_PATTERNS):
+        return ERROR_THROTTLED
+    if statuses & {404, 410, 451} or any(pattern in text for pattern in _UNAVAILABLE_PATTERNS):
+        return ERROR_UNAVAILABLE
+    if (any(status >= 500 or status == 408 for status in statuses) or names & set(_TRANSIENT_TYPES)
+            or any(pattern in text for pattern in _TRANSIENT_PATTERNS)):
+        return ERROR_TRANSIENT
+    if 'ffmpeg' in text or 'postprocess' in text:
+        return ERROR_POSTPROCESS
+    return ERROR_OTHER
+
+def backoff_delay(attempt, base, cap):
+    """Exponential backoff with full jitter: a random delay up to base * 2^attempt, at most cap"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def _retry_sleep(n):
+    # yt-dlp passes the number of retries so far as the keyword n
+    return backoff_delay(n, *YTDLP_RETRY_BACKOFF)
+
+def retry_sleep_functions():
+    """Get yt-dlp retry_sleep_functions that back off with jitter instead of retrying at once
+    
+    The same function is returned every time: YoutubeDLPool keys sessions by
+    their options, and a new function per call would never match an idle one.
+    """
+    return {'http': _retry_sleep, 'fragment': _retry_sleep, 'extractor': _retry_sleep}
+
+class DownloadFailure:
+    """A failed item's error message and kind, as reported in batch results"""
+    
+    __slots__ = ('kind', 'message')
+    
+    def __init__(self, kind, message):
+        self.kind = kind
+        self.message = message
+    
+    @classmethod
+    def from_exception(cls, error):
+        # yt-dlp prefixes its DownloadError messages with 'ERROR: '
+        message = str(error)
+        if message.startswith('ERROR: '):
+            message = message[len('ERROR: '):]
+        return cls(classify_error(error), message)
+    
+    @property
+    def retryable(self):
+        """Whether another try later may help (throttling and network errors)"""
+        return self.kind in BACKOFF_SECONDS
+    
+    def __str__(self):
+        return f"{ERROR_TEXT[self.kind]}: {self.message}"
+
+class ThrottleBreaker:
+    """Batch-wide circuit breaker that pauses new downloads while the server throttles us.
+    
+    After threshold throttled failures within window seconds the breaker
+    opens and wait() blocks new starts for the cooldown. Once it has passed,
+    downloads start again, but until one succeeds a single throttled
+    failure reopens the breaker with twice the previous cooldown (at most
+    max_cooldown).
+    """
+    
+    def __init__(self, threshold=BREAKER_THRESHOLD, window=BREAKER_WINDOW,
+                 cooldown=BREAKER_COOLDOWN, max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Close the breaker and forget past failures (e.g. for a new batch)"""
+        with self._lock:
+            self._failures = []
+            self._open_until = 0.0
+            self._trips = 0
+            self._probing = False
+    
+    def record_failure(self, kind):
+        """Count a failed item; returns the pause in seconds if this opened the breaker"""
+        if kind != ERROR_THROTTLED:
+            return None
+        
+        now = time.monotonic()
+        with self._lock:
+            if now < self._open_until:
+                return None
+            self._failures = [t for t in self._failures if now - t < self.window]
+            self._failures.append(now)
+            if not self._probing and len(self._failures) < self.threshold:
+                return None
+            
+            pause = min(self.max_cooldown, self.cooldown * 2 ** self._trips)
+            # Jitter keeps several instances from coming back in lockstep
+            pause *= random.uniform(0.8, 1.2)
+            self._open_until = now + pause
+            self._trips += 1
+            self._failures = []
+            self._probing = True
+            return pause
+    
+    def record_success(self):
+        """A download went through: the next trip starts from the base cooldown again"""
+        with self._lock:
+            self._trips = 0
+            self._probing = False
+    
+    def remaining(self):
+        """Seconds until new downloads may start (0 while closed)"""
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic())
+    
+    def wait(self, cancel_event=None):
+        """Block while the breaker is open; returns False if cancel_event was set"""
+        while True:
+            remaining = self.remaining()
+            if remaining <= 0:
+                return True
+            if cancel_event is not None:
+                if cancel_event.wait(min(remaining, 1.0)):
+                    return False
+            else:
+                time.sleep(min(remaining, 1.0))
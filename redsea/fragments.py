@@ -0,0 +1,127 @@
+"""Automatic tuning of concurrent fragment downloads for DASH/HLS formats"""
+
+import threading
+
+# Concurrency levels the auto mode moves between, and where it starts
+FRAGMENT_CONCURRENCY_STEPS = (1, 2, 4, 8, 16)
+DEFAULT_FRAGMENT_CONCURRENCY = 4
+
+# Throughput has to improve by this fraction for more concurrency to be worth it
+FRAGMENT_TUNING_GAIN = 0.1
+
+# Samples at one level before the neighbouring levels are measured again
+FRAGMENT_REPROBE_SAMPLES = 20
+
+class _LevelStats:
+    """Smoothed measurements of fragmented downloads at one concurrency level"""
+    
+    __slots__ = ('throughput', 'latency', 'samples')
+    
+    def __init__(self, throughput, latency):
+        self.throughput = throughput
+        self.latency = latency
+        self.samples = 1
+    
+    def add(self, throughput, latency, weight=0.5):
+        self.throughput += (throughput - self.throughput) * weight
+        self.latency += (latency - self.latency) * weight
+        self.samples += 1
+
+class FragmentTuner:
+    """Picks concurrent_fragment_downloads from the fragmented downloads it observes.
+    
+    Every finished fragmented download is one sample: the concurrency it
+    ran with, its throughput and the average time a connection spent per
+    fragment. The tuner hill-climbs over FRAGMENT_CONCURRENCY_STEPS. It
+    steps up while more parallel requests raise throughput (per-request
+    latency was the limit) and steps back down when they don't, or when the
+    time per fragment grows as fast as the concurrency (the link is full).
+    """
+    
+    def __init__(self, initial=DEFAULT_FRAGMENT_CONCURRENCY, steps=FRAGMENT_CONCURRENCY_STEPS):
+        self.steps = tuple(steps)
+        self._index = self.steps.index(initial) if initial in self.steps else 0
+        self._levels = {}
+        self._samples_at_level = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def current(self):
+        """The concurrency new downloads should use"""
+        return self.steps[self._index]
+    
+    def progress_hook(self, concurrency):
+        """Create a yt-dlp progress hook that reports fragmented downloads run at concurrency"""
+        fragment_counts = {}
+        
+        def hook(d):
+            filename = d.get('filename')
+            if d.get('status') == 'downloading':
+                if d.get('fragment_count'):
+                    fragment_counts[filename] = d['fragment_count']
+            elif d.get('status') == 'finished' and filename in fragment_counts:
+                self.record(concurrency, d.get('total_bytes') or d.get('downloaded_bytes') or 0,
+                            d.get('elapsed') or 0, fragment_counts.pop(filename))
+        return hook
+    
+    def record(self, concurrency, num_bytes, elapsed, fragments):
+        """Add a finished fragmented download to the measurements"""
+        # Downloads with fewer fragments than connections say little about concurrency
+        if elapsed <= 0 or num_bytes <= 0 or fragments < 2 * concurrency:
+            return
+        
+        throughput = num_bytes / elapsed
+        latency = elapsed * concurrency / fragments
+        
+        with self._lock:
+            stats = self._levels.get(concurrency)
+            if stats is None:
+                self._levels[concurrency] = _LevelStats(throughput, latency)
+            else:
+                stats.add(throughput, latency)
+            
+            if concurrency == self.current:
+                self._samples_at_level += 1
+                self._adjust()
+    
+    def _adjust(self):
+        """Move one step up or down based on the measurements (lock held)"""
+        i = self._index
+        current = self._levels[self.steps[i]]
+        lower = self._levels.get(self.steps[i - 1]) if i > 0 else None
+        higher = self._levels.get(self.steps[i + 1]) if i + 1 < len(self.steps) else None
+        
+        # Conditions change; measure the neighbours again now and then
+        if self._samples_at_level >= FRAGMENT_REPROBE_SAMPLES:
+            self._levels = {self.steps[i]: current}
+            lower = higher = None
+            self._samples_at_level = 0
+        
+        if lower is not None:
+            not_worth_it = current.throughput < lower.throughput * (1 + FRAGMENT_TUNING_GAIN)
+            # Per-fragment time growing in step with concurrency means the link is saturated
+            saturated = current.latency >= lower.latency * (self.steps[i] / self.steps[i - 1]) * 0.9
+            if not_worth_it or saturated:
+                self._move(-1)
+                return
+        
+        if higher is None or higher.throughput > current.throughput * (1 + FRAGMENT_TUNING_GAIN):
+            self._move(1)
+        elif lower is None:
+            # More concurrency didn't help; see whether less does as well
+            self._move(-1)
+    
+    def _move(self, step):
+        index = min(max(self._index + step, 0), len(self.steps) - 1)
+        if index != self._index:
+            self._index = index
+            self._samples_at_level = 0
+    
+    def stats(self):
+        """Get the current level and the measured {concurrency: (bytes/s, seconds per fragment)}"""
+        with self._lock:
+            return {
+                'current': self.current,
+                'levels': {level: (stats.throughput, stats.latency)
+                           for level, stats in sorted(self._levels.items())},
+            }
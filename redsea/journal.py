@@ -0,0 +1,153 @@
+"""Crash-safe journal of the download queue"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from .download_queue import QueueItem
+from .util import get_data_dir
+
+class QueueJournal:
+    """Append-only journal of the queue's items and their download states.
+    
+    Every queue change and state change is appended as one JSON line and
+    flushed to disk, so after a crash the queue can be rebuilt by replaying
+    the file; a torn last line is ignored. Once the file holds many more
+    records than live items it is compacted by writing the current state to
+    a new file and renaming it over the old one.
+    """
+    
+    STATES = ('pending', 'downloading', 'postprocessing', 'done', 'failed')
+    # Items in these states had not finished when the journal was last written
+    UNFINISHED_STATES = ('pending', 'downloading', 'postprocessing', 'failed')
+    
+    def __init__(self, path=None, compact_after=1000):
+        self.path = path or os.path.join(get_data_dir(), "queue.journal")
+        self.compact_after = compact_after
+        
+        # key -> {'url', 'title', 'duration', 'priority', 'state'}, in queue order
+        self._items = OrderedDict()
+        self._records = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._replay()
+        self._file = open(self.path, "a", encoding="utf-8")
+    
+    def _replay(self):
+        """Rebuild the item table from the journal file"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._apply(record)
+                    self._records += 1
+        except FileNotFoundError:
+            pass
+    
+    def _apply(self, record):
+        op = record.get('op')
+        key = record.get('key')
+        if op == 'add':
+            self._items[key] = {
+                'url': record['url'],
+                'title': record.get('title', ''),
+                'duration': record.get('duration', 0),
+                'priority': record.get('priority', 0),
+                'state': record.get('state', 'pending'),
+            }
+        elif op == 'state' and key in self._items:
+            self._items[key]['state'] = record['state']
+        elif op == 'priority' and key in self._items:
+            self._items[key]['priority'] = record['priority']
+        elif op == 'remove':
+            self._items.pop(key, None)
+        elif op == 'move_front' and key in self._items:
+            self._items.move_to_end(key, last=False)
+        elif op == 'move_end' and key in self._items:
+            self._items.move_to_end(key)
+        elif op == 'clear':
+            self._items.clear()
+    
+    def _append(self, records):
+        """Apply records and write them to disk (lock held)"""
+        for record in records:
+            self._apply(record)
+        self._file.write("".join(json.dumps(record) + "\n" for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        
+        self._records += len(records)
+        if self._records > self.compact_after and self._records > 2 * len(self._items):
+            self._compact()
+    
+    def _compact(self):
+        """Rewrite the journal as one record per live item (lock held)"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for key, entry in self._items.items():
+                f.write(json.dumps(dict(entry, op='add', key=key)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self._file.close()
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._records = len(self._items)
+    
+    def unfinished_items(self):
+        """Get (QueueItem, state) pairs for journaled items that had not finished"""
+        with self._lock:
+            return [(QueueItem(entry['url'], entry['title'], entry['duration'], key=key,
+                               priority=entry['priority']), entry['state'])
+                    for key, entry in self._items.items()
+                    if entry['state'] in self.UNFINISHED_STATES]
+    
+    def restore(self, download_queue):
+        """Put unfinished items back into download_queue and start journaling its changes
+        
+        Returns the list of restored items.
+        """
+        restored = download_queue.extend(item for item, state in self.unfinished_items())
+        with self._lock:
+            # Finished items from the last session are not carried over
+            for key in [key for key in self._items if key not in download_queue]:
+                del self._items[key]
+            for item in restored:
+                self._items[item.key]['state'] = 'pending'
+            self._compact()
+        download_queue.add_listener(self.record_queue_change)
+        return restored
+    
+    def record_queue_change(self, op, payload):
+        """DownloadQueue listener that journals every change"""
+        if op == 'add':
+            records = [{'op': 'add', 'key': item.key, 'url': item.url, 'title': item.title,
+                        'duration': item.duration, 'priority': item.priority} for item in payload]
+        elif op == 'priority':
+            records = [{'op': 'priority', 'key': payload.key, 'priority': payload.priority}]
+        elif op == 'clear':
+            records = [{'op': 'clear'}]
+        else:
+            records = [{'op': op, 'key': payload.key}]
+        
+        with self._lock:
+            self._append(records)
+    
+    def set_state(self, key, state):
+        """Record a download state change for a queued item"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry['state'] == state:
+                return
+            self._append([{'op': 'state', 'key': key, 'state': state}])
+    
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._compact()
+                self._file.close()
@@ -0,0 +1,258 @@
+"""Persistent metadata cache and fast title lookups"""
+
+import html
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .util import USER_AGENT, extract_video_id, get_cache_dir
+
+class MetadataCache:
+    """Persistent SQLite cache of per-video metadata.
+    
+    Rows are keyed by video (or playlist) ID and field name, and each field
+    has its own time to live: titles and durations rarely change, while info
+    dicts carry stream URLs that expire after a few hours. The cache is
+    bounded by entry count and evicts the least recently used rows.
+    """
+    
+    DAY = 24 * 60 * 60
+    FIELD_TTLS = {
+        'title': 30 * DAY,
+        'duration': 30 * DAY,
+        'info': 60 * 60,
+        'playlist': 60 * 60,
+    }
+    DEFAULT_TTL = DAY
+    
+    def __init__(self, path=None, max_entries=20000, ttls=None):
+        self.path = path or os.path.join(get_cache_dir(), "metadata.sqlite3")
+        self.max_entries = max_entries
+        self.ttls = dict(self.FIELD_TTLS, **(ttls or {}))
+        
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " video_id TEXT NOT NULL,"
+                " field TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (video_id, field))"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed_at)"
+            )
+    
+    def get(self, video_id, field):
+        """Get a cached value, or None if it is missing or expired"""
+        return self.get_many([video_id], field).get(video_id)
+    
+    def get_many(self, video_ids, field, touch=True):
+        """Get cached values for many IDs at once as a {video_id: value} dict
+        
+        With touch off the lookup only reads: the rows keep their place in
+        the LRU order and it isn't counted in the hit/miss statistics.
+        """
+        video_ids = [video_id for video_id in video_ids if video_id]
+        now = time.time()
+        oldest = now - self.ttls.get(field, self.DEFAULT_TTL)
+        found = {}
+        
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(video_ids), 500):
+                batch = video_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT video_id, value FROM metadata WHERE field = ? AND stored_at >= ?"
+                    f" AND video_id IN ({placeholders})",
+                    [field, oldest] + batch,
+                ).fetchall()
+                for video_id, value in rows:
+                    found[video_id] = json.loads(value)
+            
+            if not touch:
+                return found
+            
+            if found:
+                with self._db:
+                    self._db.executemany(
+                        "UPDATE metadata SET accessed_at = ? WHERE video_id = ? AND field = ?",
+                        [(now, video_id, field) for video_id in found],
+                    )
+            
+            self.hits += len(found)
+            self.misses += len(video_ids) - len(found)
+        
+        return found
+    
+    def set(self, video_id, field, value):
+        """Store a JSON serializable value"""
+        self.set_many(field, {video_id: value})
+    
+    def set_many(self, field, values):
+        """Store many values of one field from a {video_id: value} dict"""
+        now = time.time()
+        rows = [(video_id, field, json.dumps(value), now, now)
+                for video_id, value in values.items() if video_id]
+        if not rows:
+            return
+        
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO metadata (video_id, field, value, stored_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            
+            self._writes_since_evict += len(rows)
+            if self._writes_since_evict >= 100:
+                self._evict()
+    
+    def delete(self, video_id, field):
+        """Drop a cached value"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM metadata WHERE video_id = ? AND field = ?", (video_id, field))
+    
+    def _evict(self):
+        """Trim the cache to max_entries, least recently used first (lock held)"""
+        self._writes_since_evict = 0
+        count = self._db.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            with self._db:
+                self._db.execute(
+                    "DELETE FROM metadata WHERE rowid IN"
+                    " (SELECT rowid FROM metadata ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+    
+    def stats(self):
+        """Get hit/miss counters and the current number of cached rows"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class TitleResolver:
+    """Fast video title lookup over a pooled HTTP session.
+    
+    Titles come from YouTube's oEmbed endpoint, a small JSON response. If that
+    fails, the watch page is streamed and the download stops as soon as the
+    <title> or og:title tag has been seen, instead of reading the whole page.
+    """
+    
+    OEMBED_URL = "https://www.youtube.com/oembed"
+    CHUNK_SIZE = 16 * 1024
+    MAX_PAGE_BYTES = 1024 * 1024
+    
+    TITLE_PATTERNS = [
+        (re.compile(r'<title>(.+?)</title>', re.IGNORECASE | re.DOTALL), True),
+        (re.compile(r'<meta property="og:title" content="(.+?)"', re.IGNORECASE), False),
+    ]
+    
+    def __init__(self, max_workers=8, timeout=5, cache=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache
+        
+        self._session = None
+        self._session_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """The pooled HTTP session, created on first use so startup doesn't import requests"""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                
+                session = requests.Session()
+                session.headers['User-Agent'] = USER_AGENT
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+    
+    def resolve(self, url):
+        """Get the title for a single video URL"""
+        video_id = extract_video_id(url)
+        if self.cache and video_id:
+            title = self.cache.get(video_id, 'title')
+            if title:
+                return title
+        
+        for lookup in (self._title_from_oembed, self._title_from_page):
+            try:
+                title = lookup(url)
+            except Exception:
+                title = None
+            if title:
+                if self.cache and video_id:
+                    self.cache.set(video_id, 'title', title)
+                return title
+        return "Unknown Title"
+    
+    def resolve_many(self, urls):
+        """Get titles for many URLs concurrently, in the same order as urls"""
+        urls = list(urls)
+        if len(urls) <= 1:
+            return [self.resolve(url) for url in urls]
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls)),
+                                thread_name_prefix="redsea-title") as executor:
+            return list(executor.map(self.resolve, urls))
+    
+    def _title_from_oembed(self, url):
+        response = self.session.get(self.OEMBED_URL, params={'url': url, 'format': 'json'},
+                                    timeout=self.timeout)
+        if response.status_code != 200:
+            return None
+        title = response.json().get('title')
+        return title.strip() if title else None
+    
+    def _title_from_page(self, url):
+        with self.session.get(url, timeout=self.timeout, stream=True) as response:
+            page = ""
+            read_bytes = 0
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                read_bytes += len(chunk)
+                page += chunk.decode('utf-8', errors='ignore')
+                
+                title = self._match_title(page)
+                if title:
+                    return title
+                
+                # Both tags live in <head>; give up once we are past it
+                if '</head>' in page or read_bytes >= self.MAX_PAGE_BYTES:
+                    break
+        return None
+    
+    def _match_title(self, page):
+        for pattern, is_title_tag in self.TITLE_PATTERNS:
+            match = pattern.search(page)
+            if match:
+                title = html.unescape(match.group(1))
+                if is_title_tag:
+                    title = title.replace(' - YouTube Music', '').replace(' - YouTube', '')
+                title = title.strip()
+                if title and title != 'YouTube':
+                    return title
+        return None
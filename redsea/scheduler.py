@@ -0,0 +1,166 @@
+"""Order in which queued items are handed to the download workers"""
+
+import heapq
+import threading
+
+# Scheduling policies and their display names
+SCHEDULE_POLICIES = ('fifo', 'shortest', 'largest', 'priority')
+
+SCHEDULE_TEXT = {
+    'fifo': 'Queue order',
+    'shortest': 'Shortest first',
+    'largest': 'Largest first',
+    'priority': 'Priority',
+}
+
+# Bytes per second of media assumed for formats that list no size or
+# bitrate (about 128 kbps audio and 1 Mbps video)
+TYPICAL_BYTES_PER_SECOND = {
+    'audio': 16000,
+    'video': 125000,
+}
+
+def _format_size(fmt, duration):
+    """Get a format's size from yt-dlp's filesize, filesize_approx or bitrate, or None"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size and duration:
+        bitrate = fmt.get('tbr') or fmt.get('abr')
+        if bitrate:
+            size = bitrate * 1000 / 8 * duration
+    return int(size) if size else None
+
+def _has_codec(fmt, key):
+    return fmt.get(key) not in (None, 'none')
+
+def _best_format(candidates):
+    return max(candidates, key=lambda fmt: (fmt.get('height') or 0, fmt.get('tbr') or fmt.get('abr') or 0))
+
+def _split_formats(info):
+    """Get the audio-only, muxed and muxed MP4 formats of an info dict"""
+    formats = info.get('formats') or []
+    audio_formats = [fmt for fmt in formats if _has_codec(fmt, 'acodec') and not _has_codec(fmt, 'vcodec')]
+    video_formats = [fmt for fmt in formats if _has_codec(fmt, 'acodec') and _has_codec(fmt, 'vcodec')]
+    mp4_formats = [fmt for fmt in video_formats if fmt.get('ext') == 'mp4'] or video_formats
+    return audio_formats, video_formats, mp4_formats
+
+def single_fetch_keeps_audio(info):
+    """Whether the MP4 of 'both' carries audio as good as the best audio-only format
+    
+    Muxed MP4s often carry low bitrate audio, and an MP3 extracted from
+    them would be worse than one from 'bestaudio'. An unknown bitrate
+    counts as worse; with no audio-only formats the MP4 is the best there is.
+    """
+    audio_formats, _, mp4_formats = _split_formats(info)
+    if not audio_formats:
+        return True
+    if not mp4_formats:
+        return False
+    best_audio = max(fmt.get('abr') or 0 for fmt in audio_formats)
+    mp4_audio = _best_format(mp4_formats).get('abr') or 0
+    return mp4_audio > 0 and mp4_audio >= best_audio
+
+def estimate_download_size(info, format_choice, single_fetch=True):
+    """Estimate the bytes downloading info in format_choice will fetch, or None if unknown
+    
+    info is a yt-dlp info dict, processed or not; the formats the engine
+    asks for ('bestaudio/best', 'best[ext=mp4]/best') are picked by their
+    bitrate. Without sizes or bitrates the duration is used.
+    """
+    duration = info.get('duration') or 0
+    audio_formats, video_formats, mp4_formats = _split_formats(info)
+    
+    def best_size(candidates, kind):
+        if candidates:
+            size = _format_size(_best_format(candidates), duration)
+            if size:
+                return size
+        return int(duration * TYPICAL_BYTES_PER_SECOND[kind]) if duration else None
+    
+    if format_choice in ('mp3', 'audio'):
+        return best_size(audio_formats or video_formats, 'audio')
+    if format_choice == 'both' and not (single_fetch and single_fetch_keeps_audio(info)):
+        audio, video = best_size(audio_formats or video_formats, 'audio'), best_size(mp4_formats, 'video')
+        return audio + video if audio and video else None
+    return best_size(mp4_formats, 'video')
+
+class QueueScheduler:
+    """Picks the next waiting item to start under a scheduling policy.
+    
+    'fifo' follows the queue order, which the user can change while the
+    batch runs. 'shortest' starts the items with the least to download
+    first, so the most items finish per minute; 'largest' starts the
+    biggest first, so with parallel workers no long download is left
+    running alone at the end of the batch. 'priority' starts items with a
+    higher QueueItem.priority first, in queue order among equals. Items
+    given a priority (e.g. with Move to Top) go first under the size
+    policies too.
+    
+    load() sets the items waiting to start, and pop() takes the next one
+    from a heap per policy, so a batch costs O(n log n) whatever the
+    policy. The policy is passed to every pop(), so a change applies to
+    every item not started yet. Sizes come from estimate(items), which
+    returns a list of bytes or None; each item is estimated once per batch,
+    when it is first loaded. Items without an estimate go after the items
+    with one, in queue order.
+    """
+    
+    def __init__(self, estimate=None):
+        self.estimate = estimate
+        self._sizes = {}
+        self._waiting = []
+        self._taken = set()
+        self._heaps = {}
+        self._lock = threading.Lock()
+    
+    def reset(self):
+        """Forget the waiting items and size estimates (e.g. for a new batch)"""
+        with self._lock:
+            self._sizes = {}
+            self._waiting = []
+            self._taken = set()
+            self._heaps = {}
+    
+    def load(self, items):
+        """Set the items waiting to start, in queue order (e.g. after the queue changed)"""
+        missing = [item for item in items if item.key not in self._sizes]
+        estimates = self.estimate(missing) if self.estimate and missing else [None] * len(missing)
+        with self._lock:
+            for item, size in zip(missing, estimates):
+                self._sizes[item.key] = size
+            self._waiting = list(items)
+            self._taken = set()
+            self._heaps = {}
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._waiting) - len(self._taken)
+    
+    def pop(self, policy='fifo'):
+        """Take the next waiting item to start under policy, or None if none is left"""
+        if policy not in SCHEDULE_POLICIES:
+            policy = 'fifo'
+        with self._lock:
+            heap = self._heaps.get(policy)
+            if heap is None:
+                # Built on first use; items taken under another policy are skipped as they surface
+                heap = [(self._sort_key(item, i, policy), i) for i, item in enumerate(self._waiting)
+                        if item.key not in self._taken]
+                heapq.heapify(heap)
+                self._heaps[policy] = heap
+            while heap:
+                _, i = heapq.heappop(heap)
+                item = self._waiting[i]
+                if item.key not in self._taken:
+                    self._taken.add(item.key)
+                    return item
+            return None
+    
+    def _sort_key(self, item, index, policy):
+        if policy == 'fifo':
+            return (index,)
+        if policy == 'priority':
+            return (-item.priority, index)
+        size = self._sizes.get(item.key)
+        if size is None:
+            return (-item.priority, 1, 0, index)
+        return (-item.priority, 0, size if policy == 'shortest' else -size, index)
@@ -0,0 +1,142 @@
+"""Pooled, long-lived yt-dlp sessions"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .util import get_cache_dir
+
+# Idle sessions kept across all option sets; the least recently used go first
+MAX_IDLE_SESSIONS = 8
+
+class _PooledSession:
+    """A long-lived YoutubeDL instance plus the hooks of its current user"""
+    
+    def __init__(self, ydl_opts, extractors=()):
+        self.progress_hooks = []
+        self.postprocessor_hooks = []
+        
+        # The instance keeps a single set of dispatching hooks for its whole
+        # life; each checkout swaps in the hooks of the item being processed
+        ydl_opts = dict(ydl_opts)
+        ydl_opts['progress_hooks'] = [self._dispatch_progress]
+        ydl_opts['postprocessor_hooks'] = [self._dispatch_postprocessor]
+        
+        # yt-dlp takes a few hundred milliseconds to import, so it is only
+        # loaded once the first session is needed
+        import yt_dlp
+        if not extractors:
+            self.ydl = yt_dlp.YoutubeDL(ydl_opts)
+            return
+        
+        # Extra extractors are registered first so they win over yt-dlp's own
+        self.ydl = yt_dlp.YoutubeDL(ydl_opts, auto_init=False)
+        for extractor in extractors:
+            self.ydl.add_info_extractor(extractor())
+        self.ydl.add_default_info_extractors()
+    
+    def _dispatch_progress(self, d):
+        for hook in self.progress_hooks:
+            hook(d)
+    
+    def _dispatch_postprocessor(self, d):
+        for hook in self.postprocessor_hooks:
+            hook(d)
+    
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception:
+            pass
+
+class YoutubeDLPool:
+    """Reusable YoutubeDL sessions keyed by option set.
+    
+    Each YoutubeDL keeps its HTTP connection pool, cookies and the extractors'
+    in-memory player/signature cache, so reusing instances across items saves
+    the TLS handshakes and player processing the previous item already paid
+    for. All sessions share one on-disk yt-dlp cache directory.
+    
+    YoutubeDL is not safe for concurrent use, so a session is checked out by
+    one worker at a time and idle sessions are kept per option set. Option
+    sets come and go (per quality, rate limit or audio mode), so at most
+    max_idle sessions are kept idle, the least recently used closed first.
+    
+    extractors are InfoExtractor classes asked before yt-dlp's own, e.g. the
+    benchmarks' stand-in for YouTube.
+    """
+    
+    HOOK_OPTIONS = ('progress_hooks', 'postprocessor_hooks')
+    
+    def __init__(self, cache_dir=None, extractors=(), max_idle=MAX_IDLE_SESSIONS):
+        self.cache_dir = cache_dir or os.path.join(get_cache_dir(), "yt-dlp")
+        self.extractors = tuple(extractors)
+        self.max_idle = max_idle
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    @contextmanager
+    def session(self, ydl_opts):
+        """Check out a YoutubeDL configured with ydl_opts for the duration of a with block"""
+        ydl_opts = dict(ydl_opts)
+        hooks = {name: list(ydl_opts.pop(name, [])) for name in self.HOOK_OPTIONS}
+        ydl_opts.setdefault('cachedir', self.cache_dir)
+        
+        key = json.dumps(ydl_opts, sort_keys=True, default=repr)
+        pooled = self._checkout(key, ydl_opts)
+        pooled.progress_hooks = hooks['progress_hooks']
+        pooled.postprocessor_hooks = hooks['postprocessor_hooks']
+        
+        try:
+            yield pooled.ydl
+        except BaseException:
+            # Don't hand a session that failed mid-download to the next item
+            pooled.close()
+            raise
+        else:
+            pooled.progress_hooks = []
+            pooled.postprocessor_hooks = []
+            self._checkin(key, pooled)
+    
+    def _checkout(self, key, ydl_opts):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._idle_count -= 1
+                pooled = idle.pop()
+                if not idle:
+                    del self._idle[key]
+                return pooled
+        return _PooledSession(ydl_opts, self.extractors)
+    
+    def _checkin(self, key, pooled):
+        evicted = []
+        with self._lock:
+            if self._closed:
+                evicted.append(pooled)
+            else:
+                self._idle.setdefault(key, []).append(pooled)
+                self._idle.move_to_end(key)
+                self._idle_count += 1
+                while self._idle_count > self.max_idle:
+                    oldest_key, oldest = next(iter(self._idle.items()))
+                    evicted.append(oldest.pop(0))
+                    self._idle_count -= 1
+                    if not oldest:
+                        del self._idle[oldest_key]
+        for session in evicted:
+            session.close()
+    
+    def close(self):
+        """Close every idle session"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, OrderedDict()
+            self._idle_count = 0
+        for sessions in idle.values():
+            for pooled in sessions:
+                pooled.close()
@@ -0,0 +1,214 @@
+"""Disk space admission, same-filesystem staging and atomic finalizing of downloads"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+from .util import format_bytes
+
+# Hidden directory inside the output folder where downloads and conversions are written
+STAGING_DIR_NAME = ".redsea-staging"
+
+# Space always left free on the output disk
+MIN_FREE_SPACE = 200 * 1024 * 1024
+
+# Disk space an item needs at its peak, as a multiple of its estimated
+# download: the raw file and its converted copy exist side by side while
+# converting, except for MP4, which is kept as downloaded
+SPACE_FACTOR = {
+    'mp4': 1.0,
+}
+DEFAULT_SPACE_FACTOR = 2.0
+
+# Seconds between free space checks while an item waits for room
+SPACE_POLL_INTERVAL = 1.0
+
+# A preallocated reservation is shrunk once the download has written this much more
+PREALLOCATE_SHRINK_STEP = 8 * 1024 * 1024
+
+class DiskSpaceError(Exception):
+    """Not enough free disk space for a download"""
+
+def space_needed(size, format_choice):
+    """Get the disk space a download of size bytes in format_choice needs at its peak"""
+    return int(size * SPACE_FACTOR.get(format_choice, DEFAULT_SPACE_FACTOR))
+
+class _Reservation:
+    """Disk space held for one download from OutputStage.admit() until release()
+    
+    The download's progress hook counts what it has written, and only the
+    part not written yet still counts against the free space. With a
+    preallocated placeholder the space is taken on disk up front and the
+    placeholder shrinks as the download grows.
+    """
+    
+    def __init__(self, stage):
+        self.stage = stage
+        self.size = 0
+        self.placeholder = None
+        self.written = 0
+        self._files = {}
+        self._shrunk_at = 0
+        self.admitted = False
+        self.released = False
+    
+    @property
+    def active(self):
+        return self.admitted and not self.released
+    
+    @property
+    def outstanding(self):
+        """Reserved bytes not on disk yet"""
+        if not self.active or self.placeholder:
+            return 0
+        return max(0, self.size - self.written)
+    
+    def progress_hook(self, d):
+        """yt-dlp progress hook: count the bytes written so far"""
+        if not self.active or d.get('status') not in ('downloading', 'finished'):
+            return
+        filename = d.get('filename') or ''
+        downloaded = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+        with self.stage._lock:
+            if downloaded <= self._files.get(filename, 0):
+                return
+            self.written += downloaded - self._files.get(filename, 0)
+            self._files[filename] = downloaded
+            shrink = self.placeholder and self.written - self._shrunk_at >= PREALLOCATE_SHRINK_STEP
+            if shrink:
+                self._shrunk_at = self.written
+        if shrink:
+            try:
+                os.truncate(self.placeholder, max(0, self.size - self.written))
+            except OSError:
+                pass
+    
+    def release(self):
+        """Give the space back (safe to call more than once)"""
+        self.stage._release(self)
+
+class OutputStage:
+    """Admits downloads while the output disk has room and stages their files beside it.
+    
+    admit() holds an item's estimated peak disk use in a reservation().
+    While the free space, less what admitted items have still to write and
+    min_free, can't fit it, the item waits for others to finish; if nothing
+    else holds space it fails with DiskSpaceError at once instead of
+    filling the disk.
+    
+    Downloads and conversions are written to a hidden staging directory
+    inside the output folder, so they are on the same filesystem and
+    finished files move into place with one atomic rename. Readers of the
+    output folder never see a partial file.
+    
+    With preallocate, each reservation is also taken on disk as a
+    placeholder file (where os.posix_fallocate exists), so other programs
+    can't fill the disk while the download runs. yt-dlp writes its own
+    files, so the placeholder stands in for them and shrinks as they grow.
+    """
+    
+    def __init__(self, min_free=MIN_FREE_SPACE, preallocate=False):
+        self.min_free = min_free
+        self.preallocate = preallocate and hasattr(os, 'posix_fallocate')
+        self._reservations = set()
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+    
+    def staging_dir(self, output_path):
+        """Get (and create) the staging directory for output_path
+        
+        Falls back to output_path itself if the directory would end up on
+        another filesystem (e.g. a mount point named like it).
+        """
+        staging_dir = os.path.join(output_path, STAGING_DIR_NAME)
+        os.makedirs(staging_dir, exist_ok=True)
+        if os.stat(staging_dir).st_dev != os.stat(output_path).st_dev:
+            return output_path
+        return staging_dir
+    
+    def staging_path(self, target_path):
+        """Get the path to write target_path to before it is finalized"""
+        directory, name = os.path.split(target_path)
+        return os.path.join(self.staging_dir(directory), name + ".part")
+    
+    def free_space(self, path):
+        """Get the bytes free on the filesystem of path"""
+        return shutil.disk_usage(path).free
+    
+    def reservation(self):
+        """Get an empty reservation for admit(); releasing it is safe whether it was admitted or not"""
+        return _Reservation(self)
+    
+    def admit(self, reservation, output_path, size, cancel_event=None, on_wait=None):
+        """Hold size bytes of disk space in reservation for a download into output_path
+        
+        Blocks while other downloads have to finish first; on_wait(needed,
+        available) is called once if it has to. Returns False if
+        cancel_event is set while waiting. Raises DiskSpaceError if the
+        download can't fit even with nothing else running.
+        """
+        staging_dir = self.staging_dir(output_path)
+        waited = False
+        with self._lock:
+            while True:
+                outstanding = sum(other.outstanding for other in self._reservations)
+                available = self.free_space(staging_dir) - outstanding - self.min_free
+                if size <= available:
+                    break
+                if not self._reservations:
+                    raise DiskSpaceError(f"{format_bytes(size)} needed, {format_bytes(max(0, available))} "
+                                         f"available in {output_path}")
+                if not waited and on_wait:
+                    on_wait(size, max(0, available))
+                waited = True
+                self._released.wait(SPACE_POLL_INTERVAL)
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+            
+            reservation.size = size
+            reservation.admitted = True
+            self._reservations.add(reservation)
+        
+        if self.preallocate and size:
+            reservation.placeholder = self._preallocate(staging_dir, reservation)
+        return True
+    
+    def _preallocate(self, staging_dir, reservation):
+        """Take a reservation's bytes on disk as a placeholder file; returns its path"""
+        fd, path = tempfile.mkstemp(suffix=".reserve", dir=staging_dir)
+        try:
+            os.posix_fallocate(fd, 0, reservation.size)
+        except OSError as e:
+            os.close(fd)
+            os.remove(path)
+            reservation.release()
+            raise DiskSpaceError(f"could not preallocate {format_bytes(reservation.size)}: {e}")
+        os.close(fd)
+        return path
+    
+    def _release(self, reservation):
+        with self._lock:
+            if not reservation.active:
+                return
+            reservation.released = True
+            self._reservations.discard(reservation)
+            self._released.notify_all()
+        if reservation.placeholder:
+            try:
+                os.remove(reservation.placeholder)
+            except OSError:
+                pass
+    
+    def finalize(self, path, target_path):
+        """Move a finished file from staging into place in one atomic rename"""
+        if path != target_path:
+            os.replace(path, target_path)
+        return target_path
+    
+    def cleanup(self, output_path):
+        """Remove the staging directory if nothing is left in it"""
+        try:
+            os.rmdir(os.path.join(output_path, STAGING_DIR_NAME))
+        except OSError:
+            pass
@@ -0,0 +1,207 @@
+"""Transfer telemetry aggregated from yt-dlp progress and postprocessor hooks"""
+
+import threading
+import time
+
+# Minimum seconds between progress updates per item
+TELEMETRY_MIN_INTERVAL = 0.25
+
+class _ItemTelemetry:
+    """Transfer state of one queue item"""
+    
+    __slots__ = ('title', 'phase', 'started', 'phase_started', 'first_byte', 'files', 'speed', 'eta',
+                 'last_update')
+    
+    def __init__(self, title, now):
+        self.title = title
+        self.phase = 'extracting'
+        self.started = now
+        self.phase_started = now
+        # Seconds from the start of the item to its first downloaded byte
+        self.first_byte = None
+        # filename -> [downloaded_bytes, total_bytes or None]
+        self.files = {}
+        self.speed = 0.0
+        self.eta = None
+        self.last_update = 0.0
+    
+    @property
+    def downloaded(self):
+        return sum(done for done, _ in self.files.values())
+    
+    @property
+    def total(self):
+        """Total bytes of all files, or None while any size is unknown"""
+        totals = [total for _, total in self.files.values()]
+        if not totals or None in totals:
+            return None
+        return sum(totals)
+
+class TransferTelemetry:
+    """Per-item and per-batch transfer statistics from yt-dlp's hooks.
+    
+    Progress events (downloaded_bytes, total_bytes, speed, eta) are folded
+    into per-item state at most every min_interval seconds per item, so the
+    hooks stay cheap. Time is also accounted per stage (extracting,
+    downloading, postprocessing) to show whether a slow batch is limited by
+    the network, extraction or transcoding. Each finished item's time to
+    first byte, measured from its start and so including extraction, is
+    kept for the batch statistics.
+    """
+    
+    PHASES = ('extracting', 'downloading', 'postprocessing')
+    
+    def __init__(self, min_interval=TELEMETRY_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Start a new batch"""
+        with self._lock:
+            self.items = {}
+            self.batch_started = time.monotonic()
+            self.total_items = 0
+            self.started_items = 0
+            self.completed_items = 0
+            self.completed_bytes = 0
+            self.first_byte_seconds = []
+            self.phase_seconds = dict.fromkeys(self.PHASES, 0.0)
+    
+    def start_item(self, key, title):
+        with self._lock:
+            self.items[key] = _ItemTelemetry(title, time.monotonic())
+            self.started_items += 1
+    
+    def set_phase(self, key, phase):
+        with self._lock:
+            stats = self.items.get(key)
+            if stats is not None and stats.phase != phase:
+                self._close_phase(stats, time.monotonic())
+                stats.phase = phase
+    
+    def finish_item(self, key):
+        with self._lock:
+            stats = self.items.pop(key, None)
+            if stats is None:
+                return
+            self._close_phase(stats, time.monotonic())
+            self.completed_items += 1
+            self.completed_bytes += stats.downloaded
+            if stats.first_byte is not None:
+                self.first_byte_seconds.append(stats.first_byte)
+    
+    def _close_phase(self, stats, now):
+        """Account the time spent in the current phase (lock held)"""
+        if stats.phase in self.phase_seconds:
+            self.phase_seconds[stats.phase] += now - stats.phase_started
+        stats.phase_started = now
+    
+    def progress_hook(self, key):
+        """Create a yt-dlp progress hook that feeds this item's stats"""
+        def hook(d):
+            stats = self.items.get(key)
+            if stats is None:
+                return
+            
+            now = time.monotonic()
+            finished = d.get('status') == 'finished'
+            if stats.first_byte is None and (finished or d.get('downloaded_bytes')):
+                stats.first_byte = now - stats.started
+            
+            # Rate limit: intermediate events inside the interval are dropped
+            if not finished and now - stats.last_update < self.min_interval:
+                return
+            
+            with self._lock:
+                stats.last_update = now
+                if stats.phase != 'downloading':
+                    self._close_phase(stats, now)
+                    stats.phase = 'downloading'
+                
+                downloaded = d.get('downloaded_bytes') or 0
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                if finished:
+                    total = total or downloaded
+                    stats.speed = 0.0
+                    stats.eta = 0
+                else:
+                    stats.speed = d.get('speed') or 0.0
+                    stats.eta = d.get('eta')
+                stats.files[d.get('filename') or ''] = [downloaded, total]
+        return hook
+    
+    def postprocessor_hook(self, key):
+        """Create a yt-dlp postprocessor hook that tracks transcoding time"""
+        def hook(d):
+            if d.get('status') == 'started':
+                self.set_phase(key, 'postprocessing')
+            elif d.get('status') == 'finished':
+                self.set_phase(key, 'downloading')
+        return hook
+    
+    def snapshot(self):
+        """Get a consistent view of the current item and batch statistics"""
+        with self._lock:
+            now = time.monotonic()
+            items = []
+            active_downloaded = 0
+            active_remaining = 0
+            known_total = 0
+            known_done = 0
+            speed = 0.0
+            
+            for key, stats in self.items.items():
+                downloaded = stats.downloaded
+                total = stats.total
+                active_downloaded += downloaded
+                speed += stats.speed
+                if total:
+                    known_total += total
+                    known_done += min(downloaded, total)
+                    active_remaining += max(0, total - downloaded)
+                items.append({
+                    'key': key,
+                    'title': stats.title,
+                    'phase': stats.phase,
+                    'downloaded': downloaded,
+                    'total': total,
+                    'speed': stats.speed,
+                    'eta': stats.eta,
+                })
+            
+            elapsed = max(now - self.batch_started, 1e-6)
+            transferred = self.completed_bytes + active_downloaded
+            
+            # Items that haven't started yet are assumed to be as large as
+            # the average finished item
+            pending_items = max(0, self.total_items - self.started_items)
+            average_item = self.completed_bytes / self.completed_items if self.completed_items else 0
+            remaining = active_remaining + pending_items * average_item
+            
+            # Time to first byte of the finished items, from the start of each item
+            first_byte = sorted(self.first_byte_seconds)
+            
+            throughput = speed or transferred / elapsed
+            eta = remaining / throughput if throughput and (remaining or pending_items == 0) else None
+            
+            phase_seconds = dict(self.phase_seconds)
+            for stats in self.items.values():
+                if stats.phase in phase_seconds:
+                    phase_seconds[stats.phase] += now - stats.phase_started
+            
+            return {
+                'items': items,
+                'batch': {
+                    'elapsed': elapsed,
+                    'transferred': transferred,
+                    'remaining': remaining,
+                    'speed': speed,
+                    'average_speed': transferred / elapsed,
+                    'eta': eta,
+                    'active_percent': (known_done / known_total * 100) if known_total else None,
+                    'phase_seconds': phase_seconds,
+                    'first_byte_average': sum(first_byte) / len(first_byte) if first_byte else None,
+                    'first_byte_median': first_byte[len(first_byte) // 2] if first_byte else None,
+                },
+            }
@@ -0,0 +1,359 @@
+"""Per-stage timing spans of downloads, written as a JSON-lines trace and Prometheus metrics"""
+
+import json
+import os
+import threading
+import time
+
+from .errors import classify_error
+
+# Stages of an item, in the order it passes through them
+STAGES = ('validate', 'title', 'extract', 'format_selection', 'transfer', 'postprocess', 'finalize')
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Minimum seconds between rewrites of the metrics file while a batch runs
+METRICS_WRITE_INTERVAL = 5.0
+
+class _Span:
+    """One timed stage; use as a context manager or end() it"""
+    
+    def __init__(self, tracer, stage, item, retries, attributes):
+        self.tracer = tracer
+        self.stage = stage
+        self.item = item
+        self.retries = retries
+        self.bytes = 0
+        self.attributes = attributes
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.ended = False
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def end(self, error=None, cancelled=False):
+        if self.ended:
+            return
+        self.ended = True
+        seconds = time.perf_counter() - self.started
+        if cancelled:
+            status, kind = 'cancelled', None
+        elif error is not None:
+            status, kind = 'error', classify_error(error)
+        else:
+            status, kind = 'ok', None
+        self.tracer._record(self, seconds, status, kind)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.end(exc)
+
+class _ItemTrace:
+    """The stage spans of one download attempt, one after the other.
+    
+    switch() ends the open span and starts the next, so each stage runs
+    until the following one begins. yt-dlp's hooks drive the stages inside
+    a download: the first progress event ends format selection, ffmpeg
+    postprocessors start postprocessing and moving the file into place
+    starts finalizing. Hooks may fire on yt-dlp's fragment threads and the
+    transcode pool, so every change is made under a lock.
+    """
+    
+    def __init__(self, tracer, item, retries, title):
+        self.tracer = tracer
+        self.item = item
+        self.retries = retries
+        self.title = title
+        self.span = None
+        self._files = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def stage(self):
+        """The stage of the open span, or None"""
+        span = self.span
+        return span.stage if span is not None else None
+    
+    def switch(self, stage, **attributes):
+        """End the open span and start one for stage"""
+        with self._lock:
+            self._switch(stage, attributes)
+    
+    def _switch(self, stage, attributes):
+        if self.span is not None:
+            self.span.end()
+        if self.title:
+            attributes.setdefault('title', self.title)
+        self.span = _Span(self.tracer, stage, self.item, self.retries, attributes)
+        self._files = {}
+    
+    def set(self, **attributes):
+        with self._lock:
+            if self.span is not None:
+                self.span.set(**attributes)
+    
+    def add_bytes(self, count):
+        with self._lock:
+            if self.span is not None:
+                self.span.bytes += count
+    
+    def pause(self):
+        """End the open span without starting another (e.g. while waiting for the transcode pool)"""
+        with self._lock:
+            if self.span is not None:
+                self.span.end()
+                self.span = None
+    
+    def end(self, error=None, cancelled=False):
+        """End the open span; an error or cancellation is recorded on it"""
+        with self._lock:
+            if self.span is not None:
+                self.span.end(error, cancelled)
+                self.span = None
+    
+    def progress_hook(self, d):
+        """yt-dlp progress hook: the transfer starts with the first event and counts the bytes"""
+        status = d.get('status')
+        if status not in ('downloading', 'finished'):
+            return
+        with self._lock:
+            if self.span is None or self.span.stage != 'transfer':
+                self._switch('transfer', {})
+            # Fragment threads report out of order now and then; keep the largest count
+            filename = d.get('filename') or ''
+            downloaded = d.get('downloaded_bytes') or 0
+            if status == 'finished':
+                downloaded = downloaded or d.get('total_bytes') or 0
+            previous = self._files.get(filename, 0)
+            if downloaded > previous:
+                self.span.bytes += downloaded - previous
+                self._files[filename] = downloaded
+    
+    def postprocessor_hook(self, d):
+        """yt-dlp postprocessor hook: ffmpeg steps are postprocessing, the final move is finalizing"""
+        if d.get('status') != 'started':
+            return
+        name = d.get('postprocessor') or ''
+        stage = 'finalize' if name.startswith('MoveFiles') else 'postprocess'
+        with self._lock:
+            if self.span is None or self.span.stage != stage:
+                self._switch(stage, {})
+            if stage == 'postprocess':
+                postprocessors = self.span.attributes.setdefault('postprocessors', [])
+                if name not in postprocessors:
+                    postprocessors.append(name)
+
+class _NullSpan:
+    """Stands in for spans and item traces while tracing is off"""
+    
+    stage = None
+    
+    def set(self, **attributes):
+        pass
+    
+    def add_bytes(self, count):
+        pass
+    
+    def switch(self, stage, **attributes):
+        pass
+    
+    def pause(self):
+        pass
+    
+    def end(self, error=None, cancelled=False):
+        pass
+    
+    def __bool__(self):
+        return False
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _StageMetrics:
+    """Running totals of one stage for the metrics file"""
+    
+    __slots__ = ('count', 'seconds', 'buckets', 'bytes', 'retries', 'errors')
+    
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(STAGE_BUCKETS)
+        self.bytes = 0
+        self.retries = 0
+        # (status, error kind) -> count of spans that didn't end well
+        self.errors = {}
+
+class Tracer:
+    """Records a timed span for every stage of every download.
+    
+    Each span carries its stage, item key, duration, bytes moved in the
+    stage and how many earlier attempts of the item had failed. Finished
+    spans are appended to trace_path as JSON lines; per-stage totals and
+    duration histograms are written to metrics_path in the Prometheus text
+    format, suitable for node_exporter's textfile collector.
+    
+    With neither path set the tracer is off: span() and item() hand out a
+    shared do-nothing object and no hooks are installed, so tracing costs
+    one attribute check per stage.
+    """
+    
+    def __init__(self, trace_path=None, metrics_path=None):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.enabled = bool(trace_path or metrics_path)
+        self._lock = threading.Lock()
+        self._trace_file = None
+        self._metrics = {stage: _StageMetrics() for stage in STAGES}
+        self._metrics_written = 0.0
+        self._attempts = {}
+        self.batch = None
+    
+    def begin_batch(self):
+        """Start a new batch: spans are tagged with its ID and attempts are counted afresh"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.batch = time.strftime('%Y%m%dT%H%M%S')
+            self._attempts = {}
+    
+    def span(self, stage, item=None, **attributes):
+        """Start a span for a stage of item (a queue key); end it or use it as a context manager"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage, item, self._attempts.get(item, 0), attributes)
+    
+    def item(self, key, title=None):
+        """Start tracing one download attempt of the item with queue key key"""
+        if not self.enabled:
+            return _NULL_SPAN
+        with self._lock:
+            retries = self._attempts.get(key, 0)
+            self._attempts[key] = retries + 1
+        return _ItemTrace(self, key, retries, title)
+    
+    def _record(self, span, seconds, status, kind):
+        """Write a finished span to the trace and add it to the stage totals"""
+        record = {
+            'ts': round(span.timestamp, 6),
+            'batch': self.batch,
+            'stage': span.stage,
+            'item': span.item,
+            'seconds': round(seconds, 6),
+            'bytes': span.bytes,
+            'retries': span.retries,
+            'status': status,
+        }
+        if kind:
+            record['error'] = kind
+        record.update(span.attributes)
+        
+        with self._lock:
+            if self.trace_path:
+                self._write_trace(record)
+            
+            metrics = self._metrics.get(span.stage)
+            if metrics is None:
+                metrics = self._metrics[span.stage] = _StageMetrics()
+            metrics.count += 1
+            metrics.seconds += seconds
+            metrics.bytes += span.bytes
+            metrics.retries += span.retries
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if seconds <= bound:
+                    metrics.buckets[i] += 1
+            if status != 'ok':
+                metrics.errors[(status, kind)] = metrics.errors.get((status, kind), 0) + 1
+            
+            write_metrics = (self.metrics_path and
+                             time.monotonic() - self._metrics_written >= METRICS_WRITE_INTERVAL)
+        
+        if write_metrics:
+            self.write_metrics()
+    
+    def _write_trace(self, record):
+        """Append a record to the trace file (lock held)"""
+        try:
+            if self._trace_file is None:
+                directory = os.path.dirname(self.trace_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._trace_file = open(self.trace_path, 'a', encoding='utf-8', buffering=1)
+            self._trace_file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            # A trace that can't be written must never fail a download
+            pass
+    
+    def metrics_text(self):
+        """Get the stage totals in the Prometheus text exposition format"""
+        with self._lock:
+            stages = [(stage, metrics) for stage, metrics in self._metrics.items() if metrics.count]
+            lines = [
+                "# HELP redsea_stage_seconds Time spent in each download stage.",
+                "# TYPE redsea_stage_seconds histogram",
+            ]
+            for stage, metrics in stages:
+                for bound, count in zip(STAGE_BUCKETS, metrics.buckets):
+                    lines.append(f'redsea_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'redsea_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {metrics.count}')
+                lines.append(f'redsea_stage_seconds_sum{{stage="{stage}"}} {metrics.seconds:.6f}')
+                lines.append(f'redsea_stage_seconds_count{{stage="{stage}"}} {metrics.count}')
+            
+            lines += [
+                "# HELP redsea_stage_bytes_total Bytes moved in each download stage.",
+                "# TYPE redsea_stage_bytes_total counter",
+            ]
+            lines += [f'redsea_stage_bytes_total{{stage="{stage}"}} {metrics.bytes}' for stage, metrics in stages]
+            
+            lines += [
+                "# HELP redsea_stage_retries_total Earlier failed attempts of the items, summed over spans.",
+                "# TYPE redsea_stage_retries_total counter",
+            ]
+            lines += [f'redsea_stage_retries_total{{stage="{stage}"}} {metrics.retries}'
+                      for stage, metrics in stages]
+            
+            lines += [
+                "# HELP redsea_stage_failures_total Spans that ended in an error or a cancellation.",
+                "# TYPE redsea_stage_failures_total counter",
+            ]
+            for stage, metrics in stages:
+                for (status, kind), count in sorted(metrics.errors.items(), key=lambda entry: str(entry[0])):
+                    lines.append(f'redsea_stage_failures_total{{stage="{stage}",status="{status}",'
+                                 f'kind="{kind or ""}"}} {count}')
+        return "\n".join(lines) + "\n"
+    
+    def write_metrics(self):
+        """Rewrite the metrics file, replacing it in one step so scrapers never see half of it"""
+        if not self.metrics_path:
+            return
+        text = self.metrics_text()
+        temp_path = self.metrics_path + ".tmp"
+        try:
+            directory = os.path.dirname(self.metrics_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, self.metrics_path)
+        except OSError:
+            pass
+        with self._lock:
+            self._metrics_written = time.monotonic()
+    
+    def close(self):
+        """Write the final metrics and close the trace file"""
+        if not self.enabled:
+            return
+        self.write_metrics()
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
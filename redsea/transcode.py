@@ -0,0 +1,275 @@
+"""ffmpeg transcoding on its own worker pool, fed by the download workers"""
+
+import os
+import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Transcode workers default to one per CPU core; the hand-off holds at most
+# this many jobs per worker (queued plus running) before downloads wait
+TRANSCODE_BACKLOG_PER_WORKER = 2
+
+# Seconds between checks for cancellation while ffmpeg runs
+TRANSCODE_CANCEL_POLL_INTERVAL = 0.1
+
+# Audio codecs, as yt-dlp and ffmpeg name them, and the audio-only container
+# each can be copied into unchanged
+AUDIO_COPY_EXTENSIONS = {
+    'aac': 'm4a',
+    'alac': 'm4a',
+    'opus': 'opus',
+    'vorbis': 'ogg',
+    'mp3': 'mp3',
+    'flac': 'flac',
+    'pcm_s16le': 'wav',
+}
+
+# ffmpeg muxer that writes each audio container
+AUDIO_MUXERS = {
+    'm4a': 'ipod',
+    'opus': 'opus',
+    'ogg': 'ogg',
+    'mp3': 'mp3',
+    'flac': 'flac',
+    'wav': 'wav',
+}
+
+_STREAM_AUDIO_CODEC = re.compile(r'Stream #\S+.*?: Audio: ([\w-]+)')
+
+# ffmpeg executable -> its muxers and encoders, probed once per process
+_capabilities = {}
+_capabilities_lock = threading.Lock()
+
+def default_transcode_workers():
+    """Get the default number of parallel ffmpeg processes"""
+    return max(1, os.cpu_count() or 1)
+
+class TranscodeError(Exception):
+    """ffmpeg failed to convert a file"""
+
+def ffmpeg_capabilities(ffmpeg_path=None):
+    """Get the muxers and encoders of an ffmpeg build as {'muxers': set, 'encoders': set}
+    
+    ffmpeg is asked once per process; both sets are empty if it can't be run.
+    """
+    command = ffmpeg_path or 'ffmpeg'
+    with _capabilities_lock:
+        capabilities = _capabilities.get(command)
+        if capabilities is None:
+            capabilities = {
+                'muxers': _ffmpeg_names(command, '-muxers'),
+                'encoders': _ffmpeg_names(command, '-encoders'),
+            }
+            _capabilities[command] = capabilities
+        return capabilities
+
+def _ffmpeg_names(command, option):
+    """Get the names ffmpeg lists for -muxers or -encoders"""
+    try:
+        result = subprocess.run([command, '-hide_banner', option], stdin=subprocess.DEVNULL,
+                                capture_output=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return set()
+    
+    names = set()
+    listing = False
+    for line in result.stdout.decode('utf-8', 'replace').splitlines():
+        # The table starts after a ' --' or ' ------' separator line
+        if not listing:
+            listing = line.strip().startswith('--')
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            names.update(parts[1].split(','))
+    return names
+
+def audio_codec_name(codec):
+    """Normalize a yt-dlp acodec such as 'mp4a.40.2' or 'opus' to a codec name, or None"""
+    if not codec or codec == 'none':
+        return None
+    name = codec.lower().split('.')[0]
+    # MP4 audio object types (mp4a.40.x) are AAC
+    return 'aac' if name == 'mp4a' else name
+
+def probe_audio_codec(path, ffmpeg_path=None):
+    """Read the codec of the first audio stream in a file, or None"""
+    try:
+        result = subprocess.run([ffmpeg_path or 'ffmpeg', '-hide_banner', '-nostdin', '-i', path],
+                                stdin=subprocess.DEVNULL, capture_output=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = _STREAM_AUDIO_CODEC.search(result.stderr.decode('utf-8', 'replace'))
+    return match.group(1).lower() if match else None
+
+def audio_copy_extension(codec, ffmpeg_path=None):
+    """Get the extension of the container codec can be copied into, or None if it must be re-encoded"""
+    extension = AUDIO_COPY_EXTENSIONS.get(codec)
+    if extension is None:
+        return None
+    if AUDIO_MUXERS[extension] not in ffmpeg_capabilities(ffmpeg_path)['muxers']:
+        return None
+    return extension
+
+class TranscodePool:
+    """Runs ffmpeg audio conversions (MP3 encodes and stream copies) on a pool sized to the CPU cores.
+    
+    Download workers hand finished raw files over with submit() and move on
+    to their next item, so one item's encode overlaps the next item's
+    download. The hand-off is bounded: once max_pending jobs are queued or
+    running, submit() blocks, which holds the download workers back instead
+    of piling up raw files on disk.
+    
+    Each job watches its cancel_event: a cancelled job that hasn't started
+    is dropped, and a running ffmpeg is killed. Either way, and when
+    ffmpeg fails, the partial output and the raw source (unless
+    keep_source) are deleted; a retry downloads the item again. kill()
+    stops every running ffmpeg at once.
+    """
+    
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or default_transcode_workers()
+        self.max_pending = max_pending or self.workers * TRANSCODE_BACKLOG_PER_WORKER
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        # Running ffmpeg processes
+        self._processes = set()
+    
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix="redsea-transcode")
+            return self._executor
+    
+    def submit(self, source_path, target_path, quality, ffmpeg_path=None, keep_source=False,
+               on_start=None, on_done=None, cancel_event=None, copy=False, temp_path=None):
+        """Queue an MP3 conversion of source_path to target_path and return its Future
+        
+        With copy, the audio stream is copied into target_path's container
+        instead of being encoded (quality is then ignored). ffmpeg writes to
+        temp_path (by default target_path + '.part'), which is renamed to
+        target_path once complete; keep it on the same filesystem.
+        
+        Blocks while the hand-off is full. on_start() runs when ffmpeg starts,
+        on_done() after the output is in place, both on the transcode thread.
+        Returns None, after deleting the raw source unless keep_source, if
+        cancel_event is set while waiting for room; setting it later makes
+        the Future fail with a cancellation error.
+        """
+        while not self._slots.acquire(timeout=0.2):
+            if cancel_event is not None and cancel_event.is_set():
+                self._discard(None, source_path, keep_source)
+                return None
+        
+        try:
+            future = self._get_executor().submit(self._run, source_path, target_path, quality, ffmpeg_path,
+                                                 keep_source, on_start, on_done, copy, cancel_event, temp_path)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+    
+    def _run(self, source_path, target_path, quality, ffmpeg_path, keep_source, on_start, on_done, copy,
+             cancel_event, temp_path):
+        if cancel_event is not None and cancel_event.is_set():
+            self._discard(None, source_path, keep_source)
+            raise Exception("Download cancelled by user")
+        
+        if on_start:
+            on_start()
+        
+        if copy:
+            extension = os.path.splitext(target_path)[1][1:]
+            codec_options = ['-codec:a', 'copy', '-f', AUDIO_MUXERS.get(extension, extension)]
+        else:
+            encoders = ffmpeg_capabilities(ffmpeg_path)['encoders']
+            if encoders and 'libmp3lame' not in encoders:
+                self._discard(None, source_path, keep_source)
+                raise TranscodeError("This FFmpeg was built without the MP3 encoder (libmp3lame)")
+            codec_options = ['-codec:a', 'libmp3lame', '-b:a', f'{quality}k', '-f', 'mp3']
+        
+        # Write elsewhere and rename, so a half-written file never looks
+        # like a finished one
+        temp_path = temp_path or target_path + ".part"
+        command = [
+            ffmpeg_path or 'ffmpeg', '-y', '-nostdin', '-loglevel', 'error',
+            '-i', source_path,
+            '-vn', *codec_options, temp_path,
+        ]
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            self._discard(None, source_path, keep_source)
+            raise TranscodeError(f"FFmpeg not found: {command[0]}")
+        
+        with self._lock:
+            self._processes.add(process)
+        try:
+            # Wait in short steps so a cancellation kills ffmpeg right away
+            while True:
+                try:
+                    _, stderr = process.communicate(timeout=TRANSCODE_CANCEL_POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel_event is not None and cancel_event.is_set():
+                        # Don't read stderr to its end: a child of ffmpeg may still hold it open
+                        process.kill()
+                        process.wait()
+                        process.stderr.close()
+                        break
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+        
+        if cancel_event is not None and cancel_event.is_set():
+            self._discard(temp_path, source_path, keep_source)
+            raise Exception("Download cancelled by user")
+        
+        if process.returncode != 0:
+            self._discard(temp_path, source_path, keep_source)
+            message = stderr.decode('utf-8', 'replace').strip().splitlines()
+            raise TranscodeError(f"ffmpeg failed: {message[-1] if message else process.returncode}")
+        
+        os.replace(temp_path, target_path)
+        if not keep_source:
+            try:
+                os.remove(source_path)
+            except OSError:
+                pass
+        
+        if on_done:
+            on_done()
+        return target_path
+    
+    @staticmethod
+    def _discard(temp_path, source_path, keep_source):
+        """Delete a cancelled or failed job's partial output and, unless kept, its raw source"""
+        paths = [temp_path] if temp_path else []
+        if source_path and not keep_source:
+            paths.append(source_path)
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def kill(self):
+        """Kill every running ffmpeg; their jobs fail unless cancelled"""
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+    
+    def close(self):
+        """Wait for running conversions and stop the workers"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,119 @@
+"""Shared helpers: per-user directories, bundled tools, URL parsing and formatting"""
+
+import importlib
+import os
+import re
+import sys
+from urllib.parse import urlparse, parse_qs
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+HTTP_HEADERS = {
+    'User-Agent': USER_AGENT
+}
+
+# Slow to import and not needed until the first download or title lookup
+HEAVY_MODULES = ('yt_dlp', 'requests')
+
+def get_app_dir():
+    """Get the directory holding bundled resources such as the logo and ffmpeg"""
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def get_cache_dir():
+    """Get the per-user cache directory for RedSea"""
+    if sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser("~"), "Library", "Caches")
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "RedSea")
+
+def get_data_dir():
+    """Get the per-user directory for RedSea's persistent data"""
+    if sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser("~"), "Library", "Application Support")
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(base, "RedSea")
+
+def get_log_dir():
+    """Get the per-user log directory for RedSea"""
+    if sys.platform == 'darwin':
+        return os.path.join(os.path.expanduser("~"), "Library", "Logs", "RedSea")
+    return os.path.join(get_cache_dir(), "logs")
+
+def get_ffmpeg_path():
+    """Get the path to ffmpeg executable"""
+    if getattr(sys, 'frozen', False):
+        return os.path.join(sys._MEIPASS, 'ffmpeg')
+    else:
+        import shutil
+        if shutil.which('ffmpeg'):
+            return None  # Let yt-dlp use the one in PATH
+        
+        # Check common macOS locations for ffmpeg
+        mac_locations = [
+            '/usr/local/bin/ffmpeg',
+            '/opt/homebrew/bin/ffmpeg',
+            '/usr/bin/ffmpeg'
+        ]
+        
+        for location in mac_locations:
+            if os.path.exists(location):
+                return location
+        
+        local_ffmpeg = os.path.join(get_app_dir(), 'ffmpeg')
+        
+        if os.path.exists(local_ffmpeg):
+            return local_ffmpeg
+        
+        return None
+
+def preload_heavy_modules():
+    """Import the slow modules ahead of first use, e.g. on a background thread after startup"""
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+def is_youtube_url(url):
+    """Check whether a URL points at YouTube"""
+    return "youtube.com" in url or "youtu.be" in url
+
+def is_playlist_url(url):
+    """Check whether a YouTube URL refers to a playlist"""
+    return "playlist" in url or "list=" in url
+
+def extract_video_id(url):
+    """Get the YouTube video ID from a watch, youtu.be, shorts or embed URL"""
+    match = re.search(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})', url)
+    return match.group(1) if match else None
+
+def extract_playlist_id(url):
+    """Get the playlist ID from a YouTube URL's list= parameter"""
+    values = parse_qs(urlparse(url).query).get('list')
+    return values[0] if values else None
+
+def format_bytes(num_bytes):
+    """Format a byte count as a short human readable string"""
+    num_bytes = float(num_bytes or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+def parse_bytes(text):
+    """Parse a byte count such as '500K', '1.5M' or '2MB' (binary units)"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?\s*', text or '', re.IGNORECASE)
+    if not match:
+        raise ValueError(f"invalid byte count: {text!r}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** " KMG".index(unit.upper() or " "))
+
+def format_duration(seconds):
+    """Format seconds as m:ss or h:mm:ss"""
+    seconds = int(seconds or 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"